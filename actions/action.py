@@ -9,12 +9,11 @@ import re
 
 from moviepy import *
 from PIL import Image, ImageOps
-from pydub import AudioSegment
 
 import config_reader
 import utils
 from character import *
-from libs import AudioHelper, ImageHelper
+from libs import AudioHelper, AudioProbe, ImageHelper, SoftSubtitle
 from exceptions import (
     CharacterNotFoundError,
     InsufficientCharactersError,
@@ -77,14 +76,10 @@ class Action:
                         logger.debug(f"角色信息: {json.dumps(self.char.__dict__, indent=4, ensure_ascii=False, default=str)}")
                     raise TTSException(subtitle[2], str(e), ttsengine)
             try:
-                _length = AudioFileClip(sPath).duration
-            except:
-                try:
-                    _audio = AudioSegment.from_file(sPath)
-                    _length = len(_audio) / 1000.0
-                except Exception as e:
-                    logger.error(f"获取音频长度失败: {sPath}")
-                    raise
+                _length = AudioProbe.get_duration(sPath)
+            except Exception as e:
+                logger.error(f"获取音频长度失败: {sPath}")
+                raise
             if not subtitle[0]:
                 # 字母设置了开始时间
                 subtitle[0] = end
@@ -102,6 +97,9 @@ class Action:
         Params:
             images: 背景图片
         """
+        if SoftSubtitle.is_soft():
+            # 软字幕模式不绘制，字幕时间由Activity收集
+            return
         pic_number = len(images)
         for subtitle in self.subtitle:
             start = subtitle[0]
@@ -1,5 +1,7 @@
 from typing import List, Optional, Union
 
+import numpy as np
+
 from libs import AudioHelper, ImageHelper
 from libs.RenderHelper import RenderHelper
 import utils
@@ -14,6 +16,8 @@ def Do(*, images : List[str], action: any, add_chars : bool=True):
         images: 一组背景图片
         action: Action instance
         add_chars: 如果仅仅针对背景图片切换镜头则设置False, 如果动作包含角色，需要设置True
+
+    绘制角色和镜头的缩放在同一次渲染中完成（每一帧只读写一次），全部帧的显示区域一次计算好
     
     Example:
     -
@@ -54,15 +58,11 @@ def Do(*, images : List[str], action: any, add_chars : bool=True):
     
     action.activity.scenario.ratio = to_ratio
     
-    if add_chars:
-        # 单独调用镜头动作的时候，需要绘制角色
-        # Use RenderHelper for frame-by-frame rendering
-        RenderHelper.render_characters_on_frames(images, action.activity.scenario.chars)
-
-    for i in range(0, length):
-        tmp_ratio = from_ratio + ratio_step * i
-        x = original_center[0] + step_x * i
-        y = original_center[1] + step_y * i
+    steps = np.arange(length)
+    centers = np.column_stack([original_center[0] + step_x * steps, original_center[1] + step_y * steps])
+    boxes = ImageHelper.camera_boxes(centers, from_ratio + ratio_step * steps)
 
-        tmp_img = ImageHelper.zoom_in_out_image(images[i], center=(x, y), ratio=tmp_ratio)
-        images[i] = tmp_img
\ No newline at end of file
+    # 单独调用镜头动作的时候，需要绘制角色；角色和缩放一次完成
+    RenderHelper.render_camera_frames(images,
+                                      action.activity.scenario.chars if add_chars else [],
+                                      boxes)
\ No newline at end of file
@@ -28,6 +28,7 @@ def Do(*, action: any, images : List[str], sorted_char_list : List[Character]):
     名称: 打斗
     角色: 武松 西门庆 刀 剑 (前两个是人物，后面两个是武器，武器可以省略)
     幅度: 小    # 小， 中， 大
+    随机种子: 7  # 可选，设置后每次生成相同的打斗动作（也可以在活动中设置），这样活动可以被缓存
     字幕: 
     - ['','', '', 'resources/ShengYin/游戏中打斗声音音效.mp3']
     渲染顺序: 6
@@ -53,8 +54,10 @@ def Do(*, action: any, images : List[str], sorted_char_list : List[Character]):
 
     delay_positions = []
     
-    random_list1 = [random.randint(-amplitude_value, amplitude_value) for _ in range(3)]
-    random_list2 = [random.randint(-amplitude_value, amplitude_value) for _ in range(3)]
+    seed = action.obj.get("随机种子", action.activity.obj.get("随机种子"))
+    rng = random.Random(seed) if seed is not None else random
+    random_list1 = [rng.randint(-amplitude_value, amplitude_value) for _ in range(3)]
+    random_list2 = [rng.randint(-amplitude_value, amplitude_value) for _ in range(3)]
     
     pos1 = (random_list1[0], random_list2[0])
     pos2 = (random_list1[1], random_list2[1])
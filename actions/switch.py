@@ -40,13 +40,14 @@ def Do(*, action: any, images : List[str], sorted_char_list : List[Character]):
             turn_image = None   # 需要旋转的图片
             for _char in other_chars:
                 if _char.display:
-                    _, turn_image = ImageHelper.merge_two_image(small_image=_char.image, 
-                                                                size=_char.size,
-                                                                pos=_char.pos,
-                                                                big_image=bg.image,
-                                                                big_image_obj=turn_image,
-                                                                rotate=_char.rotate,
-                                                                save=False)
+                    if turn_image is None:
+                        turn_image = ImageHelper.prepare_canvas(bg.image)
+                    ImageHelper.paste_sprite(turn_image,
+                                             _char.image,
+                                             size=_char.size,
+                                             pos=_char.pos,
+                                             rotate=_char.rotate,
+                                             signature=_char.signature)
             
             if turn_image:
                 size = turn_image.size
@@ -54,12 +55,14 @@ def Do(*, action: any, images : List[str], sorted_char_list : List[Character]):
                 new_size = [int(size[0] * ratio), int(size[1] * ratio)]
                 if new_size[0] <= 0 or new_size[1] <= 0:
                     continue
-                _, turn_image = ImageHelper.merge_two_image(small_image=turn_image, 
-                                            size=new_size, 
-                                            pos=[step_x * i, step_y * i], 
-                                            big_image=images[i], 
-                                            rotate=degree_per_step*i,
-                                            save=False)
+                small_image = turn_image
+                turn_image = ImageHelper.prepare_canvas(images[i])
+                ImageHelper.paste_sprite(turn_image,
+                                         small_image,
+                                         size=new_size, 
+                                         pos=[step_x * i, step_y * i], 
+                                         rotate=degree_per_step*i)
+                small_image.close()
 
-                turn_image.save(images[i])
+                ImageHelper.save_image(turn_image, images[i])
                 turn_image.close()
\ No newline at end of file
@@ -4,6 +4,7 @@ from typing import List, Optional, Union
 from actions import get_char, camera
 from character import Character
 from libs import ImageHelper
+from libs.RenderHelper import FrameJob, RenderHelper
 import utils
     
 def Do(*, action: any, images : List[str], sorted_char_list : List[Character], delay_mode : bool = False):
@@ -63,12 +64,8 @@ def Do(*, action: any, images : List[str], sorted_char_list : List[Character], d
             
     # for img in images:
     total_image = len(images)
+    frame_jobs = []
     for i in range(total_image):
-        img = images[i]
-        big_image = None
-        if hightlight:
-            big_image = ImageHelper.dark_image(img)
-        
         if not action.obj.get("变化", None) and not action.obj.get("焦点", None):
             # 当没有设置 变化 和 焦点 的时候
             # 让角色说话的时候有上下跳动的感觉 
@@ -89,26 +86,16 @@ def Do(*, action: any, images : List[str], sorted_char_list : List[Character], d
             action.char.pos[1] -= pos[1] * 0.5 * i / total_image
             action.char.size[1] += pos[1] * 0.5 * i / total_image
         
-        for _char in sorted_char_list:
-            if _char.display:
-                dark = False
-                if hightlight and _char.name != action.char.name:
-                    dark = True
-                _, big_image = ImageHelper.paint_char_on_image(image=img, 
-                                                                image_obj=big_image,
-                                                                char=_char, 
-                                                                save=False,
-                                                                gif_index=gif_index,
-                                                                dark=dark)
-                
-                if _char.name == action.char.name and action.obj.get("角色名牌"):
-                    big_image = ImageHelper.display_char_name(action.char, big_image, name=action.obj.get("角色名牌"))
-
-        if big_image:
-            big_image.save(img)
-            big_image.close()
+        # 先记录每一帧的角色状态，全部计算完之后再绘制（可以多进程并行）
+        chars = RenderHelper.snapshot_characters(
+            sorted_char_list,
+            dark=lambda _char: hightlight and _char.name != action.char.name,
+            name_plate=lambda _char: action.obj.get("角色名牌") if _char.name == action.char.name else None)
+        frame_jobs.append(FrameJob(i, chars, gif_index=gif_index, dark_background=hightlight))
         gif_index += 1
 
+    RenderHelper.render_frame_jobs(images, frame_jobs)
+
     action.char.pos = pos
     action.char.size = size
     action.char.image = initial_char_img
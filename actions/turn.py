@@ -1,7 +1,7 @@
 from typing import List, Optional, Union
 
 from character import Character
-from libs.RenderHelper import RenderHelper
+from libs.RenderHelper import FrameJob, RenderHelper
 
 def Do(*, action: any, images : List[str], sorted_char_list : List[Character], delay_mode : bool = False):
     """让角色转动，如左右转身，上下翻转，指定角度翻转
@@ -82,20 +82,16 @@ def Do(*, action: any, images : List[str], sorted_char_list : List[Character], d
         return delay_positions
 
     # Update character properties and render each frame
+    frame_jobs = []
     for i in range(total_feames):
         # Update the turning character's properties for this frame
         for _char in sorted_char_list:
             if _char.name == action.char.name:
                 RenderHelper.apply_character_properties(_char, delay_positions[i])
 
-        # Render this specific frame with updated properties
-        _, big_image = RenderHelper.render_characters_on_frame(
-            images[i],
-            sorted_char_list,
-            gif_index=i
-        )
-        if big_image:
-            big_image.save(images[i])
-            big_image.close()
+        # Snapshot this frame, the frames are rendered after all rotations are known
+        frame_jobs.append(FrameJob(i, RenderHelper.snapshot_characters(sorted_char_list), gif_index=i))
+
+    RenderHelper.render_frame_jobs(images, frame_jobs)
 
     return []
\ No newline at end of file
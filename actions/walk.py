@@ -6,7 +6,7 @@ from typing import List, Optional, Union
 from actions import disappear, get_char, logger
 from character import Character
 import config_reader
-from libs.RenderHelper import RenderHelper
+from libs.RenderHelper import FrameJob, RenderHelper
 from exceptions import (
     CharacterNotFoundError,
     InsufficientCharactersError,
@@ -210,6 +210,7 @@ def Do(*, action: any, images : List[str], sorted_char_list : List[Character], d
         return pos
     
     # Update character properties for each frame, then render all frames
+    frame_jobs = []
     for i in range(total_image_length):
         if i == (total_image_length - 1):
             if action.obj.get("结束角度"):
@@ -224,15 +225,10 @@ def Do(*, action: any, images : List[str], sorted_char_list : List[Character], d
             if _char.name == action.char.name:
                 RenderHelper.apply_character_properties(_char, pos[i])
 
-        # Render this specific frame with updated positions
-        _, big_image = RenderHelper.render_characters_on_frame(
-            images[i],
-            sorted_char_list,
-            gif_index=i
-        )
-        if big_image:
-            big_image.save(images[i])
-            big_image.close()
+        # Snapshot this frame, the frames are rendered after all positions are known
+        frame_jobs.append(FrameJob(i, RenderHelper.snapshot_characters(sorted_char_list), gif_index=i))
+
+    RenderHelper.render_frame_jobs(images, frame_jobs)
     
     if action.obj.get("结束消失", "否") == "是":
         disappear.Do(action)
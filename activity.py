@@ -2,35 +2,22 @@
 这个类用来解析script.yaml中的`活动:`
 """
 import math
-import queue
 import shutil
 import re
-import tempfile
-import threading
 
 import yaml
 
 import config_reader
 import utils
 from actions.action import *
-from libs import VideoHelper
+from libs import ActivityCache, AudioProbe, SoftSubtitle, SubtitleStage, VideoHelper
+from libs.AudioMixer import AudioMixer
+from libs.FrameStore import FrameStore
 from libs.RenderHelper import RenderHelper
 from logging_config import get_logger
 
 logger = get_logger(__name__)
 
-sem=threading.Semaphore(10)
-q = queue.Queue(10)
-def worker():
-    with sem:
-        while True:
-            text, images, subtitle_mode, text_list = q.get()
-            if text:
-                logger.debug(f"生成字幕: {text}")
-                for img in images:
-                    ImageHelper.add_text_to_image(img, text, overwrite_image=True, mode=subtitle_mode, text_list=text_list)
-            q.task_done()
-
 class Activity:
     """The Activity(活动) class"""
 
@@ -81,9 +68,23 @@ class Activity:
 
     def __check_images(self):
         """第一次执行action的时候, images会是空的, 所以需要生成一组图片
+        默认在内存中准备全部帧（FrameStore），只有config.yaml中设置了`frame_store: disk`时才使用图片文件
 
         Return:
-            一组图片
+            一组图片 (FrameStore或者图片路径列表)
+        """
+        if config_reader.frame_store == "disk":
+            return self.__check_image_files()
+
+        images = FrameStore.from_background(self.scenario.background_image, self.total_frame)
+        logger.info(f"准备背景图片结束，共计 {self.total_frame} 帧 (内存)")
+        return images
+
+    def __check_image_files(self):
+        """为每一帧复制一张背景图片到输出目录
+
+        Return:
+            一组图片路径
         """
         path = os.path.join(config_reader.output_dir, self.name)
         os.makedirs(path, exist_ok=True)
@@ -160,7 +161,8 @@ class Activity:
         if self.subtitle:
             if isinstance(self.subtitle, str):
                 # 处理字幕文件
-                self.subtitle = AudioHelper.get_sub_title_list(self.subtitle)
+                self.subtitle = AudioHelper.get_sub_title_list(self.subtitle, self.obj.get("发音人"),
+                                                               self.obj.get("发音人引擎"))
             for sb in self.subtitle:
                 sPath = sb[3]
                 if not os.path.exists(sPath):
@@ -172,7 +174,7 @@ class Activity:
                     except Exception as e:
                         logger.error(f"TTS转换失败: {sb[2]}")
                         raise
-                subtitle_length += AudioFileClip(sPath).duration
+                subtitle_length += AudioProbe.get_duration(sPath)
 
         # 全部动作的长度
         action_length = 0.0
@@ -232,6 +234,7 @@ class Activity:
         self.subtitle = obj.get("字幕") if obj.get("字幕") else []
         self.subtitle_color = obj.get("字幕颜色")
         self.subtitle_mode = obj.get("字幕样式", 'normal')
+        self.cues = []  # 渲染后的字幕时间，参考SoftSubtitle
         
         # 在活动节点中设置的时间，与具体动作无关
         self.keep = utils.get_time(obj.get("持续时间", None))
@@ -250,12 +253,94 @@ class Activity:
         duration = datetime.datetime.now() - start
         logger.debug(f"初始化Activity【{self.name}】， 共花费：{duration.seconds}秒")
 
+    def __mix_audio(self, duration):
+        """把活动的背景音乐、活动字幕声音和动作字幕声音混合成一条音轨
+
+        Params:
+            duration: 视频的时长（秒）
+        Return:
+            float32数组 (采样点数, 声道数)，参考AudioMixer.to_array；没有声音时返回None
+        """
+        mixer = AudioMixer(duration)
+        if self.bgm:
+            """添加活动背景音乐"""
+            logger.info(f"添加背景音乐: {self.bgm} (音量: {config_reader.audio_volume_boost}x)")
+
+            if self.bgm_mode == "循环":
+                bgm_duration = mixer.duration_of(self.bgm)
+                _start = 0
+                _end = duration - bgm_duration
+                # BGM循环模式音量较小，应用0.2倍基础音量，再乘以用户设置的增强倍数
+                bgm_volume = 0.2 * config_reader.audio_volume_boost
+                while _start < _end:
+                    mixer.add(self.bgm, start=_start, gain=bgm_volume)
+                    _start += bgm_duration
+            else:
+                mixer.add(self.bgm, gain=config_reader.audio_volume_boost)
+        if self.subtitle:
+            # 添加字幕声音 -- 活动的字幕，从第一个字幕开始依次连续播放
+            audio_list = [st[3] for st in self.subtitle if len(st) > 3 and st[3]]
+            logger.debug(f"从字幕中提取到 {len(audio_list)} 个音频文件")
+            if audio_list:
+                logger.info(f"添加活动字幕音频: {len(audio_list)} 个音频片段 (音量: {config_reader.audio_volume_boost}x)")
+                _start = self.subtitle[0][0]
+                for audio in audio_list:
+                    mixer.add(audio, start=_start, gain=config_reader.audio_volume_boost)
+                    _start += mixer.duration_of(audio)
+
+        for actions in self.action_list:
+            # 添加动作的声音
+            start = actions[0]["start"] * duration
+            for act in actions:
+                if act["action"].subtitle:
+                    logger.debug(f"动作 {act['action'].name} 有 {len(act['action'].subtitle)} 个字幕音频")
+                    for subtitle in act["action"].subtitle:
+                        logger.info(f"添加动作字幕音频: {subtitle[2]} -> {subtitle[3]} (音量: {config_reader.audio_volume_boost}x)")
+                        mixer.add(subtitle[3], start=(start + subtitle[0]), gain=config_reader.audio_volume_boost)
+        return mixer.to_array()
+
     def to_video(self):
         """
         将‘活动’转换成视频
+        config.yaml中设置了`activity_cache: true`时，脚本片段、角色状态、素材和配置都没有变化的活动直接使用缓存的视频片段
 
         Return:
-            视频片段clip
+            (视频片段文件路径, 时长)，片段由调用者使用之后删除（参考VideoHelper.write_scenario_video）
+        """
+        key = ActivityCache.activity_key(self) if config_reader.activity_cache else None
+        if key:
+            cached = ActivityCache.load(key, self.scenario)
+            if cached:
+                self.cues = ActivityCache.load_cues(key)
+                return cached
+
+        segment, duration = self.__render()
+        if key:
+            ActivityCache.save(key, segment, duration, self.scenario, self.cues)
+        return segment, duration
+
+    def __collect_cues(self, duration):
+        """活动字幕和动作字幕的时间，用于输出软字幕
+
+        Params:
+            duration: 视频的时长（秒）
+        Return:
+            [(开始时间, 结束时间, 文字)]，时间从活动开始计算
+        """
+        cues = [(sb[0], sb[1], sb[2]) for sb in self.subtitle]
+        for actions in self.action_list:
+            # 与 __mix_audio 中动作声音的开始时间相同
+            start = actions[0]["start"] * duration
+            for act in actions:
+                cues += [(start + sb[0], start + sb[1], sb[2]) for sb in act["action"].subtitle]
+        return SoftSubtitle.normalize(cues)
+
+    def __render(self):
+        """
+        渲染全部动作、字幕和声音
+
+        Return:
+            (视频片段文件路径, 时长)
         """
         images = self.__check_images()
 
@@ -365,65 +450,23 @@ class Activity:
             # Use RenderHelper for frame-by-frame rendering
             RenderHelper.render_characters_on_frames(images, self.scenario.chars)
                     
-        if self.subtitle:
+        if self.subtitle and not SoftSubtitle.is_soft():
             logger.debug(f"字幕信息:\n{self.subtitle}")
-            # daemon：结束主进程的时候可以同时结束子线程
-            threading.Thread(target=worker, daemon=True).start()
+            subtitles = []
             l = len(self.subtitle)
             for i in range(0, l):
-                # 创建新线程
                 start_num = self.subtitle[i][-1][0]
                 end_number = self.subtitle[i][-1][1]
                 logger.debug(f"处理字幕片段 {i+1}/{l}: start_num={start_num}, end_number={end_number}")
-                tmp_images = images[start_num : end_number]
                 text_list = [x[2] for x in self.subtitle[0 if i < 2 else i - 1 : i + 2]]    # 最多显示3行文字
-                q.put((self.subtitle[i][2], tmp_images, self.subtitle_mode, text_list))
-
-        # 等待所有线程完成
-        q.join()
-
-        # 先把图片转换成视频
-        video = VideoHelper.create_video_clip_from_images(images, self.fps)
-        if self.bgm:
-            """添加活动背景音乐"""
-            logger.info(f"添加背景音乐: {self.bgm} (音量: {config_reader.audio_volume_boost}x)")
-
-            if self.bgm_mode == "循环":
-                bgm_duration = AudioFileClip(self.bgm).duration
-                _start = 0
-                _end = video.duration - bgm_duration
-                # BGM循环模式音量较小，应用0.2倍基础音量，再乘以用户设置的增强倍数
-                bgm_volume = 0.2 * config_reader.audio_volume_boost
-                while _start < _end:
-                    video = VideoHelper.add_audio_to_video(video, self.bgm, start=_start, factor=bgm_volume)
-                    _start += bgm_duration
-            else:
-                video = VideoHelper.add_audio_to_video(video, self.bgm, factor=config_reader.audio_volume_boost)
-        if self.subtitle:
-            # 添加字幕声音 -- 活动的字幕
-            logger.debug(f"活动 {self.name} 有 {len(self.subtitle)} 个字幕")
-            audio_list = [AudioFileClip(st[3]).with_start(st[0]) for st in self.subtitle if len(st) > 3 and st[3]]
-            logger.debug(f"从字幕中提取到 {len(audio_list)} 个音频文件")
-            if audio_list:
-                fd, tmp_audio_path = tempfile.mkstemp(suffix=".mp3")
-                logger.debug(f"组装 {len(audio_list)} 个音频片段并保存到临时文件: {tmp_audio_path}")
-                concatenate_audioclips(audio_list).write_audiofile(tmp_audio_path, logger=None)
-                logger.info(f"添加活动字幕音频: {len(audio_list)} 个音频片段 (音量: {config_reader.audio_volume_boost}x)")
-                video = VideoHelper.add_audio_to_video(video, tmp_audio_path, start=self.subtitle[0][0], factor=config_reader.audio_volume_boost)
-        
-        video_total_length = video.duration
-        for actions in self.action_list:
-            # 添加动作的声音
-            action_ends = []
-            start = actions[0]["start"] * video_total_length
-            for act in actions:
-                if act["action"].subtitle:
-                    logger.debug(f"动作 {act['action'].name} 有 {len(act['action'].subtitle)} 个字幕音频")
-                    action_ends.append(act["action"].subtitle[-1][1])
-                    for subtitle in act["action"].subtitle:
-                        logger.info(f"添加动作字幕音频: {subtitle[2]} -> {subtitle[3]} (音量: {config_reader.audio_volume_boost}x)")
-                        video = VideoHelper.add_audio_to_video(video, subtitle[3], start=(start + subtitle[0]), factor=config_reader.audio_volume_boost)
-        return video
+                subtitles.append((start_num, end_number, self.subtitle[i][2], text_list))
+            # 多个线程按照帧的范围同时绘制，全部完成（或者出错）后才返回
+            SubtitleStage.burn_subtitles(images, subtitles, self.subtitle_mode)
+
+        # 图片和混合好的声音通过管道写入视频片段文件
+        duration = len(images) / self.fps
+        self.cues = self.__collect_cues(duration)
+        return VideoHelper.write_video_segment(images, self.fps, name=self.name, audio=self.__mix_audio(duration))
 
 if __name__ == "__main__":
     with open('script.yaml', 'r') as file:
@@ -20,6 +20,9 @@ system_font_dir = config["system_font_dir"]
 font = config["font"]
 video_format = ".mp4"
 tts_engine = config["tts_engine"]
+tts_engines = dict(config.get("tts_engines") or {})   # 其他语音引擎 {名字: 模块名}，参考 libs/TTSEngine/registry.py
+cache_dir = config.get("cache_dir", os.path.join(output_dir, "cache"))   # 缓存目录（活动视频片段等）
+chat_tts = dict(config.get("chat_tts") or {})   # ChatTTS引擎的设置（线程数、int8量化等），参考 libs/TTSEngine/chat.py ChatEngine
 
 
 # Personal settings
@@ -30,4 +33,34 @@ g_width = int(config["g_width"])
 g_height = int(config["g_height"])
 round_per_second = config["round_per_second"]
 font_size = int(config["font_size"])
-audio_volume_boost = float(config.get("audio_volume_boost", 1.0))  # 音频音量增强倍数，默认1.0不增强
\ No newline at end of file
+audio_volume_boost = float(config.get("audio_volume_boost", 1.0))  # 音频音量增强倍数，默认1.0不增强
+frame_store = config.get("frame_store", "memory")    # 帧的存储方式: memory (内存), memmap (磁盘映射), disk (每帧一个图片文件，较慢)
+frame_memory_budget = int(config.get("frame_memory_budget", 2048))  # 单个活动的帧在内存中的上限(MB)，超出后使用memmap
+sprite_cache_size = int(config.get("sprite_cache_size", 256))  # 角色图片缓存的上限(MB)
+jobs = int(config.get("jobs", 1))   # 渲染帧使用的进程数
+subtitle_workers = int(config.get("subtitle_workers", 0))   # 绘制字幕使用的线程数，0表示CPU核数
+subtitle_output = config.get("subtitle_output", "burn")   # 字幕输出方式: burn (绘制到画面上), srt, ass (与视频同名的字幕文件), track (视频中的文字轨道)
+activity_cache = bool(config.get("activity_cache", True))  # 是否缓存渲染好的活动视频片段
+pcm_cache = bool(config.get("pcm_cache", True))  # 是否把解码后的声音保存到cache_dir/pcm (.npy)，之后通过mmap读取
+tts_cache = bool(config.get("tts_cache", True))  # 是否缓存合成好的语音 (cache_dir/tts)
+tts_cache_size = int(config.get("tts_cache_size", 1024))  # 语音缓存的上限(MB)，超出后淘汰最久未使用的语音
+tts_engine_override = os.getenv("MOVIEMAKER_TTS_ENGINE", config.get("tts_engine_override") or "")  # 所有字幕都使用这个引擎（如离线引擎tone）
+tts_concurrency = dict(config.get("tts_concurrency") or {})  # 预先合成语音时每个引擎同时运行的任务数，没有设置的引擎为1
+tts_rate_limit = dict(config.get("tts_rate_limit") or {})  # 网络语音引擎每秒最多发送的请求数，没有设置或0表示不限制
+tts_retries = int(config.get("tts_retries", 3))  # 网络语音引擎遇到临时错误（连接错误、超时、429/5xx）时的重试次数
+duration_index = bool(config.get("duration_index", True))  # 是否把声音文件的时长保存到cache_dir/durations.json
+
+
+def get_runtime_config() -> dict:
+    """返回当前的配置值（包括运行时修改过的output_dir、jobs等），用于传给子进程"""
+    return {name: value for name, value in globals().items()
+            if not name.startswith("_") and isinstance(value, (bool, int, float, str))}
+
+
+def apply_runtime_config(values: dict) -> None:
+    """在子进程中恢复父进程的配置值
+
+    Params:
+        values: get_runtime_config() 的返回值
+    """
+    globals().update(values)
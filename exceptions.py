@@ -410,6 +410,21 @@ class TTSException(AudioException):
         super().__init__(message, details)
 
 
+class TTSPrefetchError(AudioException):
+    """
+    预先合成语音时有字幕合成失败 / Some subtitles failed during TTS prefetch
+    """
+    def __init__(self, failures: List[str]):
+        message = f"预先合成语音失败，共 {len(failures)} 条字幕"
+        details = {"failures": failures}
+        super().__init__(message, details)
+        self.failures = failures
+
+    def __str__(self) -> str:
+        failure_list = "\n  - ".join(self.failures)
+        return f"{self.message}:\n  - {failure_list}"
+
+
 class AudioProcessingError(AudioException):
     """
     音频处理错误 / Audio processing error
@@ -0,0 +1,233 @@
+#!/usr/bin/python3
+"""
+ActivityCache - 活动视频片段缓存
+
+修改长脚本中的一句台词时，不需要重新渲染全部活动。
+每个活动根据以下内容计算一个缓存键：
+    - 活动在script.yaml中的片段（素材、声音等文件使用文件内容的hash代替路径）
+    - 开始渲染时全部角色的状态（位置、大小、角度、图层、素材等）
+    - 场景的背景图片以及焦点、比例
+    - config.yaml中影响画面与声音的配置
+    - 渲染代码的版本（RENDER_SOURCES中源文件内容的hash）
+缓存目录中保存渲染好的视频片段（VideoHelper.write_video_segment生成的文件）和活动结束后的角色状态，
+命中缓存时直接恢复角色状态并返回缓存的视频片段。
+片段文件通过硬链接保存和取出（不支持硬链接时复制），不会重新编码。
+"""
+import functools
+import glob
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+from typing import Any, Optional, Tuple
+
+sys.path.append('../')
+
+import config_reader
+from libs import VideoHelper
+from libs.FileDigest import file_digest
+
+from logging_config import get_logger
+logger = get_logger(__name__)
+
+# 影响活动画面与声音的源代码（相对于项目根目录），内容变化时缓存键也会变化，旧的缓存自动失效
+RENDER_SOURCES = ("activity.py", "scenario.py", "character.py", "font.py", "constants.py", "utils.py",
+                  "actions/*.py", "libs/*.py")
+
+# 影响活动画面与声音的配置
+CONFIG_KEYS = ("fps", "g_width", "g_height", "watermark", "round_per_second", "font", "font_size", "audio_volume_boost",
+               "subtitle_output")
+
+# 不保存到缓存中的角色属性（gif_frames是每次运行时生成的临时文件，`更新`动作也不会修改它）
+_SKIPPED_CHAR_ATTRS = ("gif_frames",)
+
+
+def _normalize(value: Any) -> Any:
+    """把值中存在的文件路径替换成文件内容的hash，这样文件内容变化时缓存键也会变化，
+    而输出目录等路径的变化不会影响缓存键
+    """
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, str) and value and os.path.isfile(value):
+        return "file:" + file_digest(value)
+    return value
+
+
+@functools.lru_cache(maxsize=None)
+def code_version() -> str:
+    """渲染代码的版本：RENDER_SOURCES中全部源文件内容的hash，每个进程只计算一次"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    digest = hashlib.sha256()
+    for pattern in RENDER_SOURCES:
+        for path in sorted(glob.glob(os.path.join(root, pattern))):
+            digest.update(os.path.relpath(path, root).replace(os.sep, "/").encode("utf-8"))
+            with open(path, "rb") as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+
+def _char_state(char) -> dict:
+    """角色的当前状态（可以保存为json）"""
+    return {k: v for k, v in vars(char).items() if k not in _SKIPPED_CHAR_ATTRS}
+
+
+def _to_json(value: Any) -> Any:
+    """json没有元组，元组保存为 {"__tuple__": [...]}，读取时使用_from_json恢复"""
+    if isinstance(value, tuple):
+        return {"__tuple__": [_to_json(v) for v in value]}
+    if isinstance(value, list):
+        return [_to_json(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _to_json(v) for k, v in value.items()}
+    return value
+
+
+def _from_json(value: Any) -> Any:
+    """_to_json的逆操作"""
+    if isinstance(value, list):
+        return [_from_json(v) for v in value]
+    if isinstance(value, dict):
+        if set(value) == {"__tuple__"}:
+            return tuple(_from_json(v) for v in value["__tuple__"])
+        return {k: _from_json(v) for k, v in value.items()}
+    return value
+
+
+def _is_cacheable(activity) -> bool:
+    """`打斗`动作使用随机位置，只有设置了`随机种子`的时候结果才是确定的"""
+    for act in activity.actions:
+        if act.name == "打斗" and act.obj.get("随机种子", activity.obj.get("随机种子")) is None:
+            logger.info(f"活动【{activity.name}】中的打斗动作没有设置`随机种子`，不使用缓存")
+            return False
+    return True
+
+
+def activity_key(activity) -> Optional[str]:
+    """计算活动的缓存键，必须在渲染活动之前调用（渲染时会修改角色状态）
+
+    Params:
+        activity: Activity对象实例
+    Return:
+        缓存键；活动不能被缓存的时候返回None
+    """
+    if not _is_cacheable(activity):
+        return None
+    scenario = activity.scenario
+    content = {
+        "version": code_version(),
+        "activity": activity.obj,
+        "fps": activity.fps,
+        "chars": [_char_state(c) for c in scenario.chars],
+        "background": scenario.background_image,
+        "focus": scenario.focus,
+        "ratio": scenario.ratio,
+        "config": {k: getattr(config_reader, k, None) for k in CONFIG_KEYS},
+    }
+    data = json.dumps(_normalize(content), sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def _entry_paths(key: str) -> tuple:
+    path = os.path.join(config_reader.cache_dir, "activities", key[:2])
+    return os.path.join(path, f"{key}.mov"), os.path.join(path, f"{key}.json")
+
+
+def _link(source: str, target: str) -> None:
+    """使用硬链接生成target（先生成临时文件再重命名），不支持硬链接（比如跨文件系统）时复制"""
+    fd, tmp = tempfile.mkstemp(suffix=os.path.splitext(target)[1], dir=os.path.dirname(target))
+    os.close(fd)
+    os.remove(tmp)
+    try:
+        os.link(source, tmp)
+    except OSError:
+        shutil.copyfile(source, tmp)
+    os.replace(tmp, target)
+
+
+def load(key: str, scenario) -> Optional[Tuple[str, float]]:
+    """读取缓存的活动视频，并把角色和场景恢复到活动结束时的状态
+
+    Params:
+        key: activity_key() 的返回值
+        scenario: 活动所在的Scenario对象实例
+    Return:
+        (视频片段文件路径, 时长)，片段是 output_dir/segments 中缓存文件的硬链接，使用之后可以删除；
+        没有缓存时返回None
+    """
+    video_path, meta_path = _entry_paths(key)
+    if not (os.path.exists(meta_path) and os.path.exists(video_path)):
+        return None
+    with open(meta_path, encoding="utf-8") as f:
+        meta = json.load(f)
+
+    chars = {c.name: c for c in scenario.chars}
+    if set(chars) != set(s["name"] for s in meta["chars"]):
+        logger.warning(f"活动缓存 {key} 中的角色与场景不一致，重新渲染")
+        return None
+    for state in meta["chars"]:
+        for attr, value in state.items():
+            setattr(chars[state["name"]], attr, _from_json(value))
+    order = [s["name"] for s in meta["chars"]]
+    scenario.chars.sort(key=lambda c: order.index(c.name))  # 原地排序，动作中引用的是同一个列表
+    scenario.focus = _from_json(meta["focus"])
+    scenario.ratio = _from_json(meta["ratio"])
+
+    logger.info(f"使用活动缓存: {video_path}")
+    segment = VideoHelper.new_segment_path(key[:16], os.path.splitext(video_path)[1])
+    _link(video_path, segment)
+    return segment, meta["duration"]
+
+
+def load_cues(key: str) -> list:
+    """读取缓存的活动字幕时间
+
+    Params:
+        key: activity_key() 的返回值
+    Return:
+        [(开始时间, 结束时间, 文字)]
+    """
+    _, meta_path = _entry_paths(key)
+    with open(meta_path, encoding="utf-8") as f:
+        return [tuple(cue) for cue in json.load(f).get("cues", [])]
+
+
+def save(key: str, segment: str, duration: float, scenario, cues: Optional[list] = None) -> None:
+    """保存渲染好的活动视频和活动结束时的角色状态
+
+    片段文件通过硬链接保存，不重新编码；先写入临时文件再重命名，多个进程同时渲染同一个活动时也不会读到不完整的缓存。
+
+    Params:
+        key: activity_key() 的返回值
+        segment: VideoHelper.write_video_segment生成的视频片段文件
+        duration: 视频片段的时长
+        scenario: 活动所在的Scenario对象实例
+        cues: 活动的字幕时间 [(开始时间, 结束时间, 文字)]，软字幕模式使用
+    """
+    chars = [_to_json(_char_state(c)) for c in scenario.chars]
+    meta = {
+        "duration": duration,
+        "chars": chars,
+        "focus": _to_json(scenario.focus),
+        "ratio": _to_json(scenario.ratio),
+        "cues": [list(cue) for cue in cues or []],
+    }
+    try:
+        meta_data = json.dumps(meta, ensure_ascii=False)
+    except TypeError as e:
+        logger.warning(f"活动结束时的角色状态不能保存，不使用缓存: {e}")
+        return
+
+    video_path, meta_path = _entry_paths(key)
+    os.makedirs(os.path.dirname(video_path), exist_ok=True)
+    _link(segment, video_path)
+
+    fd, tmp_meta = tempfile.mkstemp(suffix=".json", dir=os.path.dirname(meta_path))
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(meta_data)
+    os.replace(tmp_meta, meta_path)
+
+    logger.debug(f"保存活动缓存: {video_path}")
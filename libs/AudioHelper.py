@@ -1,73 +1,143 @@
+import hashlib
+import json
 import os
+import re
+import tempfile
 
+import numpy as np
 from pydub import AudioSegment
 import TTSEngine
-import TTSEngine.chat
-import TTSEngine.xunfei_tts
-import TTSEngine.ttspro
+from TTSEngine import registry
 import config_reader
+from libs import PCMCache
+from libs.FileDigest import file_digest
+from libs.TTSCache import TTSCache, tts_cache
 
 from logging_config import get_logger
 logger = get_logger(__name__)
 
+def resolve_tts_engine(ttsengine=None):
+    """实际使用的语音引擎：设置了 tts_engine_override 时总是使用它，否则是指定的引擎或者默认引擎"""
+    return config_reader.tts_engine_override or ttsengine or config_reader.tts_engine
+
 def covert_text_to_sound(text, output, speaker, ttsengine="xunfei", stype="calm"):
     """
     将文字转换成语音
+    相同 (引擎, 发音人, 语气, 文字) 的语音只合成一次，之后从TTSCache复制（硬链接）
 
     Params:
         text: 文字
         output: 输出的语音文件
         speaker: 发音人
-        ttsengine: 文自传语音引擎， 暂时支持: chat, xunfei, ttspro
-        style： 语气
+        ttsengine: 文字转语音引擎，默认使用global_config.yaml的tts_engine，如: chat, xunfei, ttspro, tone (参考 TTSEngine/registry.py)
+        stype: 语气
     Return:
-        语音文件路径
+        语音文件路径；引擎不存在时返回None
     """
     
     if os.path.exists(output):
         return output
     
-    if not ttsengine:
-        ttsengine = config_reader.tts_engine
+    ttsengine = resolve_tts_engine(ttsengine)
+    engine = registry.get(ttsengine)
+    if engine is None:
+        return None
+    if config_reader.tts_cache and tts_cache.fetch(ttsengine, speaker, stype, text, output):
+        return output
     logger.info(f"使用引擎 '{ttsengine}' 生成音频文件")
 
-    if ttsengine=="xunfei":
-        return TTSEngine.xunfei_tts.covert_text_to_sound(text=text, output=output, speaker=speaker)
-    elif ttsengine=="chat":
-        return TTSEngine.chat.covert_text_to_sound(text=text, output=output, speaker=speaker)
-    elif ttsengine=="ttspro":
-        return TTSEngine.ttspro.covert_text_to_sound(text=text, output=output, speaker=speaker)
+    engine.covert_text_to_sound(text=text, output=output, speaker=speaker)
+
+    if config_reader.tts_cache:
+        tts_cache.store(ttsengine, speaker, stype, text, output)
+    return output
+
+def covert_batch_to_sound(items, ttsengine="xunfei", stype="calm"):
+    """
+    批量将文字转换成语音，已经存在或者在TTSCache中的语音不再合成
+    引擎提供covert_batch_to_sound时批量合成：ChatTTS把同一个发音人的句子放在一次推理中合成，
+    xunfei和ttspro同时发送多个请求（有并发数和速率限制）
+
+    Params:
+        items: [(文字, 输出的语音文件, 发音人)]
+        ttsengine: 文字转语音引擎，默认使用global_config.yaml的tts_engine
+        stype: 语气
+    """
+    ttsengine = resolve_tts_engine(ttsengine)
+    engine = registry.get(ttsengine)
+    pending = [(text, output, speaker) for text, output, speaker in items
+               if not os.path.exists(output)
+               and not (config_reader.tts_cache and tts_cache.fetch(ttsengine, speaker, stype, text, output))]
+    if not pending:
+        return
+    if not hasattr(engine, "covert_batch_to_sound"):
+        for text, output, speaker in pending:
+            covert_text_to_sound(text, output, speaker, ttsengine=ttsengine, stype=stype)
+        return
+
+    logger.info(f"使用引擎 '{ttsengine}' 批量生成 {len(pending)} 个音频文件")
+    try:
+        engine.covert_batch_to_sound(pending)
+    finally:
+        # 部分句子失败时，已经生成的句子也要保存到缓存
+        if config_reader.tts_cache:
+            for text, output, speaker in pending:
+                tts_cache.store(ttsengine, speaker, stype, text, output)
 
 def split_audio(audio_file: str, length=None, start=0):
     """截取音频文件
         新文件会保存在相同目录, 新文件名： 原文件名_bak.原文件后缀
+        原始音频按照原来的采样率和声道数从PCMCache读取（已经缓存时不需要解码）
     
     Params:
         audio_file: 原始音频文件
         length: 截取的片段长度, 单位毫秒
         start: 截取音频的开始位置
     """
-    mp3 = AudioSegment.from_file(audio_file)
-    if not length:
-        new_audio = mp3[start:]
-    elif not start:
-        new_audio = mp3[0:length]
-    else:
-        new_audio = mp3[start: start + length]
+    fps, channels = PCMCache.probe_format(audio_file)
+    samples = PCMCache.load_pcm(audio_file, fps, channels)
+    begin = int(start * fps / 1000)
+    end = len(samples) if not length else begin + int(length * fps / 1000)
+    pcm = (np.clip(samples[begin:end], -1, 1) * 32767).astype(np.int16)
+    new_audio = AudioSegment(pcm.tobytes(), sample_width=2, frame_rate=fps, channels=channels)
     file_name, file_extension =  os.path.splitext(audio_file)
     format = file_extension.replace(".", "")
-    new_audio.export(file_name + "_bak" + file_extension, format=format)
+    new_audio.export(file_name + "_bak" + file_extension, format=format).close()
+
+def _subtitle_dir():
+    return os.path.join(config_reader.cache_dir, "subtitles")
 
-def get_sub_title_list(file):
+def subtitle_sound_path(text, speaker, ttsengine, stype="calm"):
+    """字幕文件中一句话的声音文件路径，按照 (引擎, 发音人, 语气, 文字) 命名，不同字幕文件中的句子不会重名"""
+    key = TTSCache.key(ttsengine, speaker, stype, text)
+    return os.path.join(_subtitle_dir(), key[:2], key + ".mp3")
+
+def get_sub_title_list(file, speaker=None, ttsengine=None):
     """根据文本文件生成字幕列表
+    全部句子一起交给covert_batch_to_sound同时合成，声音保存在 cache_dir/subtitles 下（参考subtitle_sound_path）；
+    解析结果按照字幕文件的内容缓存，文件没有变化时不再解析和合成
 
     Params:
-        file: 字幕文件
+        file: 字幕文件，或者字幕字符串
+        speaker: 发音人，默认使用字幕文件名
+        ttsengine: 文字转语音引擎，默认使用global_config.yaml的tts_engine
     Return:
         能被MovieMaker识别的字幕列表
     """
+    is_file = os.path.exists(file)
+    speaker = speaker or os.path.basename(file)
+    ttsengine = resolve_tts_engine(ttsengine)
+    source = file_digest(file) if is_file else hashlib.sha256(file.encode("utf-8")).hexdigest()
+    key = hashlib.sha256(json.dumps([source, ttsengine, str(speaker)], ensure_ascii=False).encode("utf-8")).hexdigest()
+    index_path = os.path.join(_subtitle_dir(), "lists", key + ".json")
+    if os.path.exists(index_path):
+        with open(index_path, encoding="utf-8") as f:
+            subtitles = json.load(f)
+        if all(os.path.exists(sb[3]) for sb in subtitles):
+            logger.debug(f"使用缓存的字幕列表: {file} -> {index_path}")
+            return subtitles
 
-    if os.path.exists(file):
+    if is_file:
         # 处理字幕文件
         with open(file, 'r') as f:
             text = f.read()
@@ -76,19 +146,22 @@ def get_sub_title_list(file):
         # 以分号分隔的字幕字符串
         lines = file.split(r'\;\s\,')
 
-    basename = os.path.basename(file)
-    new_lines = []
-    subtitles = []
-    for i in range(0, len(lines)):
-        if lines[i].strip():
-            sound = covert_text_to_sound(lines[i].strip(), f"{i}.mp3", basename)
-            new_lines.append(f"- ['', '', '{lines[i].strip()}', '{sound}']\n")
-            subtitles.append(['', '', lines[i].strip(), sound])
-
-    new_path = os.path.join(os.path.dirname(file), os.path.basename(file).split('.')[0]+"_sound.txt")
-    with open(new_path, 'w') as fn:
-        fn.writelines(new_lines)
-    logger.info(f"字幕信息已写入文件: {new_path}")
+    subtitles = [['', '', line.strip(), subtitle_sound_path(line.strip(), speaker, ttsengine)]
+                 for line in lines if line.strip()]
+    # 相同的句子只合成一次
+    covert_batch_to_sound(list({sb[3]: (sb[2], sb[3], speaker) for sb in subtitles}.values()), ttsengine=ttsengine)
+
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(suffix=".json", dir=os.path.dirname(index_path))
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(subtitles, f, ensure_ascii=False)
+    os.replace(tmp, index_path)
+
+    if is_file:
+        new_path = os.path.join(os.path.dirname(file), os.path.basename(file).split('.')[0]+"_sound.txt")
+        with open(new_path, 'w') as fn:
+            fn.writelines(f"- ['', '', '{sb[2]}', '{sb[3]}']\n" for sb in subtitles)
+        logger.info(f"字幕信息已写入文件: {new_path}")
     return subtitles
 
 if __name__ == "__main__":
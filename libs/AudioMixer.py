@@ -0,0 +1,91 @@
+#!/usr/bin/python3
+"""
+AudioMixer - 活动的声音混音器
+
+VideoHelper.add_audio_to_video 每调用一次就会把之前的声音再包一层CompositeAudioClip，
+活动中的背景音乐循环和每一句字幕声音叠加之后，写入视频时每一段声音都要重新计算整棵树。
+AudioMixer 把每个声音文件只解码一次（PCM，通过PCMCache缓存），按照采样点位置叠加到一条float32的时间线上，
+最后只生成一条音轨交给编码器。
+"""
+import sys
+from typing import Dict, Optional
+
+sys.path.append('../')
+import numpy as np
+from moviepy import AudioArrayClip
+
+from libs.PCMCache import CHANNELS, SAMPLE_RATE, load_pcm
+
+from logging_config import get_logger
+logger = get_logger(__name__)
+
+
+class AudioMixer:
+    """把多个声音按照开始时间和音量混合成一条音轨"""
+
+    def __init__(self, duration: float, fps: int = SAMPLE_RATE, channels: int = CHANNELS):
+        """
+        Params:
+            duration: 音轨的时长（秒），超出的声音会被截掉
+            fps: 采样率
+            channels: 声道数
+        """
+        self.fps = fps
+        self.channels = channels
+        self.timeline = np.zeros((int(round(duration * fps)), channels), dtype=np.float32)
+        self.sources = 0
+        self._decoded: Dict[str, np.ndarray] = {}
+
+    def decode(self, path: str) -> np.ndarray:
+        """解码声音文件（或者从PCMCache读取），同一个文件只读取一次"""
+        samples = self._decoded.get(path)
+        if samples is None:
+            samples = load_pcm(path, self.fps, self.channels)
+            self._decoded[path] = samples
+        return samples
+
+    def duration_of(self, path: str) -> float:
+        """声音文件的时长（秒）"""
+        return len(self.decode(path)) / self.fps
+
+    def add(self, path: str, start: float = 0, gain: float = 1) -> None:
+        """把一个声音文件叠加到时间线上
+
+        Params:
+            path: 声音文件
+            start: 开始时间（秒）
+            gain: 音量倍数
+        """
+        samples = self.decode(path)
+        offset = int(round(start * self.fps))
+        end = min(offset + len(samples), len(self.timeline))
+        if offset >= end:
+            logger.warning(f"声音 {path} 的开始时间({start:.2f}s)超出了音轨长度，已忽略")
+            return
+        if offset + len(samples) > len(self.timeline):
+            logger.warning(f"声音 {path} 超出了音轨长度({len(self.timeline) / self.fps:.2f}s)，对声音进行裁减")
+        segment = samples[:end - offset]
+        if gain != 1:
+            segment = segment * np.float32(gain)
+        self.timeline[offset:end] += segment
+        self.sources += 1
+
+    def to_array(self) -> Optional[np.ndarray]:
+        """返回混合好的音轨，超出 [-1, 1] 的采样点会被截断
+
+        Return:
+            float32数组 (采样点数, 声道数)；没有添加任何声音时返回None
+        """
+        if not self.sources:
+            return None
+        np.clip(self.timeline, -1, 1, out=self.timeline)
+        return self.timeline
+
+    def to_audio_clip(self) -> Optional[AudioArrayClip]:
+        """返回混合好的音轨，参考to_array
+
+        Return:
+            AudioArrayClip；没有添加任何声音时返回None
+        """
+        timeline = self.to_array()
+        return None if timeline is None else AudioArrayClip(timeline, fps=self.fps)
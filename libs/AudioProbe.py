@@ -0,0 +1,214 @@
+#!/usr/bin/python3
+"""
+AudioProbe - 声音时长服务
+
+字幕声音的时长会在 Action、Activity 和 utils.get_audio_length 中多次读取，
+以前每次都用 AudioFileClip 打开文件（每次启动一个ffmpeg进程）。
+这里只读取文件头：wav文件使用wave模块，其他格式使用一次 `ffmpeg -i a -i b ...` 批量读取，
+结果按照 (路径, 修改时间, 大小) 缓存在内存中，
+config.yaml中设置了`duration_index: true`时还会保存到 cache_dir/durations.json
+（probe_durations 结束时或者程序退出时写入一次，get_duration 读取新文件时不会每次都重写索引）。
+"""
+import atexit
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import wave
+from typing import Dict, Iterable, List, Optional
+
+sys.path.append('../')
+import imageio_ffmpeg
+
+import config_reader
+from libs.PCMCache import SAMPLE_RATE, load_pcm
+
+from logging_config import get_logger
+logger = get_logger(__name__)
+
+AUDIO_EXTENSIONS = (".mp3", ".wav", ".m4a", ".aac", ".ogg", ".flac", ".wma")
+
+# 每个ffmpeg进程最多读取的文件数（避免命令行过长）
+BATCH_SIZE = 200
+
+_durations: Dict[str, float] = {}
+_index_loaded = False
+_dirty = False     # 内存中有还没有写入磁盘索引的时长
+_lock = threading.Lock()
+
+
+def _key(path: str) -> str:
+    stat = os.stat(path)
+    return f"{os.path.abspath(path)}|{stat.st_mtime_ns}|{stat.st_size}"
+
+
+def _index_path() -> str:
+    return os.path.join(config_reader.cache_dir, "durations.json")
+
+
+def _load_index() -> None:
+    """第一次使用时读取磁盘上的时长索引"""
+    global _index_loaded
+    if _index_loaded:
+        return
+    _index_loaded = True
+    if not config_reader.duration_index or not os.path.exists(_index_path()):
+        return
+    try:
+        with open(_index_path(), encoding="utf-8") as f:
+            _durations.update(json.load(f))
+    except (OSError, ValueError) as e:
+        logger.warning(f"读取声音时长索引失败，忽略: {e}")
+
+
+def _save_index() -> None:
+    """把内存中的时长写回磁盘索引（先写临时文件再重命名），文件已经不存在的条目不再保存"""
+    if not config_reader.duration_index:
+        return
+    for key in [k for k in _durations if not os.path.exists(k.rsplit("|", 2)[0])]:
+        del _durations[key]
+    os.makedirs(config_reader.cache_dir, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(suffix=".json", dir=config_reader.cache_dir)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(_durations, f, ensure_ascii=False)
+    os.replace(tmp, _index_path())
+
+
+def _wav_duration(path: str) -> Optional[float]:
+    """从wav文件头读取时长，wave模块不支持的格式返回None"""
+    try:
+        with wave.open(path, "rb") as f:
+            return f.getnframes() / f.getframerate()
+    except (wave.Error, EOFError):
+        return None
+
+
+def _ffmpeg_durations(paths: List[str]) -> Dict[str, float]:
+    """使用一个ffmpeg进程读取多个文件头中的时长（不解码）
+
+    ffmpeg在某个文件打开失败时会停止，之后的文件不会出现在结果中
+
+    Return:
+        {路径: 时长}
+    """
+    cmd = [imageio_ffmpeg.get_ffmpeg_exe(), "-hide_banner"]
+    for path in paths:
+        cmd += ["-i", path]
+    result = subprocess.run(cmd, capture_output=True, text=True, errors="replace")
+
+    durations = {}
+    current = None
+    for line in result.stderr.splitlines():
+        match = re.match(r"Input #(\d+),", line)
+        if match:
+            current = int(match.group(1))
+            continue
+        match = re.match(r"\s+Duration: (\d+):(\d+):([\d.]+)", line)
+        if match and current is not None:
+            h, m, s = match.groups()
+            durations[paths[current]] = int(h) * 3600 + int(m) * 60 + float(s)
+            current = None
+    return durations
+
+
+def _decoded_duration(path: str) -> float:
+    """文件头中没有时长的时候，使用解码后的PCM（PCMCache）计算时长"""
+    return len(load_pcm(path)) / SAMPLE_RATE
+
+
+def flush_index() -> None:
+    """把新读取的时长写入磁盘索引，没有新的时长时不写"""
+    global _dirty
+    with _lock:
+        if _dirty:
+            _save_index()
+            _dirty = False
+
+
+atexit.register(flush_index)
+
+
+def probe_durations(paths: Iterable[str]) -> Dict[str, float]:
+    """批量读取声音文件的时长，已经读取过（且文件没有变化）的文件不会再次读取，
+    结束时把新的时长写入磁盘索引
+
+    Params:
+        paths: 声音文件路径
+    Return:
+        {路径: 时长（秒）}
+    """
+    durations = _probe(paths)
+    flush_index()
+    return durations
+
+
+def _probe(paths: Iterable[str]) -> Dict[str, float]:
+    """读取声音文件的时长，新的时长只保存在内存中（标记为需要写入索引）"""
+    global _dirty
+    paths = list(dict.fromkeys(paths))
+    keys = {path: _key(path) for path in paths}
+    with _lock:
+        _load_index()
+        missing = [p for p in paths if keys[p] not in _durations]
+
+    found = {}
+    others = []
+    for path in missing:
+        duration = _wav_duration(path) if path.lower().endswith(".wav") else None
+        if duration is not None:
+            found[keys[path]] = duration
+        else:
+            others.append(path)
+    for i in range(0, len(others), BATCH_SIZE):
+        batch = others[i:i + BATCH_SIZE]
+        logger.debug(f"读取 {len(batch)} 个声音文件的时长")
+        durations = _ffmpeg_durations(batch)
+        for path in batch:
+            if path not in durations:
+                durations.update(_ffmpeg_durations([path]))
+            if path not in durations:
+                logger.warning(f"文件头中没有声音时长，解码文件: {path}")
+                durations[path] = _decoded_duration(path)
+            found[keys[path]] = durations[path]
+
+    with _lock:
+        if found:
+            _durations.update(found)
+            _dirty = True
+        return {path: _durations[keys[path]] for path in paths}
+
+
+def get_duration(path: str) -> float:
+    """获取声音文件的时长
+
+    Params:
+        path: 声音文件
+    Return:
+        时长，单位秒
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"声音文件不存在: {path}")
+    return _probe([path])[path]
+
+
+def collect_audio_files(obj) -> List[str]:
+    """找到脚本片段中引用的全部（已经存在的）声音文件
+
+    Params:
+        obj: script.yaml中的片段（dict/list）
+    Return:
+        声音文件路径列表
+    """
+    files = []
+    if isinstance(obj, dict):
+        for value in obj.values():
+            files += collect_audio_files(value)
+    elif isinstance(obj, list):
+        for value in obj:
+            files += collect_audio_files(value)
+    elif isinstance(obj, str) and obj.lower().endswith(AUDIO_EXTENSIONS) and os.path.isfile(obj):
+        files.append(obj)
+    return files
@@ -0,0 +1,36 @@
+#!/usr/bin/python3
+"""
+FileDigest - 文件内容的hash
+
+活动缓存(ActivityCache)、PCM缓存(PCMCache)和字幕缓存(AudioHelper)
+都按照文件内容命名缓存，同一个文件在一次运行中只读取一次。
+"""
+import hashlib
+import os
+import threading
+
+_digests = {}
+_digests_lock = threading.Lock()
+
+
+def file_digest(path: str) -> str:
+    """计算文件内容的hash，按照 (路径, 修改时间, 大小) 缓存结果
+
+    Params:
+        path: 文件路径
+    Return:
+        文件内容的sha256
+    """
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    with _digests_lock:
+        digest = _digests.get(key)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(block)
+        digest = h.hexdigest()
+        with _digests_lock:
+            _digests[key] = digest
+    return digest
@@ -0,0 +1,262 @@
+#!/usr/bin/python3
+"""
+FrameStore - 活动（Activity）帧的内存存储
+
+以前Activity会把背景图片复制成 output_dir/<活动>/<i>.<ext>，之后每个动作、
+RenderHelper和字幕线程都要反复打开、解码、编码、保存这些文件。
+
+FrameStore把一个活动的全部帧保存在内存中，动作和RenderHelper通过Frame句柄
+直接读写。没有被修改过的帧共享同一个背景对象，所以准备背景几乎没有开销。
+只有在config.yaml中设置 `frame_store: disk` 时才回退到每帧一个图片文件的方式。
+
+当一个活动的 total_frame × 单帧大小 超过 `frame_memory_budget` 时，帧会被保存在
+output_dir下的numpy.memmap临时文件中（未压缩），内存占用由操作系统的页缓存控制。
+"""
+import itertools
+import os
+import sys
+import tempfile
+import weakref
+from typing import Iterator, List, Optional, Union
+
+sys.path.append('../')
+import numpy as np
+from PIL import Image, ImageSequence
+
+import config_reader
+
+from logging_config import get_logger
+logger = get_logger(__name__)
+
+
+# 写入帧时分配的内容标记，内容相同（未被修改过的背景）的帧标记相同
+_content_tokens = itertools.count()
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class _ImageListStorage:
+    """把帧保存为内存中的PIL.Image列表"""
+
+    def __init__(self, frames: List[Image.Image], mode: str, tokens: Optional[list] = None):
+        self.frames = frames
+        self.mode = mode
+        if tokens is None:
+            # 同一个Image对象的帧内容相同
+            object_tokens = {}
+            tokens = [object_tokens.setdefault(id(frame), next(_content_tokens)) for frame in frames]
+        self.tokens = tokens
+
+    def __len__(self):
+        return len(self.frames)
+
+    def load(self, index: int) -> Image.Image:
+        return self.frames[index].copy()
+
+    def save(self, index: int, image: Image.Image) -> None:
+        self.frames[index] = image.convert(self.mode) if image.mode != self.mode else image.copy()
+        self.tokens[index] = next(_content_tokens)
+
+    def to_array(self, index: int) -> np.ndarray:
+        return np.asarray(self.frames[index].convert("RGB"))
+
+
+class _MemmapStorage:
+    """把帧保存在磁盘上的numpy.memmap临时文件中，形状为 (帧数, 高, 宽, 通道)"""
+
+    def __init__(self, total_frame: int, size: tuple, mode: str, directory: str):
+        self.mode = mode
+        self.size = size
+        channels = len(mode)
+        os.makedirs(directory, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(suffix=".frames", dir=directory)
+        os.close(fd)
+        self.frames = np.memmap(self.path, dtype=np.uint8, mode="w+",
+                                shape=(total_frame, size[1], size[0], channels))
+        self.tokens = [None] * total_frame
+        weakref.finalize(self, _remove_file, self.path)
+
+    def __len__(self):
+        return self.frames.shape[0]
+
+    def load(self, index: int) -> Image.Image:
+        return Image.fromarray(np.array(self.frames[index]), self.mode)
+
+    def save(self, index: int, image: Image.Image) -> None:
+        if image.mode != self.mode:
+            image = image.convert(self.mode)
+        if image.size != self.size:
+            image = image.resize(self.size)
+        self.frames[index] = np.asarray(image)
+        self.tokens[index] = next(_content_tokens)
+
+    def to_array(self, index: int) -> np.ndarray:
+        return np.array(self.frames[index, :, :, :3])
+
+
+class Frame:
+    """FrameStore中某一帧的句柄
+
+    Frame可以代替图片路径传给ImageHelper中的函数，
+    ImageHelper会通过load()/save()读写内存中的帧，而不是读写文件。
+    """
+    __slots__ = ("store", "index")
+
+    def __init__(self, store: "FrameStore", index: int):
+        self.store = store
+        self.index = index
+
+    @property
+    def mode(self) -> str:
+        """帧的图片模式，RGB 或 RGBA"""
+        return self.store.mode
+
+    def load(self) -> Image.Image:
+        """返回当前帧的一个可修改副本"""
+        return self.store.load(self.index)
+
+    def save(self, image: Image.Image) -> None:
+        """用image替换当前帧"""
+        self.store.save(self.index, image)
+
+    def content_key(self) -> tuple:
+        """帧内容的标记，两个帧的content_key相同时内容一定相同（例如都是未修改的背景）"""
+        return self.store.content_key(self.index)
+
+    def __eq__(self, other):
+        return (isinstance(other, Frame)
+                and other.store._storage is self.store._storage
+                and other.store._indexes[other.index] == self.store._indexes[self.index])
+
+    def __hash__(self):
+        return hash((id(self.store._storage), self.store._indexes[self.index]))
+
+    def __repr__(self):
+        return f"Frame({self.index})"
+
+
+class FrameStore:
+    """一组按下标访问的帧
+
+    支持 len()、下标读取、切片（切片与原FrameStore共享同一份数据）、迭代，
+    因此可以直接替换原来的图片路径列表传给各个动作。
+    """
+
+    def __init__(self, frames: Union[List[Image.Image], _ImageListStorage, _MemmapStorage],
+                 mode: str = "RGB", indexes: Optional[range] = None):
+        """
+        Params:
+            frames: 帧列表（多个下标可以引用同一个Image对象，写入时才会替换），或者已有的存储对象
+            mode: 帧的图片模式
+            indexes: 当前视图在存储中对应的下标范围（切片时使用）
+        """
+        if isinstance(frames, list):
+            frames = _ImageListStorage(frames, mode)
+        self._storage = frames
+        self.mode = mode
+        self._indexes = indexes if indexes is not None else range(len(frames))
+
+    @classmethod
+    def from_background(cls, background_image: str, total_frame: int) -> "FrameStore":
+        """使用背景图片创建一组帧
+        当全部帧的大小超过config.yaml中的frame_memory_budget时，使用memmap存储
+
+        Params:
+            background_image: 背景图片地址（已经resize之后的图片），可以是gif
+            total_frame: 帧数
+        Return:
+            FrameStore
+        """
+        size = (config_reader.g_width, config_reader.g_height)
+        if background_image.lower().endswith(".gif"):
+            # gif的每一帧原来会被保存成png，所以使用RGBA模式
+            mode = "RGBA"
+            with Image.open(background_image) as im:
+                bg_frames = [frame.convert(mode).resize(size) for frame in ImageSequence.Iterator(im)]
+        else:
+            mode = "RGBA" if background_image.lower().endswith(".png") else "RGB"
+            with Image.open(background_image) as im:
+                bg_frames = [im.convert(mode).resize(size)]
+
+        frame_bytes = size[0] * size[1] * len(mode)
+        budget = config_reader.frame_memory_budget * 1024 * 1024
+        if config_reader.frame_store == "memmap" or total_frame * frame_bytes > budget:
+            directory = os.path.join(config_reader.output_dir, "frames")
+            storage = _MemmapStorage(total_frame, size, mode, directory)
+            bg_tokens = [next(_content_tokens) for _ in bg_frames]
+            for i in range(total_frame):
+                storage.save(i, bg_frames[i % len(bg_frames)])
+                storage.tokens[i] = bg_tokens[i % len(bg_frames)]
+            logger.debug(f"{total_frame} 帧共 {total_frame * frame_bytes / 1024 / 1024:.0f}MB，"
+                         f"超出内存预算 {config_reader.frame_memory_budget}MB，使用memmap: {storage.path}")
+        else:
+            bg_tokens = [next(_content_tokens) for _ in bg_frames]
+            storage = _ImageListStorage([bg_frames[i % len(bg_frames)] for i in range(total_frame)], mode,
+                                        tokens=[bg_tokens[i % len(bg_frames)] for i in range(total_frame)])
+            logger.debug(f"在内存中准备了 {total_frame} 帧背景: {background_image}")
+        return cls(storage, mode=mode)
+
+    def load(self, index: int) -> Image.Image:
+        """读取一帧
+
+        Params:
+            index: 帧下标
+        Return:
+            帧的副本，修改它不会影响FrameStore
+        """
+        return self._storage.load(self._indexes[index])
+
+    def save(self, index: int, image: Image.Image) -> None:
+        """写入一帧
+
+        Params:
+            index: 帧下标
+            image: 新的图片，会被复制（调用者通常会在保存后close()图片）
+        """
+        self._storage.save(self._indexes[index], image)
+
+    def content_key(self, index: int) -> tuple:
+        """帧内容的标记，写入帧之后标记会改变
+
+        Params:
+            index: 帧下标
+        Return:
+            (存储对象id, 内容标记)
+        """
+        return (id(self._storage), self._storage.tokens[self._indexes[index]])
+
+    def to_array(self, index: int) -> np.ndarray:
+        """以RGB数组的形式返回一帧，用于生成视频"""
+        return self._storage.to_array(self._indexes[index])
+
+    def __len__(self) -> int:
+        return len(self._indexes)
+
+    def __iter__(self) -> Iterator[Frame]:
+        for i in range(len(self)):
+            yield Frame(self, i)
+
+    def __getitem__(self, key: Union[int, slice]) -> Union[Frame, "FrameStore"]:
+        if isinstance(key, slice):
+            return FrameStore(self._storage, mode=self.mode, indexes=self._indexes[key])
+        if key < 0:
+            key += len(self)
+        if key < 0 or key >= len(self):
+            raise IndexError("frame index out of range")
+        return Frame(self, key)
+
+    def __setitem__(self, index: int, value: Union[Frame, Image.Image]) -> None:
+        frame = self[index]
+        if isinstance(value, Frame):
+            if value == frame:
+                return
+            value = value.load()
+        self.save(frame.index, value)
+
+    def __repr__(self):
+        return f"FrameStore(frames={len(self)}, mode={self.mode})"
@@ -1,13 +1,18 @@
+import functools
+import math
 import os
 import sys
 import yaml
 
 sys.path.append('../')
-from PIL import Image, ImageDraw, ImageFont, ImageSequence, ImageOps
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont, ImageSequence, ImageOps, features
 Image.MAX_IMAGE_PIXELS = 7680000
 
 import config_reader
 import utils
+from libs.FrameStore import Frame
+from libs.SpriteCache import sprite_cache
 
 from logging_config import get_logger
 logger = get_logger(__name__)
@@ -15,21 +20,115 @@ logger = get_logger(__name__)
 def __open_image(image):
     """open image file
     
+    Params:
+        image: 图片地址、FrameStore中的Frame或者PIL.Image.Image对象
     Returns:
     An ~PIL.Image.Image object.
     """
     try:
         if isinstance(image, str):
             return Image.open(image)
+        elif isinstance(image, Frame):
+            return image.load()
         else:
             return image
     except Exception as e:
         logger.error(f"打开图片失败: {image}")
         raise e
 
+def __get_mode(image):
+    """获取背景图片合成时使用的模式
+
+    Params:
+        image: 图片地址或者FrameStore中的Frame
+    Return:
+        'RGBA' 或 'RGB'
+    """
+    if isinstance(image, Frame):
+        return image.mode
+    return 'RGBA' if image.endswith('.png') else 'RGB'
+
+def save_image(image_obj, image):
+    """保存图片
+
+    Params:
+        image_obj: PIL.Image.Image对象
+        image: 图片地址或者FrameStore中的Frame
+    """
+    if isinstance(image, Frame):
+        image.save(image_obj)
+    else:
+        image_obj.save(image)
+
+def __vertical_text(name, font):
+    """竖排文字的布局
+
+    有libraqm时使用 direction="ttb"（与以前相同），没有时逐字从上到下排列，每个字水平居中
+
+    Params:
+        name: 文字
+        font: 字体对象
+    Return:
+        (绘制函数 draw(ImageDraw, (x, y)), 以(0, 0)为起点时文字的bbox)
+    """
+    measure = ImageDraw.Draw(Image.new("L", (1, 1)))
+    if features.check_feature("raqm"):
+        bbox = measure.textbbox((0, 0), name, font=font, direction="ttb")
+        def draw(m, xy):
+            m.text(xy, name, fill="black", align="center", direction="ttb", font=font)
+        return draw, bbox
+
+    width = max(font.getlength(c) for c in name)
+    chars = [((width - font.getlength(c)) / 2, i * font.size, c) for i, c in enumerate(name)]
+    boxes = [measure.textbbox((x, y), c, font=font) for x, y, c in chars]
+    bbox = (min(b[0] for b in boxes), min(b[1] for b in boxes), max(b[2] for b in boxes), max(b[3] for b in boxes))
+    def draw(m, xy):
+        for x, y, c in chars:
+            m.text((xy[0] + x, xy[1] + y), c, fill="black", font=font)
+    return draw, bbox
+
+@functools.lru_cache(maxsize=128)
+def name_plate(name, font_path, size):
+    """角色名牌：白底黑框的竖排名字，每个 (名字, 字体, 字号) 只绘制一次
+
+    Params:
+        name: 名字
+        font_path: 字体文件
+        size: 字号
+    Return:
+        (名牌图片(RGB), (dx, dy))，(dx, dy)是名牌左上角相对于文字起点的位置。名牌图片是共享的，不能修改或者close()
+    """
+    draw, (left, top, right, bottom) = __vertical_text(name, get_font(font_path, size))
+    left, top, right, bottom = math.floor(left) - 5, math.floor(top) - 5, math.ceil(right) + 5, math.ceil(bottom) + 5
+    plate = Image.new("RGB", (right - left + 1, bottom - top + 1), (255, 255, 255))
+    m = ImageDraw.Draw(plate)
+    m.rectangle((0, 0, right - left, bottom - top), outline=(0, 0, 0), width=1)
+    draw(m, (-left, -top))
+    return plate, (left, top)
+
+def add_name_plate(image, name):
+    """在角色图片的左上角贴上名牌，名牌由name_plate绘制一次并缓存
+
+    Params:
+        image: 角色图片地址或者Image对象（不会被修改）
+        name: 名字
+    Return:
+        贴上名牌的新Image对象(RGB或RGBA模式)
+    """
+    im = Image.open(image) if isinstance(image, str) else image.copy()
+    if im.mode not in ("RGB", "RGBA"):
+        # 调色板等模式的图片先转换成RGB(A)，名牌的颜色才不会变
+        im = im.convert("RGBA" if "A" in im.getbands() or "transparency" in im.info else "RGB")
+    x, _ = im.size
+    size = 80 if x / 4 > 80 else x / 4 # 防止文字太大遮挡图片
+    plate, position = name_plate(name, config_reader.font, size)
+    im.paste(plate, position)
+    return im
+
 def display_char_name(char, image, name=None):
     """Display character name on image
-    
+    名牌由name_plate绘制一次并缓存，每一帧只需要粘贴
+
     Params:
         char: 角色
         image: 背景图片内存对象 （当需要连续修改同一张图片时建议使用内存对象）
@@ -44,17 +143,98 @@ def display_char_name(char, image, name=None):
         name = char.name
     
     x,y = char.pos
-    m = ImageDraw.Draw(im)
-    font = ImageFont.truetype(config_reader.font, 30)
-    left, top, right, bottom = m.textbbox((x, y), name, font=font, direction="ttb")
-    m.rectangle((left-5, top-5, right+5, bottom+5), outline=(0,0,0), fill=(255,255,255), width=1)
-    m.text((x, y), name, fill="black", align="center", direction="ttb", font=font)
+    plate, (dx, dy) = name_plate(name, config_reader.font, 30)
+    im.paste(plate, (round(x + dx), round(y + dy)))
     
     return im
 
+@functools.lru_cache(maxsize=64)
+def get_font(font_path, size):
+    """按照 (字体文件, 字号) 缓存的字体对象，避免每一帧都重新读取和解析字体文件
+
+    Params:
+        font_path: 字体文件
+        size: 字号
+    Return:
+        ImageFont.FreeTypeFont 对象
+    """
+    return ImageFont.truetype(font_path, size)
+
+def __subtitle_lines(size, text, color, mode, text_list, font_size):
+    """计算字幕每一行的位置、文字、颜色和字号
+
+    Params:
+        size: 图片尺寸 (宽, 高)
+        font_size: 字号
+        其他参数与add_text_to_image相同
+    Return:
+        [((x, y), 文字, 颜色, 字号)]
+    """
+    x, y = size
+    if not mode or mode == 'normal' or mode == 'bottom':
+        x = (x - len(text) * font_size) / 2
+        y = y - font_size - 20 # 距离底边20个像素
+    elif mode == 'top':
+        x = (x - len(text) * font_size) / 2
+        y = 20
+    elif mode == 'middle':
+        x = (x - len(text) * font_size) / 2
+        y = (y - font_size) / 2
+
+    if x < 0:
+        x = 0
+
+    if mode != 'list':
+        return [((x, y), text, color, font_size)]
+
+    lines = []
+    height = font_size * (len(text_list) - 1) * 0.8 + font_size   # 20是行间距, height是总的文本高度
+    start_y = (y - height) / 2
+    for i in range(0, len(text_list)):
+        if text_list[i] != text:
+            tmp_font_size = font_size * 0.8 # 非当前文字缩小显示
+            color = 'black'
+        else:
+            tmp_font_size = font_size
+            color = 'red'
+        tmp_x = (x - len(text_list[i]) * tmp_font_size) / 2
+        if i > 0:
+            start_y = start_y + font_size
+        lines.append(((tmp_x, start_y), text_list[i], color, tmp_font_size))
+    return lines
+
+@functools.lru_cache(maxsize=32)
+def subtitle_overlay(size, text, color, mode, text_list, font_path, font_size):
+    """把字幕绘制成透明背景的RGBA图片（每条字幕只绘制一次，再合成到它显示的每一帧上）
+
+    Params:
+        size: 背景图片尺寸 (宽, 高)
+        text_list: list模式时显示的一组字幕（tuple）
+        font_path: 字体文件
+        font_size: 字号
+        其他参数与add_text_to_image相同
+    Return:
+        (overlay, (x, y))，overlay只包含有文字的区域，(x, y)是它在背景图片中的位置；没有文字时overlay是None。
+        overlay被多帧共享，不能修改或者close()
+    """
+    overlay = Image.new("RGBA", size, (0, 0, 0, 0))
+    for xy, line, fill, font_size in __subtitle_lines(size, text, color, mode, text_list, font_size):
+        # 每一行单独画在遮罩上，颜色填满整行，保证overlay的颜色不会和透明背景混合变暗
+        mask = Image.new("L", size, 0)
+        ImageDraw.Draw(mask).text(xy, line, fill=255, align="center", font=get_font(font_path, font_size))
+        layer = Image.new("RGBA", size, fill)
+        layer.putalpha(mask)
+        overlay.alpha_composite(layer)
+
+    bbox = overlay.getbbox()
+    if not bbox:
+        return None, (0, 0)
+    return overlay.crop(bbox), bbox[:2]
+
 def add_text_to_image(image, text, color = 'white', overwrite_image = False, mode='normal', text_list=None):
     """
     Add text to image
+    字幕由subtitle_overlay绘制一次并缓存，同一条字幕的其他帧只需要合成
 
     Params:
         image: image file path.
@@ -70,54 +250,18 @@ def add_text_to_image(image, text, color = 'white', overwrite_image = False, mod
     """
     if not text:
         return
-    font_size = config_reader.font_size
     im = __open_image(image=image)
-    m = ImageDraw.Draw(im)
-    # Add Text to an image
-    x, y = im.size
-    if not mode or mode == 'normal' or mode == 'bottom':
-        x = (x - len(text) * font_size) / 2
-        y = y - font_size - 20 # 距离底边20个像素
-    elif mode == 'top':
-        x = (x - len(text) * font_size) / 2
-        y = 20
-    elif mode == 'middle':
-        x = (x - len(text) * font_size) / 2
-        y = (y - font_size) / 2
-        
-    if x < 0:
-        x = 0
-
-    if mode == 'list':
-        height = font_size * (len(text_list) - 1) * 0.8 + font_size   # 20是行间距, height是总的文本高度
-        start_y = (y - height) / 2
-
-        l = len(text_list)
-        for i in range(0, l):
-            if text_list[i] != text:
-                tmp_font_size = font_size * 0.8 # 非当前文字缩小显示
-                color = 'black'
-            else:
-                tmp_font_size = font_size
-                color = 'red'
-            tmp_x = (x - len(text_list[i]) * tmp_font_size) / 2
-
-            # 这行代码必须放在mf前面
-            if i > 0:
-                start_y = start_y + font_size
-
-            font = ImageFont.truetype(config_reader.font, tmp_font_size)
-            left, top, right, bottom = m.textbbox((tmp_x, start_y), text, font=font)
-            m.rectangle((left-5, top-5, right+5, bottom+5), outline=None, width=0)
-            m.text((tmp_x, start_y), text_list[i], fill=color, align="center", font=font)
-    else:
-        font = ImageFont.truetype(config_reader.font, font_size)
-        left, top, right, bottom = m.textbbox((x, y), text, font=font)
-        m.rectangle((left-5, top-5, right+5, bottom+5), outline=None, width=0)
-        m.text((x, y), text, fill=color, align="center", font=font)
+    overlay, position = subtitle_overlay(im.size, text, color, mode,
+                                         tuple(text_list) if mode == 'list' else None,
+                                         config_reader.font, config_reader.font_size)
+    if overlay is not None:
+        if im.mode == 'RGBA':
+            im.alpha_composite(overlay, position)
+        else:
+            im.paste(overlay, position, overlay)
 
     if overwrite_image:
-        im.save(image)
+        save_image(im, image)
     else:
         # Display edited image on which we have added the text
         im.show()
@@ -138,16 +282,13 @@ def cut_image_by_focus(image, focus, size=None):
     """根据焦点切割图片
     
     Params:
-        image: the origin image file path.
+        image: the origin image file path (或者FrameStore中的Frame).
         focus: 焦点 (显示区域的左上角坐标)
         size: 待切割的图片大小， 例如: [300, 400], 默认原图的30% + 100
     Return:
         none
     """
-    if isinstance(image, str):
-        im = __open_image(image=image)
-    else:
-        im = image
+    im = __open_image(image=image)
     
     w = config_reader.g_width
     h = config_reader.g_height
@@ -189,14 +330,47 @@ def cut_image_by_focus(image, focus, size=None):
         bottom = c_y + c_h + 50
 
     im = im.crop((left, top, right, bottom))
-    im.resize((config_reader.g_width, config_reader.g_height)).save(image)
+    save_image(im.resize((config_reader.g_width, config_reader.g_height)), image)
+
+def camera_boxes(centers, ratios):
+    """批量计算镜头显示的区域：以焦点为中心、大小是画面的ratio倍，超出画面的部分被截掉；
+    与 zoom_in_out_image 相同，ratio是1的帧不缩放，显示整个画面（焦点不在中心时也不会被拉伸）
+
+    Params:
+        centers: 每一帧的焦点像素坐标 [(x, y)]
+        ratios: 每一帧的缩放比例 [ratio]
+    Return:
+        numpy数组 (帧数, 4)，每一行是 (left, top, right, bottom)
+    """
+    centers = np.asarray(centers, dtype=np.float64).reshape(-1, 2)
+    ratios = np.asarray(ratios, dtype=np.float64).reshape(-1, 1)
+    half = ratios * [config_reader.g_width / 2, config_reader.g_height / 2]
+    limit = [config_reader.g_width, config_reader.g_height]
+    boxes = np.hstack([np.clip(centers - half, 0, limit), np.clip(centers + half, 0, limit)])
+    boxes[ratios[:, 0] == 1] = [0, 0] + limit
+    return boxes
+
+def camera_transform(image, box):
+    """一次重采样完成镜头的裁剪和缩放（不需要先crop再resize）
+
+    Params:
+        image: PIL.Image.Image对象，画面大小
+        box: camera_boxes() 计算的显示区域（画面坐标）
+    Return:
+        画面大小的新图片；显示区域就是整个画面时返回image
+    """
+    size = (config_reader.g_width, config_reader.g_height)
+    box = tuple(float(v) for v in box)
+    if image.size == size and box == (0, 0) + size:
+        return image
+    return image.resize(size, Image.Resampling.BICUBIC, box=box)
 
 def zoom_in_out_image(origin_image_path, center, ratio, new_path=None):
     """
     zoom in or zoom out. 拉近、拉远镜头 (覆盖原图), 也可切换焦点
 
     Params:
-        origin_image_path: the origin image file path.
+        origin_image_path: the origin image file path (或者FrameStore中的Frame).
         center: the focus point of camera (zoom in / zoom out by this point),
             it format will be like: (123, 234) or (0.2, 0.4) or (123, 0.3)
         ratio: zoom in, zoom out ratio, in percentage. like: 0.1, 0.9
@@ -207,21 +381,12 @@ def zoom_in_out_image(origin_image_path, center, ratio, new_path=None):
     if ratio == 1:
         return origin_image_path
     
-    im = Image.open(origin_image_path)
-    x_center, y_center = utils.covert_pos(center)
-
-    left = x_center - config_reader.g_width * ratio / 2
-    left = left if left > 0 else 0
-    top = y_center - config_reader.g_height * ratio / 2
-    top = top if top > 0 else 0
-    right = x_center + config_reader.g_width * ratio / 2
-    right = right if right < config_reader.g_width else config_reader.g_width
-    bottom = y_center + config_reader.g_height * ratio / 2
-    bottom = bottom if bottom < config_reader.g_height else config_reader.g_height
-    im = im.crop((left, top, right, bottom))
+    im = __open_image(image=origin_image_path)
+    box = camera_boxes([utils.covert_pos(center)], [ratio])[0]
     if not new_path:
         new_path = origin_image_path
-    im.resize((config_reader.g_width, config_reader.g_height)).save(new_path)
+    save_image(im.resize((config_reader.g_width, config_reader.g_height), Image.Resampling.BICUBIC, box=tuple(box)),
+               new_path)
     im.close()
     return new_path
 
@@ -254,9 +419,26 @@ def resize_image(image):
         image: 图片地址
     """
     im = __open_image(image=image)
-    im.resize((config_reader.g_width, config_reader.g_height)).save(image)
+    save_image(im.resize((config_reader.g_width, config_reader.g_height)), image)
     im.close()
 
+def __char_sprite(char, gif_index=0, dark=False):
+    """获取角色当前要显示的图片和亮度/透明度
+
+    Return:
+        (小图片, reduce_light, alpha, 名牌上的名字)
+    """
+    if not char.image.lower().endswith(".gif"):
+        small_image = char.image
+    else:
+        if not char.gif_frames:
+            char.gif_frames = get_frames_from_gif(char.image) 
+        small_image = char.gif_frames[gif_index % len(char.gif_frames)]
+
+    reduce_light = 100 if dark else 0
+    alpha = char.transparency if char.transparency is not None else 1
+    return small_image, reduce_light, alpha, getattr(char, "signature", None)
+
 def paint_char_on_image(*, char, 
                         image=None, 
                         image_obj=None, 
@@ -277,17 +459,7 @@ def paint_char_on_image(*, char,
     Returns:
         (返回新图片的地址, image_obj)
     """
-    if not char.image.lower().endswith(".gif"):
-        small_image = char.image
-    else:
-        if not char.gif_frames:
-            char.gif_frames = get_frames_from_gif(char.image) 
-        small_image = char.gif_frames[gif_index % len(char.gif_frames)]
-
-    reduce_light = 100 if dark else 0
-    alpha = char.transparency if char.transparency is not None else 1
-    if reduce_light != 0 or alpha != 1:
-        small_image = dark_image(small_image, reduce_light=reduce_light, alpha=alpha)
+    small_image, reduce_light, alpha, signature = __char_sprite(char, gif_index=gif_index, dark=dark)
     
     try:
         return merge_two_image(small_image=small_image, 
@@ -297,75 +469,170 @@ def paint_char_on_image(*, char,
                             big_image_obj=image_obj,
                             rotate=char.rotate, 
                             overwrite=overwrite,
-                            save=save)
+                            save=save,
+                            reduce_light=reduce_light,
+                            alpha=alpha,
+                            signature=signature)
     except Exception as e:
         logger.error(f"绘制角色失败: {char.obj}")
         raise e
 
-def merge_two_image(small_image, 
-                    size, 
-                    pos, 
-                    big_image=None, 
-                    big_image_obj=None, 
-                    rotate=None, 
-                    overwrite=False,
-                    save=False):
-    """将小图片粘贴到大图片上
+def paint_char_on_canvas(char, canvas, gif_index=0, dark=False):
+    """把角色直接画在画布上（不复制画布）
 
     Params:
-        small_image: 小图片，会先是在大图片上/ 可以是图片地址，也可以是Image对象
-        size: 小图片的显示尺寸, 比如： (100, 120)
-        pos: 小图片的显示位置，比如： (300, 400)或者(0.4, 0.5)
-        big_image: 大图片，第二张图片会先是在大图片上
-        big_image_obj: 大图片的内存对象
-        rotate: 小图片的显示角度，如 0~360的数字，或者"左右"
-        overwrite: 是否覆盖大图
-        save: 是否保存图片
-    Return:
-        (返回新图片的地址, image_obj)
+        char: 角色
+        canvas: prepare_canvas() 返回的画布，会被直接修改
+        gif_index: 如果角色素材是gif图片，则显示指定下标的frame
+        dark: 设置角色为灰色显示
+    Returns:
+        canvas
     """
-    if not big_image_obj:
-        big_image_obj = Image.open(big_image)
+    small_image, reduce_light, alpha, signature = __char_sprite(char, gif_index=gif_index, dark=dark)
+    try:
+        return paste_sprite(canvas, small_image, size=char.size, pos=char.pos, rotate=char.rotate,
+                            reduce_light=reduce_light, alpha=alpha, signature=signature)
+    except Exception as e:
+        logger.error(f"绘制角色失败: {char.obj}")
+        raise e
 
-    mode1 = 'RGBA' if big_image.endswith('.png') else 'RGB'
-    img1 = big_image_obj.copy().convert(mode1) # 防止覆盖原图
-    img1 = img1.resize((config_reader.g_width, config_reader.g_height))
+def __build_sprite(small_image, size, rotate, reduce_light, alpha, signature=None):
+    """打开、贴上名牌、调整亮度/透明度、缩放并旋转小图片
 
-    if isinstance(small_image, str):
+    Return:
+        (可以直接粘贴的图片, 图片模式)
+    """
+    if signature:
+        small_image = add_name_plate(small_image, signature)
+    if reduce_light != 0 or alpha != 1:
+        small_image = dark_image(small_image, reduce_light=reduce_light, alpha=alpha)
+        mode2 = small_image.mode
+    elif isinstance(small_image, str):
         small_image = Image.open(small_image)
         mode2 = 'RGBA' if small_image.filename.endswith('.png') else 'RGB'
-    elif isinstance(small_image, Image.Image):
+    else:
         mode2 = small_image.mode
 
-    size = utils.covert_pos(size) # 可以使用小数（百分比）表示图片尺寸
     img2 = small_image.resize(size).convert(mode2)
         
     if rotate:
         if rotate == "左右":
             im_mirror = ImageOps.mirror(img2)
             img2.close()
-            if isinstance(small_image, str):
-                basename = os.path.basename(small_image)
-            else:
-                basename = os.path.basename(small_image.filename)
-            new_path = os.path.join(os.path.dirname(big_image), basename)
-            im_mirror.save(new_path)
-            img2 = Image.open(new_path)
+            img2 = im_mirror
         else:
             img2 = img2.rotate(rotate, expand = 1)
+    return img2, mode2
+
+def get_sprite(small_image, size, rotate=None, reduce_light=0, alpha=1, signature=None):
+    """获取处理好的小图片，图片地址会使用进程内的SpriteCache缓存
+
+    Params:
+        small_image: 小图片地址或者Image对象（Image对象不会被缓存）
+        size: 显示尺寸，已经转换成像素
+        rotate: 显示角度，如 0~360的数字，或者"左右"
+        reduce_light: 亮度减少的数值
+        alpha: 透明度
+        signature: 贴在图片左上角的名牌上的名字（参考add_name_plate），None表示没有名牌
+    Return:
+        (图片, 图片模式)，缓存的图片是共享的，不能修改或者close()
+    """
+    size = tuple(size)
+    if not isinstance(small_image, str):
+        return __build_sprite(small_image, size, rotate, reduce_light, alpha, signature)
+    try:
+        key = (small_image, os.stat(small_image).st_mtime_ns, size, rotate, reduce_light, alpha,
+               signature, config_reader.font if signature else None)
+        hash(key)
+    except (OSError, TypeError):
+        return __build_sprite(small_image, size, rotate, reduce_light, alpha, signature)
+    return sprite_cache.get(key, lambda: __build_sprite(small_image, size, rotate, reduce_light, alpha, signature))
+
+def prepare_canvas(big_image=None, big_image_obj=None, mode=None):
+    """准备一帧的画布：背景只转换模式、缩放一次，之后所有角色都直接粘贴在画布上
+
+    Params:
+        big_image: 大图片（图片地址或者FrameStore中的Frame），用于确定画布的模式
+        big_image_obj: 大图片的内存对象，不会被修改
+        mode: 画布的模式，没有提供时根据big_image确定
+    Return:
+        新的画布 image_obj
+    """
+    mode = mode if mode else __get_mode(big_image)
+    if big_image_obj:
+        canvas = big_image_obj.convert(mode) # convert总是返回副本
+    else:
+        canvas = __open_image(image=big_image)  # 新打开的图片或者Frame的副本，可以直接修改
+        if canvas.mode != mode:
+            canvas = canvas.convert(mode)
+    size = (config_reader.g_width, config_reader.g_height)
+    if canvas.size != size:
+        canvas = canvas.resize(size)
+    return canvas
+
+def paste_sprite(canvas, small_image, size, pos, rotate=None, reduce_light=0, alpha=1, signature=None):
+    """把小图片直接粘贴到画布上
+
+    Params:
+        canvas: prepare_canvas() 返回的画布，会被直接修改
+        small_image: 小图片，可以是图片地址，也可以是Image对象
+        size: 小图片的显示尺寸, 比如： (100, 120)
+        pos: 小图片的显示位置，比如： (300, 400)或者(0.4, 0.5)
+        rotate: 小图片的显示角度，如 0~360的数字，或者"左右"
+        reduce_light: 小图片亮度减少的数值
+        alpha: 小图片的透明度
+        signature: 贴在小图片左上角的名牌上的名字，None表示没有名牌
+    Return:
+        canvas
+    """
+    size = utils.covert_pos(size) # 可以使用小数（百分比）表示图片尺寸
+    img2, mode2 = get_sprite(small_image, size, rotate=rotate, reduce_light=reduce_light, alpha=alpha,
+                             signature=signature)
 
     left, top = utils.covert_pos(pos)
 
     if mode2 == 'RGBA':
-        img1.paste(img2, (left, top), img2)
+        canvas.paste(img2, (left, top), img2)
     else:
-        img1.paste(img2, (left, top))
-    img2.close()
+        canvas.paste(img2, (left, top))
+    return canvas
+
+def merge_two_image(small_image, 
+                    size, 
+                    pos, 
+                    big_image=None, 
+                    big_image_obj=None, 
+                    rotate=None, 
+                    overwrite=False,
+                    save=False,
+                    reduce_light=0,
+                    alpha=1,
+                    signature=None):
+    """将小图片粘贴到大图片上
+
+    Params:
+        small_image: 小图片，会先是在大图片上/ 可以是图片地址，也可以是Image对象
+        size: 小图片的显示尺寸, 比如： (100, 120)
+        pos: 小图片的显示位置，比如： (300, 400)或者(0.4, 0.5)
+        big_image: 大图片（图片地址或者FrameStore中的Frame），第二张图片会先是在大图片上
+        big_image_obj: 大图片的内存对象
+        rotate: 小图片的显示角度，如 0~360的数字，或者"左右"
+        overwrite: 是否覆盖大图
+        save: 是否保存图片
+        reduce_light: 小图片亮度减少的数值
+        alpha: 小图片的透明度
+        signature: 贴在小图片左上角的名牌上的名字，None表示没有名牌
+    Return:
+        (返回新图片的地址, image_obj)
+    """
+    img1 = prepare_canvas(big_image, big_image_obj) # 防止覆盖原图
+    paste_sprite(img1, small_image, size, pos, rotate=rotate, reduce_light=reduce_light, alpha=alpha,
+                 signature=signature)
     if not save:
         return None, img1
 
     if overwrite:
-        img1.save(big_image)
+        save_image(img1, big_image)
         return big_image, img1
     else:
         # if isinstance(img1, str):
@@ -397,7 +664,7 @@ def create_text_png(text, size=None, font = None):
     im = Image.new(mode='RGBA', size=size)
     draw_table = ImageDraw.Draw(im=im)
     font = font if font else 'fonts/QingNiaoHuaGuangJianMeiHei/QingNiaoHuaGuangJianMeiHei-2.ttf'
-    draw_table.text(xy=(0,0), text=text, fill='#008B8B', font=ImageFont.truetype(font=font, size=50))
+    draw_table.text(xy=(0,0), text=text, fill='#008B8B', font=get_font(font, 50))
     im.show()
 
 def create_gif(images, file_name = None):
@@ -423,39 +690,41 @@ def dark_image(image, reduce_light : int = 100, alpha : int = 1):
     """使图片变暗
     
     Params:
-        image: 图片地址或者PIL.Image.Image对象
+        image: 图片地址、FrameStore中的Frame或者PIL.Image.Image对象
         reduce_light: 亮度减少的数值
         alpha: 透明度
     Returns:
-        image_obj内存对象
+        新的image_obj内存对象 (RGB或RGBA模式)
     """
-    image_obj = image
-    if not isinstance(image, Image.Image):
-        image_obj = __open_image(image=image)
-    total_w, total_h = image_obj.size
-    for i in range(0, total_w):
-        for j in range(0, total_h):
-            # 获取当前像素的颜色值
-            pixel_color = image_obj.getpixel((i, j))
-            if isinstance(pixel_color, int):
-                # png图像的没有颜色的部位
-                if image_obj._mode == "RGBA":
-                    new_color = (0,0,0,0)
-                else:
-                    new_color = (0,0,0)
-            else:
-            # 调整每个颜色通道的亮度（这里简单地减小亮度，可以根据需要调整系数）
-                if image_obj._mode == "RGBA":
-                    try:
-                        new_color = (max(0, pixel_color[0] - reduce_light), max(0, pixel_color[1] - reduce_light), max(0, pixel_color[2] - reduce_light), int(pixel_color[3] * alpha))
-                    except Exception as e:
-                        logger.error(f"处理像素颜色失败 - pixel_color[3]: {pixel_color[3]}, alpha: {alpha}")
-                        raise(e)
-                else:
-                    new_color = (max(0, pixel_color[0] - reduce_light), max(0, pixel_color[1] - reduce_light), max(0, pixel_color[2] - reduce_light))
-            # 设置新的颜色值  
-            image_obj.putpixel((i, j), new_color)
-    return image_obj
+    image_obj = __open_image(image=image)
+    if image_obj.mode not in ("RGB", "RGBA"):
+        # 调色板等模式的图片先转换成RGB(A)再处理
+        has_alpha = "A" in image_obj.getbands() or "transparency" in image_obj.info
+        image_obj = image_obj.convert("RGBA" if has_alpha else "RGB")
+
+    # 调整每个颜色通道的亮度（这里简单地减小亮度，可以根据需要调整系数）
+    pixels = np.asarray(image_obj, dtype=np.int16)
+    result = np.empty(pixels.shape, dtype=np.uint8)
+    result[..., :3] = np.clip(pixels[..., :3] - reduce_light, 0, 255)
+    if image_obj.mode == "RGBA":
+        result[..., 3] = (pixels[..., 3] * alpha).astype(np.uint8)
+    return Image.fromarray(result, image_obj.mode)
+
+def dark_background(image, cache):
+    """使背景图片变暗，内容相同的帧只计算一次
+
+    Params:
+        image: 图片地址或者FrameStore中的Frame
+        cache: 由调用者持有的字典，保存已经变暗的背景，key是Frame.content_key()
+    Returns:
+        image_obj内存对象，可能被多个帧共享，不能直接修改（可以作为prepare_canvas的big_image_obj）
+    """
+    key = image.content_key() if isinstance(image, Frame) else None
+    if key is None:
+        return dark_image(image)
+    if key not in cache:
+        cache[key] = dark_image(image)
+    return cache[key]
     
 def hightlight_char(image_obj, char):
     """高亮显示当前角色
@@ -469,16 +738,15 @@ def hightlight_char(image_obj, char):
     total_w, total_h = image_obj.size
     x, y = char.pos
     w, h = char.size
-    for i in range(0, total_w):
-        for j in range(0, total_h):
-            if i > x and i < (x + w) and j > y and j < (y + h):
-                continue
-            # 获取当前像素的颜色值
-            pixel_color = image_obj.getpixel((i, j))
-            # 调整每个颜色通道的亮度（这里简单地减小亮度，可以根据需要调整系数）
-            new_color = (max(0, pixel_color[0] - 100), max(0, pixel_color[1] - 100), max(0, pixel_color[2] - 100))
-            # 设置新的颜色值  
-            image_obj.putpixel((i, j), new_color)    
+    pixels = np.array(image_obj)
+    # 角色区域以外的像素变暗 (不包含边框)
+    outside = np.ones((total_h, total_w), dtype=bool)
+    outside[max(math.floor(y) + 1, 0):max(math.ceil(y + h), 0),
+            max(math.floor(x) + 1, 0):max(math.ceil(x + w), 0)] = False
+    pixels[outside, :3] = np.clip(pixels[outside, :3].astype(np.int16) - 100, 0, 255)
+    if image_obj.mode == "RGBA":
+        pixels[outside, 3] = 255
+    image_obj.paste(Image.fromarray(pixels, image_obj.mode))
     return image_obj
     
 
@@ -0,0 +1,101 @@
+#!/usr/bin/python3
+"""
+PCMCache - 解码后的声音缓存
+
+背景音乐和音效（比如 resources/ShengYin/跑步声.mp3）会在很多活动和脚本中重复使用，
+每次使用都要重新用ffmpeg解码。PCMCache 把每个声音文件按照项目的采样率解码一次，
+以 .npy 文件保存在 cache_dir/pcm 下（按文件内容的hash命名，内容相同的文件只保存一份），
+之后通过内存映射(mmap)读取，不再解码。
+截取音频(AudioHelper.split_audio)时使用原始音频的采样率和声道数（probe_format），缓存文件名中包含采样率和声道数。
+"""
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import wave
+from typing import Tuple
+
+sys.path.append('../')
+import imageio_ffmpeg
+import numpy as np
+
+import config_reader
+from libs.FileDigest import file_digest
+
+from logging_config import get_logger
+logger = get_logger(__name__)
+
+SAMPLE_RATE = 44100     # 项目使用的采样率
+CHANNELS = 2
+
+
+# ffmpeg显示的声道布局
+_LAYOUT_CHANNELS = {"mono": 1, "stereo": 2, "2.1": 3, "quad": 4, "5.0": 5, "5.1": 6, "7.1": 8}
+
+
+def probe_format(path: str) -> Tuple[int, int]:
+    """读取声音文件的采样率和声道数（只读取文件头）
+
+    Params:
+        path: 声音文件
+    Return:
+        (采样率, 声道数)；无法识别时返回 (SAMPLE_RATE, CHANNELS)
+    """
+    if path.lower().endswith(".wav"):
+        try:
+            with wave.open(path, "rb") as f:
+                return f.getframerate(), f.getnchannels()
+        except (wave.Error, EOFError):
+            pass
+    cmd = [imageio_ffmpeg.get_ffmpeg_exe(), "-hide_banner", "-i", path]
+    result = subprocess.run(cmd, capture_output=True, text=True, errors="replace")
+    match = re.search(r"Stream #.*?: Audio: .*?, (\d+) Hz, ([^,]+)", result.stderr)
+    if not match:
+        logger.warning(f"无法读取声音格式，使用 {SAMPLE_RATE}Hz {CHANNELS}声道: {path}")
+        return SAMPLE_RATE, CHANNELS
+    layout = match.group(2).strip()
+    channels = re.match(r"(\d+) channels", layout)
+    return int(match.group(1)), int(channels.group(1)) if channels else _LAYOUT_CHANNELS.get(layout.split("(")[0], CHANNELS)
+
+
+def decode_audio(path: str, fps: int = SAMPLE_RATE, channels: int = CHANNELS) -> np.ndarray:
+    """使用ffmpeg把声音文件解码成PCM
+
+    Params:
+        path: 声音文件
+        fps: 采样率
+        channels: 声道数
+    Return:
+        float32数组，形状为 (采样点数, 声道数)，取值范围 [-1, 1]
+    """
+    cmd = [imageio_ffmpeg.get_ffmpeg_exe(), "-v", "error", "-i", path, "-vn",
+           "-f", "f32le", "-acodec", "pcm_f32le", "-ar", str(fps), "-ac", str(channels), "-"]
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+    return np.frombuffer(result.stdout, dtype=np.float32).reshape(-1, channels)
+
+
+def load_pcm(path: str, fps: int = SAMPLE_RATE, channels: int = CHANNELS) -> np.ndarray:
+    """读取声音文件的PCM，config.yaml中设置了`pcm_cache: true`时使用缓存
+
+    Params:
+        path: 声音文件
+        fps: 采样率
+        channels: 声道数
+    Return:
+        float32数组，形状为 (采样点数, 声道数)；使用缓存时是只读的内存映射数组
+    """
+    if not config_reader.pcm_cache:
+        return decode_audio(path, fps, channels)
+
+    digest = file_digest(path)
+    cache_path = os.path.join(config_reader.cache_dir, "pcm", digest[:2], f"{digest}_{fps}_{channels}.npy")
+    if not os.path.exists(cache_path):
+        samples = decode_audio(path, fps, channels)
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(suffix=".npy", dir=os.path.dirname(cache_path))
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, samples)
+        os.replace(tmp, cache_path)
+        logger.debug(f"缓存声音PCM: {path} -> {cache_path}")
+    return np.load(cache_path, mmap_mode="r")
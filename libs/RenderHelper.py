@@ -4,19 +4,26 @@ RenderHelper - Centralized character rendering logic for MovieMaker
 
 This module extracts and consolidates duplicated character rendering patterns
 found across activity.py and action modules. It provides a clean API for:
+- Single canvas compositing (background converted/resized once per frame)
 - Single frame character rendering
 - Batch frame rendering
 - Position-tracked rendering (for animations)
 - Static frame replication
+- Parallel rendering of precomputed frame jobs (config `jobs` / `-j`)
+- Camera zoom/pan applied to the composited frame in memory (one resample per frame)
 
 Author: MovieMaker Team
 """
+import multiprocessing
 import sys
-from typing import List, Optional, Tuple, Dict, Any
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 sys.path.append('../')
 from PIL import Image
 
+import config_reader
 from logging_config import get_logger
 logger = get_logger(__name__)
 
@@ -31,9 +38,323 @@ except ImportError:
     from MovieMaker.character import Character
 
 
+@dataclass
+class CharState:
+    """
+    Snapshot of everything needed to paint one character on one frame.
+
+    Actions mutate the shared Character objects before every frame, so frames
+    can only be rendered in parallel from snapshots taken in frame order.
+    A CharState can be used wherever ImageHelper expects a Character.
+    """
+    name: str
+    obj: Dict[str, Any]
+    image: str
+    gif_frames: List[str]
+    pos: List[float]
+    size: List[float]
+    rotate: Any
+    transparency: Optional[float]
+    dark: bool = False
+    name_plate: Optional[str] = None
+    display: bool = True
+    signature: Optional[str] = None
+
+
+@dataclass
+class FrameJob:
+    """
+    The precomputed state of one frame.
+
+    Params:
+        index: Frame index in the images list / FrameStore
+        chars: Visible characters in render order
+        gif_index: Index for GIF animation frames
+        dark_background: Darken the background before painting (talk highlight)
+        camera: Visible box (left, top, right, bottom) in frame pixels, scaled to the whole frame
+            after the characters are painted (see ImageHelper.camera_boxes)
+    """
+    index: int
+    chars: List[CharState] = field(default_factory=list)
+    gif_index: int = 0
+    dark_background: bool = False
+    camera: Optional[Tuple[float, float, float, float]] = None
+
+
+_executor = None
+_executor_jobs = 0
+
+
+def _get_executor(jobs: int) -> ProcessPoolExecutor:
+    """Return the process pool shared by all activities, (re)creating it for a new size"""
+    global _executor, _executor_jobs
+    if _executor is None or _executor_jobs != jobs:
+        if _executor is not None:
+            _executor.shutdown()
+        # 子进程使用父进程运行时的配置 (output_dir, g_width, ...)
+        _executor = ProcessPoolExecutor(max_workers=jobs,
+                                        mp_context=multiprocessing.get_context("spawn"),
+                                        initializer=config_reader.apply_runtime_config,
+                                        initargs=(config_reader.get_runtime_config(),))
+        _executor_jobs = jobs
+        logger.info(f"使用 {jobs} 个进程并行渲染帧")
+    return _executor
+
+
+def _paint_name_plate(char: CharState, canvas: Image.Image) -> Optional[Image.Image]:
+    if char.name_plate:
+        return ImageHelper.display_char_name(char, canvas, name=char.name_plate)
+    return None
+
+
+def _render_chunk(chunk: List[Tuple[FrameJob, Any]], backgrounds: Dict[Any, Image.Image], mode: str) -> List[Tuple[int, Optional[Image.Image]]]:
+    """
+    Render a contiguous chunk of frames in a worker process.
+
+    Params:
+        chunk: List of (FrameJob, background), background is an image path or a key of backgrounds
+        backgrounds: Background images of the chunk (frames with the same content are sent once)
+        mode: Canvas mode of the FrameStore
+
+    Returns:
+        List of (frame index, rendered image); the image is None when the frame was saved to its path
+    """
+    dark_backgrounds = {}
+    results = []
+    for job, background in chunk:
+        if isinstance(background, str):
+            image_obj = ImageHelper.dark_image(background) if job.dark_background else None
+            canvas = RenderHelper.paint_frame_job(job, background, image_obj=image_obj)
+            ImageHelper.save_image(canvas, background)
+            canvas.close()
+            results.append((job.index, None))
+            continue
+
+        image_obj = backgrounds[background]
+        if job.dark_background:
+            if background not in dark_backgrounds:
+                dark_backgrounds[background] = ImageHelper.dark_image(image_obj)
+            image_obj = dark_backgrounds[background]
+        results.append((job.index, RenderHelper.paint_frame_job(job, None, image_obj=image_obj, mode=mode)))
+    return results
+
+
 class RenderHelper:
     """Centralized character rendering utilities"""
 
+    @staticmethod
+    def snapshot_characters(
+        char_list: List[Character],
+        dark: Optional[Callable[[Character], bool]] = None,
+        name_plate: Optional[Callable[[Character], Optional[str]]] = None
+    ) -> List[CharState]:
+        """
+        Take a snapshot of the visible characters for one frame.
+
+        Params:
+            char_list: List of Character objects (in render order)
+            dark: Optional function(char) -> bool, render the character darkened
+            name_plate: Optional function(char) -> name to display next to the character
+
+        Returns:
+            List of CharState (positions and sizes are copied)
+
+        Example:
+            >>> jobs.append(FrameJob(i, RenderHelper.snapshot_characters(chars), gif_index=i))
+        """
+        states = []
+        for char in char_list:
+            if not RenderHelper.should_render_character(char):
+                continue
+            if char.image.lower().endswith(".gif") and not char.gif_frames:
+                char.gif_frames = ImageHelper.get_frames_from_gif(char.image)
+            states.append(CharState(
+                name=char.name,
+                obj=char.obj,
+                image=char.image,
+                gif_frames=list(char.gif_frames),
+                pos=list(char.pos),
+                size=list(char.size),
+                rotate=char.rotate,
+                transparency=char.transparency,
+                dark=bool(dark(char)) if dark else False,
+                name_plate=name_plate(char) if name_plate else None,
+                signature=getattr(char, "signature", None)
+            ))
+        return states
+
+    @staticmethod
+    def paint_frame_job(
+        job: FrameJob,
+        image: Any,
+        image_obj: Optional[Image.Image] = None,
+        mode: Optional[str] = None
+    ) -> Optional[Image.Image]:
+        """
+        Composite the characters of a FrameJob onto one canvas.
+
+        Params:
+            job: The precomputed frame state
+            image: Background image path or Frame (None when image_obj and mode are given)
+            image_obj: Background PIL Image to start from (not modified)
+            mode: Canvas mode, required when image is None
+
+        Returns:
+            The composited canvas, or None when there is nothing to paint
+        """
+        if job.camera is not None:
+            return RenderHelper.paint_camera_frame(job, image, image_obj=image_obj, mode=mode)
+        return RenderHelper.compose_frame(
+            image,
+            job.chars,
+            image_obj=image_obj,
+            gif_index=job.gif_index,
+            dark=lambda char: char.dark,
+            on_painted=_paint_name_plate,
+            mode=mode
+        )
+
+    @staticmethod
+    def paint_camera_frame(
+        job: FrameJob,
+        image: Any,
+        image_obj: Optional[Image.Image] = None,
+        mode: Optional[str] = None
+    ) -> Image.Image:
+        """
+        Composite the characters of a FrameJob and apply its camera box in one resample.
+
+        Params:
+            job: The precomputed frame state, job.camera must be set
+            image: Background image path or Frame (None when image_obj and mode are given)
+            image_obj: Background PIL Image to start from (not modified)
+            mode: Canvas mode, required when image is None
+
+        Returns:
+            The zoomed canvas (frame size)
+        """
+        canvas = RenderHelper.compose_frame(
+            image,
+            job.chars,
+            image_obj=image_obj,
+            gif_index=job.gif_index,
+            dark=lambda char: char.dark,
+            on_painted=_paint_name_plate,
+            mode=mode
+        )
+        if canvas is None:
+            canvas = ImageHelper.prepare_canvas(image, mode=mode)
+        return ImageHelper.camera_transform(canvas, job.camera)
+
+    @staticmethod
+    def render_frame_jobs(images: List[str], frame_jobs: List[FrameJob], jobs: Optional[int] = None) -> None:
+        """
+        Render precomputed frames and save them.
+
+        With more than one job the frames are rendered on a ProcessPoolExecutor;
+        every worker runs the same code as the sequential path, so the output
+        is identical.
+
+        Params:
+            images: List of background image paths, or a FrameStore
+            frame_jobs: One FrameJob per frame to render
+            jobs: Number of processes (default: config_reader.jobs)
+
+        Returns:
+            None (saves images directly)
+
+        Example:
+            >>> RenderHelper.render_frame_jobs(images, frame_jobs)
+        """
+        jobs = jobs if jobs else config_reader.jobs
+        frame_jobs = [job for job in frame_jobs if job.chars or job.dark_background or job.camera is not None]
+        if jobs <= 1 or len(frame_jobs) < 2:
+            dark_backgrounds = {}
+            for job in frame_jobs:
+                img = images[job.index]
+                image_obj = ImageHelper.dark_background(img, dark_backgrounds) if job.dark_background else None
+                canvas = RenderHelper.paint_frame_job(job, img, image_obj=image_obj)
+                ImageHelper.save_image(canvas, img)
+                canvas.close()
+            return
+
+        logger.debug(f"并行渲染 {len(frame_jobs)} 帧，进程数: {jobs}")
+        chunk_size = max(1, -(-len(frame_jobs) // (jobs * 4)))
+        mode = getattr(images, "mode", None)   # FrameStore的模式；图片路径列表由worker根据扩展名确定
+        futures = []
+        for start in range(0, len(frame_jobs), chunk_size):
+            chunk, backgrounds = [], {}
+            for job in frame_jobs[start:start + chunk_size]:
+                img = images[job.index]
+                if isinstance(img, str):
+                    chunk.append((job, img))
+                    continue
+                key = img.content_key()
+                if key not in backgrounds:
+                    backgrounds[key] = img.load()
+                chunk.append((job, key))
+            futures.append(_get_executor(jobs).submit(_render_chunk, chunk, backgrounds, mode))
+
+        for future in futures:
+            for index, canvas in future.result():
+                if canvas is not None:
+                    ImageHelper.save_image(canvas, images[index])
+
+    @staticmethod
+    def compose_frame(
+        image: str,
+        char_list: List[Character],
+        image_obj: Optional[Image.Image] = None,
+        gif_index: int = 0,
+        dark: Optional[Callable[[Character], bool]] = None,
+        on_painted: Optional[Callable[[Character, Image.Image], Optional[Image.Image]]] = None,
+        mode: Optional[str] = None
+    ) -> Optional[Image.Image]:
+        """
+        Composite all visible characters onto one canvas.
+
+        The background is converted and resized once, then every character is
+        pasted onto that canvas in place, so the per-character cost depends on
+        the sprite area instead of the frame area.
+
+        Params:
+            image: Path to background image, or a Frame from a FrameStore
+            char_list: List of Character objects to render (in render order)
+            image_obj: Background PIL Image to start from (not modified), e.g. a darkened frame
+            gif_index: Index for GIF animation frames
+            dark: Optional function(char) -> bool, render the character darkened
+            on_painted: Optional function(char, canvas) called after each character
+                is painted; may return a replacement canvas
+            mode: Canvas mode, only needed when image is None (see ImageHelper.prepare_canvas)
+
+        Returns:
+            The composited canvas, or None when nothing was painted and no image_obj was given
+
+        Example:
+            >>> canvas = RenderHelper.compose_frame(images[i], [char1, char2], gif_index=i)
+            >>> if canvas:
+            ...     ImageHelper.save_image(canvas, images[i])
+        """
+        canvas = None
+        if image_obj is not None:
+            canvas = ImageHelper.prepare_canvas(image, image_obj, mode=mode)
+
+        for char in char_list:
+            if not RenderHelper.should_render_character(char):
+                continue
+            if canvas is None:
+                canvas = ImageHelper.prepare_canvas(image, mode=mode)
+            ImageHelper.paint_char_on_canvas(
+                char,
+                canvas,
+                gif_index=gif_index,
+                dark=dark(char) if dark else False
+            )
+            if on_painted:
+                canvas = on_painted(char, canvas) or canvas
+
+        return canvas
+
     @staticmethod
     def render_characters_on_frame(
         image: str,
@@ -46,7 +367,7 @@ class RenderHelper:
         Render all visible characters onto a single frame.
 
         Params:
-            image: Path to background image
+            image: Path to background image, or a Frame from a FrameStore
             char_list: List of Character objects to render
             big_image_obj: Existing PIL Image object to paint on (or None to start fresh)
             gif_index: Index for GIF animation frames
@@ -62,15 +383,14 @@ class RenderHelper:
         """
         logger.debug(f"渲染角色到单帧: image={image}, chars={len(char_list)}, gif_index={gif_index}")
 
-        for char in char_list:
-            if RenderHelper.should_render_character(char):
-                _, big_image_obj = ImageHelper.paint_char_on_image(
-                    char=char,
-                    image=image,
-                    image_obj=big_image_obj,
-                    save=save,
-                    gif_index=gif_index
-                )
+        big_image_obj = RenderHelper.compose_frame(
+            image,
+            char_list,
+            image_obj=big_image_obj,
+            gif_index=gif_index
+        )
+        if save and big_image_obj:
+            ImageHelper.save_image(big_image_obj, image)
 
         return image, big_image_obj
 
@@ -87,7 +407,7 @@ class RenderHelper:
         Each frame gets a fresh render with the current character properties.
 
         Params:
-            images: List of background image paths
+            images: List of background image paths, or a FrameStore (frames addressed by index)
             char_list: List of Character objects to render
             gif_index_function: Optional function(i) -> gif_index for custom indexing
 
@@ -101,23 +421,38 @@ class RenderHelper:
         """
         logger.debug(f"批量渲染角色到 {len(images)} 帧")
 
-        for i in range(len(images)):
-            gif_index = gif_index_function(i) if gif_index_function else i
-            big_image = None
+        # 角色在这些帧之间没有变化，所有帧共享同一份快照
+        chars = RenderHelper.snapshot_characters(char_list)
+        frame_jobs = [
+            FrameJob(i, chars, gif_index=gif_index_function(i) if gif_index_function else i)
+            for i in range(len(images))
+        ]
+        RenderHelper.render_frame_jobs(images, frame_jobs)
 
-            for char in char_list:
-                if RenderHelper.should_render_character(char):
-                    _, big_image = ImageHelper.paint_char_on_image(
-                        char=char,
-                        image=images[i],
-                        image_obj=big_image,
-                        save=False,
-                        gif_index=gif_index
-                    )
+    @staticmethod
+    def render_camera_frames(
+        images: List[str],
+        char_list: List[Character],
+        boxes: Any
+    ) -> None:
+        """
+        Render characters and a camera move across frames, one load and one save per frame.
 
-            if big_image:
-                big_image.save(images[i])
-                big_image.close()
+        Params:
+            images: List of background image paths, or a FrameStore
+            char_list: List of Character objects to render (empty for background only)
+            boxes: Visible box of every frame, see ImageHelper.camera_boxes
+
+        Returns:
+            None (saves images directly)
+        """
+        logger.debug(f"渲染镜头到 {len(images)} 帧")
+        chars = RenderHelper.snapshot_characters(char_list)
+        frame_jobs = [
+            FrameJob(i, chars, gif_index=i, camera=tuple(float(v) for v in boxes[i]))
+            for i in range(len(images))
+        ]
+        RenderHelper.render_frame_jobs(images, frame_jobs)
 
     @staticmethod
     def render_with_position_tracking(
@@ -135,7 +470,7 @@ class RenderHelper:
         mode and fight.py choreography.
 
         Params:
-            images: List of background image paths
+            images: List of background image paths, or a FrameStore (frames addressed by index)
             delay_positions: List of dicts with structure:
                 [{"char": Character, "position": [[pos, size, rotate, image?], ...]}, ...]
             char_list: List of all Character objects in scene
@@ -156,12 +491,11 @@ class RenderHelper:
         """
         logger.debug(f"使用位置跟踪渲染 {len(images)} 帧，共 {len(delay_positions)} 个角色位置")
 
+        frame_jobs = []
         for j in range(len(images)):
-            big_image = None
-
             for char in char_list:
                 # Skip Characters that are not displayed
-                if isinstance(char, Character) and not char.display:
+                if not RenderHelper.should_render_character(char):
                     continue
 
                 # Find and apply position data for this character
@@ -174,18 +508,14 @@ class RenderHelper:
                         char, position_data, include_image=True
                     )
 
-                # Render the character
-                _, big_image = ImageHelper.paint_char_on_image(
-                    char=char,
-                    image=images[j],
-                    image_obj=big_image,
-                    save=False,
-                    gif_index=j + gif_index_start
-                )
+            # Snapshot all characters for this frame, render later (possibly in parallel)
+            frame_jobs.append(FrameJob(
+                j,
+                RenderHelper.snapshot_characters(char_list),
+                gif_index=j + gif_index_start
+            ))
 
-            if big_image:
-                big_image.save(images[j])
-                big_image.close()
+        RenderHelper.render_frame_jobs(images, frame_jobs)
 
     @staticmethod
     def create_static_frame(
@@ -201,7 +531,7 @@ class RenderHelper:
         multiple times with no animation.
 
         Params:
-            images: List of background image paths to populate
+            images: List of background image paths (or a FrameStore) to populate
             char_list: List of Character objects to render
             source_image_index: Index of source image to render on (default 0)
             gif_index: GIF index to use for rendering (default 0)
@@ -216,23 +546,17 @@ class RenderHelper:
         """
         logger.debug(f"创建静态帧并复制到 {len(images)} 张图片")
 
-        big_image = None
-
         # Render all characters onto the first frame
-        for char in char_list:
-            if RenderHelper.should_render_character(char):
-                _, big_image = ImageHelper.paint_char_on_image(
-                    image=images[source_image_index],
-                    image_obj=big_image,
-                    char=char,
-                    save=False,
-                    gif_index=gif_index
-                )
+        big_image = RenderHelper.compose_frame(
+            images[source_image_index],
+            char_list,
+            gif_index=gif_index
+        )
 
         # Replicate the rendered frame to all images
         if big_image:
             for i in range(len(images)):
-                big_image.save(images[i])
+                ImageHelper.save_image(big_image, images[i])
             big_image.close()
 
     @staticmethod
@@ -0,0 +1,170 @@
+#!/usr/bin/python3
+"""
+SoftSubtitle - 软字幕输出
+
+默认所有字幕都用 ImageHelper.add_text_to_image 绘制到每一帧上（活动字幕和动作字幕各绘制一遍）。
+config.yaml 的 subtitle_output（或者脚本中的 `字幕输出:`）不是 burn 时，不再绘制字幕，
+而是把已经计算好的字幕时间（活动字幕和动作字幕）收集起来，在生成最终视频后输出：
+    srt:   与视频同名的 .srt 文件
+    ass:   与视频同名的 .ass 文件（使用config中的字体、字号和分辨率）
+    track: 把字幕作为文字轨道封装到视频中（mp4/mov 使用 mov_text，其他容器使用 srt），不重新编码视频
+"""
+import os
+import subprocess
+import sys
+import tempfile
+from typing import Iterable, List, NamedTuple, Sequence, Tuple
+
+sys.path.append('../')
+import imageio_ffmpeg
+
+import config_reader
+
+from logging_config import get_logger
+logger = get_logger(__name__)
+
+MODES = ("burn", "srt", "ass", "track")
+
+
+class Cue(NamedTuple):
+    """一条字幕，时间单位秒"""
+    start: float
+    end: float
+    text: str
+
+
+def is_soft() -> bool:
+    """是否使用软字幕（不把字幕绘制到帧上）"""
+    return config_reader.subtitle_output != "burn"
+
+
+def normalize(cues: Iterable[Sequence]) -> List[Cue]:
+    """去掉空字幕和重复的字幕（同一句话同时出现在活动和动作中时只保留一条），按照开始时间排序
+
+    Params:
+        cues: [(开始时间, 结束时间, 文字)]
+    Return:
+        [Cue]
+    """
+    result = {}
+    for start, end, text in cues:
+        text = str(text).strip() if text else ""
+        if not text or end <= start:
+            continue
+        cue = Cue(round(float(start), 3), round(float(end), 3), text)
+        result.setdefault(cue, cue)
+    return sorted(result, key=lambda c: (c.start, c.end))
+
+
+def concat(tracks: Sequence[Tuple[float, Sequence]]) -> List[Cue]:
+    """把依次播放的多个视频片段的字幕合并成一条字幕，后面片段的字幕时间加上前面片段的总时长
+
+    Params:
+        tracks: [(片段时长, [(开始时间, 结束时间, 文字)])]
+    Return:
+        [Cue]
+    """
+    cues = []
+    offset = 0.0
+    for duration, track in tracks:
+        cues += [(offset + start, offset + end, text) for start, end, text in track or []]
+        offset += duration
+    return normalize(cues)
+
+
+def _timestamp(seconds: float, separator: str, digits: int) -> str:
+    total = round(seconds * 10 ** digits)
+    fraction = total % 10 ** digits
+    total //= 10 ** digits
+    return f"{total // 3600:02d}:{total // 60 % 60:02d}:{total % 60:02d}{separator}{fraction:0{digits}d}"
+
+
+def to_srt(cues: Sequence[Cue]) -> str:
+    """SubRip格式的字幕"""
+    return "".join(f"{i}\n{_timestamp(c.start, ',', 3)} --> {_timestamp(c.end, ',', 3)}\n{c.text}\n\n"
+                   for i, c in enumerate(cues, 1))
+
+
+def to_ass(cues: Sequence[Cue]) -> str:
+    """ASS格式的字幕，字体、字号和分辨率与绘制字幕时相同，字幕显示在底部中间"""
+    from libs import ImageHelper
+    try:
+        font_name = ImageHelper.get_font(config_reader.font, config_reader.font_size).getname()[0]
+    except OSError:
+        font_name = os.path.splitext(os.path.basename(config_reader.font))[0]
+    lines = [
+        "[Script Info]",
+        "ScriptType: v4.00+",
+        f"PlayResX: {config_reader.g_width}",
+        f"PlayResY: {config_reader.g_height}",
+        "",
+        "[V4+ Styles]",
+        "Format: Name, Fontname, Fontsize, PrimaryColour, OutlineColour, BackColour, Bold, Italic, "
+        "BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV",
+        f"Style: Default,{font_name},{config_reader.font_size},&H00FFFFFF,&H00000000,&H00000000,0,0,1,2,0,2,10,10,20",
+        "",
+        "[Events]",
+        "Format: Layer, Start, End, Style, Text",
+    ]
+    # ASS的时间只有两位小数；文字中的换行使用\N
+    lines += [f"Dialogue: 0,{_timestamp(c.start, '.', 2)[1:]},{_timestamp(c.end, '.', 2)[1:]},Default,"
+              + c.text.replace("\n", "\\N") for c in cues]
+    return "\n".join(lines) + "\n"
+
+
+def write(cues: Sequence[Cue], path: str) -> str:
+    """根据后缀(.srt/.ass)保存字幕文件
+
+    Return:
+        字幕文件路径
+    """
+    content = to_ass(cues) if path.lower().endswith(".ass") else to_srt(cues)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+    return path
+
+
+def mux(video: str, cues: Sequence[Cue]) -> str:
+    """把字幕作为文字轨道封装到视频文件中（复制音视频流，不重新编码）
+
+    Params:
+        video: 视频文件，直接替换
+        cues: 字幕
+    Return:
+        视频文件路径
+    """
+    folder = os.path.dirname(video) or "."
+    codec = "mov_text" if os.path.splitext(video)[1].lower() in (".mp4", ".mov", ".m4v") else "srt"
+    fd, srt = tempfile.mkstemp(suffix=".srt", dir=folder)
+    os.close(fd)
+    fd, tmp = tempfile.mkstemp(suffix=os.path.splitext(video)[1], dir=folder)
+    os.close(fd)
+    try:
+        write(cues, srt)
+        cmd = [imageio_ffmpeg.get_ffmpeg_exe(), "-y", "-v", "error", "-i", video, "-i", srt,
+               "-map", "0", "-map", "1", "-c", "copy", "-c:s", codec, "-metadata:s:s:0", "language=chi", tmp]
+        subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+        os.replace(tmp, video)
+    finally:
+        for path in (srt, tmp):
+            if os.path.exists(path):
+                os.remove(path)
+    return video
+
+
+def export(video: str, cues: Sequence[Cue]) -> str:
+    """按照 subtitle_output 输出最终视频的软字幕
+
+    Params:
+        video: 最终的视频文件
+        cues: 整个视频的字幕
+    Return:
+        字幕文件或者视频文件的路径
+    """
+    mode = config_reader.subtitle_output
+    if mode == "track":
+        path = mux(video, cues)
+    else:
+        path = write(cues, os.path.splitext(video)[0] + "." + mode)
+    logger.info(f"输出 {len(cues)} 条软字幕 ({mode}): {path}")
+    return path
@@ -0,0 +1,100 @@
+#!/usr/bin/python3
+"""
+SpriteCache - 角色图片（精灵）缓存
+
+merge_two_image 会在每一帧为每个角色重新打开、解码、缩放、旋转同一张图片。
+SpriteCache 以 (图片路径, 修改时间, 显示尺寸, 角度, 亮度, 透明度) 为键，
+缓存已经处理好、可以直接粘贴的图片，并按照占用的字节数做LRU淘汰。
+"""
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+sys.path.append('../')
+from PIL import Image
+
+import config_reader
+
+from logging_config import get_logger
+logger = get_logger(__name__)
+
+
+class SpriteCache:
+    """按字节数限制大小的LRU图片缓存"""
+
+    def __init__(self, max_bytes: int):
+        """
+        Params:
+            max_bytes: 缓存的最大字节数，超出后淘汰最久未使用的图片
+        """
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._items: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def image_bytes(image: Image.Image) -> int:
+        """估算图片占用的字节数"""
+        w, h = image.size
+        return w * h * len(image.getbands())
+
+    def get(self, key: Hashable, factory: Callable[[], Tuple[Image.Image, str]]) -> Tuple[Image.Image, str]:
+        """获取缓存的图片，不存在时调用factory生成并缓存
+
+        Params:
+            key: 缓存键
+            factory: 生成 (图片, 模式) 的函数
+        Return:
+            (图片, 模式)，图片被多个调用者共享，不能修改或者close()
+        """
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return item[0]
+            self.misses += 1
+
+        value = factory()
+        size = self.image_bytes(value[0])
+        if size > self.max_bytes:
+            return value
+
+        with self._lock:
+            if key not in self._items:
+                self._items[key] = (value, size)
+                self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted_size) = self._items.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+        return value
+
+    def clear(self) -> None:
+        """清空缓存（不重置命中统计）"""
+        with self._lock:
+            self._items.clear()
+            self.bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        """返回缓存统计信息
+
+        Return:
+            {"hits": 命中次数, "misses": 未命中次数, "evictions": 淘汰次数, "items": 图片数, "bytes": 占用字节数}
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "items": len(self._items),
+                "bytes": self.bytes,
+            }
+
+
+# 进程内共享的精灵缓存，通过 libs.SpriteCache.sprite_cache 访问
+sprite_cache = SpriteCache(config_reader.sprite_cache_size * 1024 * 1024)
@@ -0,0 +1,236 @@
+#!/usr/bin/python3
+"""
+TTSCache - 语音合成结果缓存
+
+AudioHelper.covert_text_to_sound 以前只在输出文件已经存在时跳过合成，
+同一个发音人在其他场景/脚本中说同一句话，或者输出文件改了名字，都会再次调用付费接口或者ChatTTS。
+TTSCache 以 (引擎, 发音人, 语气, 规范化后的文字) 为键，把合成好的声音保存在 cache_dir/tts 下，
+需要时通过硬链接（不支持时复制）生成输出文件，超出 tts_cache_size 后按照最久未使用的顺序淘汰。
+最近使用时间记录在每个声音旁边的 .json 文件的修改时间中：声音文件与输出文件是同一个inode，
+修改它的时间会让输出文件的修改时间也变化（AudioProbe和FileDigest按照修改时间缓存）。
+
+查看缓存统计:
+    python libs/TTSCache.py stats
+清空缓存:
+    python libs/TTSCache.py clear
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import unicodedata
+from typing import Any, Dict, List, Optional, Tuple
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config_reader
+
+from logging_config import get_logger
+logger = get_logger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """规范化文字：全角/半角统一(NFKC)，合并连续空白，去掉首尾空白"""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", str(text))).strip()
+
+
+class TTSCache:
+    """按字节数限制大小、以合成参数为键的语音文件缓存"""
+
+    def __init__(self, directory: Optional[str] = None, max_bytes: Optional[int] = None):
+        """
+        Params:
+            directory: 缓存目录，默认是 cache_dir/tts
+            max_bytes: 缓存的最大字节数，默认是 config.yaml 中的 tts_cache_size (MB)
+        """
+        self._directory = directory
+        self._max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    @property
+    def directory(self) -> str:
+        return self._directory or os.path.join(config_reader.cache_dir, "tts")
+
+    @property
+    def max_bytes(self) -> int:
+        return self._max_bytes if self._max_bytes is not None else config_reader.tts_cache_size * 1024 * 1024
+
+    @staticmethod
+    def key(engine: str, speaker: Any, style: str, text: str) -> str:
+        """缓存键
+
+        Params:
+            engine: 语音引擎，如: xunfei, chat, ttspro
+            speaker: 发音人
+            style: 语气
+            text: 文字
+        Return:
+            sha256字符串
+        """
+        data = json.dumps([engine, str(speaker), style, normalize_text(text)], ensure_ascii=False)
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key: str, ext: str) -> str:
+        return os.path.join(self.directory, key[:2], key + ext.lower())
+
+    @staticmethod
+    def _info_path(path: str) -> str:
+        """声音旁边的 .json 文件：合成参数，修改时间是最近使用时间"""
+        return os.path.splitext(path)[0] + ".json"
+
+    @staticmethod
+    def _materialize(source: str, output: str) -> None:
+        """使用硬链接生成文件，不支持硬链接（比如跨文件系统）时复制"""
+        output_folder = os.path.dirname(output)
+        if output_folder:
+            os.makedirs(output_folder, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(suffix=os.path.splitext(output)[1], dir=output_folder or ".")
+        os.close(fd)
+        os.remove(tmp)
+        try:
+            os.link(source, tmp)
+        except OSError:
+            shutil.copyfile(source, tmp)
+        os.replace(tmp, output)
+
+    def fetch(self, engine: str, speaker: Any, style: str, text: str, output: str) -> bool:
+        """如果缓存中有对应的声音，生成输出文件
+
+        Params:
+            engine, speaker, style, text: 合成参数
+            output: 输出文件
+        Return:
+            True: 命中缓存，输出文件已经生成; False: 没有缓存
+        """
+        path = self._entry_path(self.key(engine, speaker, style, text), os.path.splitext(output)[1])
+        if not os.path.exists(path):
+            with self._lock:
+                self.misses += 1
+            return False
+        self._materialize(path, output)
+        try:
+            os.utime(self._info_path(path))  # 最近使用时间，用于淘汰（不修改与输出文件共享的声音文件）
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self.hits += 1
+        logger.debug(f"使用语音缓存: {text} -> {output}")
+        return True
+
+    def store(self, engine: str, speaker: Any, style: str, text: str, output: str) -> None:
+        """把合成好的声音文件保存到缓存中
+
+        Params:
+            engine, speaker, style, text: 合成参数
+            output: 合成好的声音文件
+        """
+        if not os.path.exists(output) or os.path.getsize(output) == 0:
+            return
+        key = self.key(engine, speaker, style, text)
+        path = self._entry_path(key, os.path.splitext(output)[1])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._materialize(output, path)
+        with open(self._info_path(path), "w", encoding="utf-8") as f:
+            json.dump({"engine": engine, "speaker": str(speaker), "style": style, "text": normalize_text(text)},
+                      f, ensure_ascii=False)
+        self.evict()
+
+    def entries(self) -> List[Tuple[str, int, float]]:
+        """缓存中的全部声音文件
+
+        Return:
+            [(路径, 字节数, 最近使用时间)]
+        """
+        result = []
+        if not os.path.isdir(self.directory):
+            return result
+        for folder in os.scandir(self.directory):
+            if not folder.is_dir():
+                continue
+            for entry in os.scandir(folder.path):
+                if entry.is_file() and not entry.name.endswith((".json", ".tmp")):
+                    size = entry.stat().st_size
+                    try:
+                        last_used = os.stat(self._info_path(entry.path)).st_mtime
+                    except FileNotFoundError:
+                        last_used = entry.stat().st_mtime
+                    result.append((entry.path, size, last_used))
+        return result
+
+    def evict(self) -> None:
+        """超出大小限制时，删除最久未使用的声音"""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return
+        for path, size, _ in sorted(entries, key=lambda x: x[2]):
+            if total <= self.max_bytes:
+                break
+            for file in (path, self._info_path(path)):
+                try:
+                    os.remove(file)
+                except FileNotFoundError:
+                    pass
+            total -= size
+            with self._lock:
+                self.evictions += 1
+            logger.debug(f"淘汰语音缓存: {path}")
+
+    def clear(self) -> None:
+        """清空缓存目录"""
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回缓存统计信息
+
+        Return:
+            {"hits": 命中次数, "misses": 未命中次数, "evictions": 淘汰次数, "items": 声音文件数,
+             "bytes": 占用字节数, "max_bytes": 最大字节数, "engines": {引擎: 声音文件数}}
+        """
+        entries = self.entries()
+        engines: Dict[str, int] = {}
+        for path, _, _ in entries:
+            try:
+                with open(self._info_path(path), encoding="utf-8") as f:
+                    engine = json.load(f).get("engine")
+            except (OSError, ValueError):
+                engine = None
+            engines[str(engine)] = engines.get(str(engine), 0) + 1
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "items": len(entries),
+                "bytes": sum(size for _, size, _ in entries),
+                "max_bytes": self.max_bytes,
+                "engines": engines,
+            }
+
+
+# 进程内共享的语音缓存，通过 libs.TTSCache.tts_cache 访问
+tts_cache = TTSCache()
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    if command == "stats":
+        stats = tts_cache.stats()
+        print(f"目录: {tts_cache.directory}")
+        print(f"声音文件: {stats['items']} 个, {stats['bytes'] / 1024 / 1024:.1f}MB / {stats['max_bytes'] / 1024 / 1024:.0f}MB")
+        for engine, count in sorted(stats["engines"].items()):
+            print(f"  {engine}: {count}")
+    elif command == "clear":
+        tts_cache.clear()
+        print(f"已清空: {tts_cache.directory}")
+    else:
+        print(f"未知命令: {command}，可用命令: stats, clear")
+        sys.exit(1)
@@ -32,13 +32,27 @@ chat.infer([text], use_decoder=True, params_infer_code={'spk_emb': rand_spk, 'pr
 
 import ChatTTS
 import csv
+import hashlib
 import os
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
 import torch
 import torchaudio
+from typing import Any, Dict, List, Optional, Tuple
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
 from pydub import AudioSegment
 from pydub.playback import play
 
+import config_reader
+from logging_config import get_logger
+logger = get_logger(__name__)
+
 
 def get_speaker(speaker='男'):
     """获取发音人
@@ -79,6 +93,208 @@ def get_speaker(speaker='男'):
     sample[100:400] = [0.2] * 300
     return torch.tensor(sample, device=device)
 
+class ChatEngine:
+    """常驻进程的ChatTTS引擎
+
+    以前每一句话都要重新创建 ChatTTS.Chat() 并执行 chat.load(compile=True)，
+    在只有CPU的机器上加载模型的时间远远超过合成一句话的时间。
+    ChatEngine 在第一次使用时加载（编译）模型一次，之后一直复用；
+    发音人的音色(spk_emb)也只解析一次；
+    covert_batch 把同一个发音人的多句话放在一次 chat.infer 中合成。
+    CPU上的线程数、int8量化和保存编译/量化结果在 global_config.yaml 的 chat_tts 中设置，
+    可以使用 `python libs/TTSEngine/chat.py bench` 比较不同设置的实时率(RTF)。
+    """
+
+    def __init__(self, compile: bool = True, threads: Optional[int] = None, interop_threads: Optional[int] = None,
+                 quantize: bool = False, persist: bool = False, max_batch: int = 16):
+        """
+        Params:
+            compile: 加载模型时是否编译（ChatTTS只在CUDA上编译）
+            threads: CPU推理使用的intra-op线程数，None/0表示使用torch的默认值
+            interop_threads: CPU推理使用的inter-op线程数，None/0表示使用torch的默认值
+            quantize: 在CPU上把GPT的Linear层动态量化为int8
+            persist: 把量化后的GPT和编译结果保存到 cache_dir/chattts，下次运行直接使用
+            max_batch: 一次chat.infer最多合成的句子数
+        """
+        self.compile = compile
+        self.threads = threads
+        self.interop_threads = interop_threads
+        self.quantize = quantize
+        self.persist = persist
+        self.max_batch = max_batch
+        self._chat = None
+        self._speakers: Dict[str, torch.Tensor] = {}
+        self._lock = threading.RLock()
+
+    @property
+    def device(self) -> torch.device:
+        return torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+
+    @property
+    def persist_dir(self) -> str:
+        return os.path.join(config_reader.cache_dir, "chattts")
+
+    @property
+    def chat(self) -> "ChatTTS.Chat":
+        """加载好的ChatTTS模型，参考load"""
+        return self.load()
+
+    def load(self) -> "ChatTTS.Chat":
+        """加载ChatTTS模型，每个进程只加载一次，之后直接返回加载好的模型"""
+        with self._lock:
+            if self._chat is None:
+                start = time.time()
+                self._apply_threads()
+                if self.compile and self.persist:
+                    # inductor的编译结果保存在磁盘上，下次运行不用重新编译
+                    os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", os.path.join(self.persist_dir, "inductor"))
+                chat = ChatTTS.Chat()
+                chat.load(compile=self.compile)
+                if self.quantize and self.device.type == "cpu":
+                    self._quantize(chat)
+                self._chat = chat
+                logger.info(f"ChatTTS模型加载完成，耗时 {time.time() - start:.1f}秒 "
+                            f"(设备: {self.device}, 线程数: {torch.get_num_threads()}/{torch.get_num_interop_threads()}, "
+                            f"int8量化: {self.quantize and self.device.type == 'cpu'})")
+            return self._chat
+
+    def _apply_threads(self) -> None:
+        """线程数只在加载时设置一次，之后的推理都使用相同的设置"""
+        if self.device.type != "cpu":
+            return
+        if self.threads:
+            torch.set_num_threads(int(self.threads))
+        if self.interop_threads and torch.get_num_interop_threads() != int(self.interop_threads):
+            try:
+                torch.set_num_interop_threads(int(self.interop_threads))
+            except RuntimeError as e:
+                # inter-op线程数只能在第一次并行计算之前设置
+                logger.warning(f"无法设置inter-op线程数，使用 {torch.get_num_interop_threads()}: {e}")
+
+    def _quantized_path(self, module: torch.nn.Module) -> str:
+        """量化后的GPT的保存路径，模型参数（形状和前几个值）、ChatTTS和torch的版本变化时路径也会变化"""
+        digest = hashlib.sha256(f"{getattr(ChatTTS, '__version__', '')}|{torch.__version__}".encode())
+        for name, value in module.state_dict().items():
+            digest.update(f"{name}{tuple(value.shape)}".encode())
+            digest.update(value.detach().flatten()[:16].cpu().numpy().tobytes())
+        return os.path.join(self.persist_dir, f"gpt_qint8_{digest.hexdigest()[:16]}.pt")
+
+    def _quantize(self, chat) -> None:
+        """把GPT(LlamaModel)的Linear层动态量化为int8，persist时保存量化结果
+
+        只保存量化后的参数(state_dict)，读取时使用 weights_only=True，缓存文件不会执行任意代码；
+        读取时把Linear层换成空的int8 Linear层，再载入保存的参数，不用重新量化
+        """
+        path = self._quantized_path(chat.gpt.gpt)
+        if self.persist and os.path.exists(path):
+            _replace_linear(chat.gpt.gpt)
+            chat.gpt.gpt.load_state_dict(torch.load(path, weights_only=True))
+            logger.debug(f"使用保存的量化模型: {path}")
+            return
+        torch.ao.quantization.quantize_dynamic(chat.gpt.gpt, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+        if self.persist:
+            os.makedirs(self.persist_dir, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(suffix=".pt", dir=self.persist_dir)
+            with os.fdopen(fd, "wb") as f:
+                torch.save(chat.gpt.gpt.state_dict(), f)
+            os.replace(tmp, path)
+            logger.debug(f"保存量化模型: {path}")
+
+    def speaker_embedding(self, speaker=None) -> torch.Tensor:
+        """发音人的音色，同一个发音人只解析一次
+
+        Params:
+            speaker: 参考get_speaker
+        """
+        key = repr(speaker)
+        with self._lock:
+            if key not in self._speakers:
+                self._speakers[key] = get_speaker(speaker)
+            return self._speakers[key]
+
+    def infer(self, texts: List[str], speaker=None) -> list:
+        """使用同一个发音人合成多句话
+
+        Params:
+            texts: 文本列表
+            speaker: 发音人
+        Return:
+            与texts顺序相同的声音数据(numpy数组)列表
+        """
+        params_infer_code = ChatTTS.Chat.InferCodeParams(
+            spk_emb = self.speaker_embedding(speaker), # add sampled speaker 
+            temperature = 0.4,   # using custom temperature
+            top_P = 0.8,        # top P decode 0 ～ 1
+            top_K = 20,         # top K decode
+            prompt="[speed_5]"   # 语速 0 ~ 9
+        )
+        texts = [text+"。[uv_break]。" for text in texts]    # 追加"。[uv_break]。"只是用来保证ChatTTS能把一句话转化完整
+        with self._lock, torch.inference_mode():
+            return self.chat.infer(texts,
+                                   params_infer_code=params_infer_code,
+                                   skip_refine_text=True,
+                                   refine_text_only=False    # 禁止自动停顿
+                                   )
+
+    def covert_batch(self, items: List[Tuple[str, str, Any]]) -> None:
+        """批量生成语音，同一个发音人的句子放在一次chat.infer中合成
+
+        Params:
+            items: [(文本, 输出文件, 发音人)]
+        """
+        groups: Dict[str, List[Tuple[str, str, Any]]] = {}
+        for item in items:
+            groups.setdefault(repr(item[2]), []).append(item)
+        for group in groups.values():
+            for i in range(0, len(group), self.max_batch):
+                batch = group[i:i + self.max_batch]
+                logger.debug(f"ChatTTS合成 {len(batch)} 句话 (发音人: {batch[0][2]})")
+                wavs = self.infer([text for text, _, _ in batch], batch[0][2])
+                for (_, output, _), wav in zip(batch, wavs):
+                    save_wav(output, wav)
+
+    def covert_text_to_sound(self, text, output, speaker=None):
+        """生成一句话的语音，参考模块的covert_text_to_sound"""
+        self.covert_batch([(text, output, speaker)])
+
+
+def _replace_linear(module: torch.nn.Module) -> None:
+    """把module中的torch.nn.Linear换成相同形状的int8动态量化Linear（参数未初始化），
+    与 quantize_dynamic(module, {torch.nn.Linear}) 替换的层相同
+    """
+    for name, child in module.named_children():
+        if type(child) is torch.nn.Linear:
+            setattr(module, name, torch.ao.nn.quantized.dynamic.Linear(
+                child.in_features, child.out_features, bias_=child.bias is not None, dtype=torch.qint8))
+        else:
+            _replace_linear(child)
+
+
+def save_wav(output, wav):
+    """把ChatTTS生成的声音数据保存到文件(24000Hz)"""
+    output_folder = os.path.dirname(output)
+    if output_folder:
+        os.makedirs(output_folder, exist_ok=True)
+    try:
+        torchaudio.save(output, torch.from_numpy(wav).unsqueeze(0), 24000)
+    except:
+        torchaudio.save(output, torch.from_numpy(wav), 24000)
+
+
+# 进程内共享的ChatTTS引擎，第一次合成时才创建，设置参考 global_config.yaml 中的 chat_tts
+_engine: Optional[ChatEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> ChatEngine:
+    """进程内共享的ChatTTS引擎，导入模块时不创建，第一次合成时才按当时的配置创建"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = ChatEngine(**config_reader.chat_tts)
+        return _engine
+
+
 def covert_text_to_sound(text, output, speaker=None):
     """生成语音
     
@@ -89,35 +305,63 @@ def covert_text_to_sound(text, output, speaker=None):
     Returns:
         none
     """
-    
-    chat = ChatTTS.Chat()
-    chat.load(compile=True)
-    
-    rand_speaker = get_speaker(speaker)
-    params_infer_code = ChatTTS.Chat.InferCodeParams(
-        spk_emb = rand_speaker, # add sampled speaker 
-        temperature = 0.4,   # using custom temperature
-        top_P = 0.8,        # top P decode 0 ～ 1
-        top_K = 20,         # top K decode
-        prompt="[speed_5]"   # 语速 0 ~ 9
-    )
-
-    texts = [text+"。[uv_break]。",]    # 追加"。[uv_break]。"只是用来保证ChatTTS能把一句话转化完整
-    wavs = chat.infer(texts, 
-                      params_infer_code=params_infer_code,
-                      skip_refine_text=True,
-                      refine_text_only=False    # 禁止自动停顿
-                      )
+    get_engine().covert_text_to_sound(text, output, speaker)
 
-    output_folder = os.path.dirname(output)
-    os.makedirs(output_folder, exist_ok=True)
-    try:
-        torchaudio.save(output, torch.from_numpy(wavs[0]).unsqueeze(0), 24000)
-    except:
-        torchaudio.save(output, torch.from_numpy(wavs[0]), 24000)
+
+def covert_batch_to_sound(items):
+    """批量生成语音，模型只加载一次，同一个发音人的句子一次合成
+
+    Params:
+        items: [(文本, 输出文件, 发音人)]
+    """
+    get_engine().covert_batch(items)
         
         
-if __name__ == "__main__":
+def benchmark(settings: List[Dict[str, Any]], texts: List[str], speaker=None) -> List[Dict[str, Any]]:
+    """比较不同引擎设置的实时率 RTF = 合成耗时 / 声音时长（越小越快，小于1表示比实时快）
+
+    每个设置使用一个新的ChatEngine，加载时间单独统计，不计入RTF；计时之前先合成一句预热
+
+    Params:
+        settings: ChatEngine的参数列表，如: [{"threads": 4}, {"threads": 4, "quantize": True}]
+        texts: 用于测试的句子
+        speaker: 发音人
+    Return:
+        [{"settings": 参数, "load": 加载秒数, "seconds": 合成秒数, "audio": 声音秒数, "rtf": 实时率}]
+    """
+    default_threads = torch.get_num_threads()
+    results = []
+    for setting in settings:
+        torch.set_num_threads(default_threads)  # 没有设置线程数时不受上一个设置的影响
+        bench_engine = ChatEngine(**setting)
+        start = time.time()
+        bench_engine.load()
+        load = time.time() - start
+        bench_engine.infer(texts[:1], speaker)
+        start = time.time()
+        wavs = bench_engine.infer(texts, speaker)
+        seconds = time.time() - start
+        audio = sum(np.asarray(wav).size for wav in wavs) / 24000
+        results.append({"settings": setting, "load": load, "seconds": seconds, "audio": audio,
+                        "rtf": seconds / audio if audio else float("inf")})
+        logger.info(f"{setting}: 加载 {load:.1f}秒, 合成 {seconds:.1f}秒, 声音 {audio:.1f}秒, RTF {results[-1]['rtf']:.2f}")
+    torch.set_num_threads(default_threads)
+    return results
+
+
+if __name__ == "__main__" and sys.argv[1:2] == ["bench"]:
+    # python libs/TTSEngine/chat.py bench
+    cpus = torch.get_num_threads()
+    base = dict(config_reader.chat_tts, persist=False)
+    settings = [dict(base, threads=threads, quantize=quantize)
+                for threads in sorted({1, max(1, cpus // 2), cpus}) for quantize in (False, True)]
+    texts = ["在此吃了饭再走不迟", "洒家今日要去五台山", "如今宋江已经占了俺四座大郡", "客官请慢用"]
+    print(f"{'线程数':>6} {'int8':>6} {'加载(秒)':>9} {'合成(秒)':>9} {'声音(秒)':>9} {'RTF':>6}")
+    for result in benchmark(settings, texts, speaker="男"):
+        setting = result["settings"]
+        print(f"{setting['threads']:>6} {str(setting['quantize']):>6} {result['load']:>9.1f} "
+              f"{result['seconds']:>9.1f} {result['audio']:>9.1f} {result['rtf']:>6.2f}")
+elif __name__ == "__main__":
     # get_speaker()
     covert_text_to_sound("在此吃了饭再走不迟", "output/在此吃了饭再走不迟.mp3", speaker=800)
    
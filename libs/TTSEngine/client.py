@@ -0,0 +1,183 @@
+"""
+网络语音引擎（xunfei, ttspro）共用的asyncio客户端
+
+以前每一句话都要重新建立连接（讯飞用run_forever为每句话打开一个websocket，ttspro每次用requests.post新建连接），
+出错时也不会重试。TTSClient 提供：
+    1. 连接复用: 子类在 request 中使用共享的 requests.Session / SSL设置
+    2. 并发和速率限制: 同一批最多 concurrency 个请求同时进行，所有请求（包括其他线程）每秒不超过 rate 个
+    3. 重试: 连接错误、超时、429/5xx 等临时错误按照 backoff * 2^n 秒等待后重试
+    4. 原子写入: 先写入同一目录下的临时文件，再重命名为输出文件，失败时不会留下不完整的声音文件
+
+子类只需要实现同步的 request(text, speaker) -> bytes，它会在线程中运行；
+url可以指向本地的测试服务器。
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+import uuid
+from typing import Any, List, Optional, Sequence, Tuple
+
+import config_reader
+from logging_config import get_logger
+logger = get_logger(__name__)
+
+
+class TransientTTSError(Exception):
+    """可以重试的临时错误（连接断开、超时、服务器繁忙等）"""
+    pass
+
+
+def write_atomic(output: str, data: bytes) -> None:
+    """先写入临时文件再重命名，输出文件要么不存在，要么是完整的
+
+    Params:
+        output: 输出文件
+        data: 文件内容
+    """
+    output_folder = os.path.dirname(output)
+    if output_folder:
+        os.makedirs(output_folder, exist_ok=True)
+    # 不使用mkstemp（只有当前用户可以读写），临时文件按照0o666创建，由umask决定权限，与普通文件相同
+    while True:
+        tmp = os.path.join(output_folder or ".", f".{uuid.uuid4().hex}{os.path.splitext(output)[1]}")
+        try:
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+            break
+        except FileExistsError:
+            continue
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, output)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+class RateLimiter:
+    """每秒最多 rate 个请求，可以在多个线程和事件循环之间共享"""
+
+    def __init__(self, rate: Optional[float] = None):
+        """
+        Params:
+            rate: 每秒的请求数，None/0 表示不限制
+        """
+        self.rate = rate
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """预约下一个请求的时间
+
+        Return:
+            需要等待的秒数
+        """
+        if not self.rate:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + 1.0 / self.rate
+            return slot - now
+
+    async def wait(self) -> None:
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class TTSClient:
+    """网络语音引擎客户端的基类"""
+
+    name = ""   # 引擎名字，用于读取 config.yaml 中的 tts_concurrency 和 tts_rate_limit
+
+    def __init__(self, concurrency: Optional[int] = None, rate: Optional[float] = None,
+                 retries: Optional[int] = None, backoff: float = 0.5, timeout: float = 30):
+        """
+        Params:
+            concurrency: 同一批同时进行的请求数，默认使用 config.yaml 的 tts_concurrency
+            rate: 每秒的请求数，默认使用 config.yaml 的 tts_rate_limit（0表示不限制）
+            retries: 临时错误的重试次数，默认使用 config.yaml 的 tts_retries
+            backoff: 第一次重试之前等待的秒数，之后每次加倍
+            timeout: 单个请求的超时时间（秒）
+        """
+        self._concurrency = concurrency
+        self._retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.limiter = RateLimiter(rate if rate is not None else config_reader.tts_rate_limit.get(self.name))
+
+    @property
+    def concurrency(self) -> int:
+        if self._concurrency is not None:
+            return self._concurrency
+        return max(1, int(config_reader.tts_concurrency.get(self.name, 1)))
+
+    @property
+    def retries(self) -> int:
+        return self._retries if self._retries is not None else config_reader.tts_retries
+
+    def request(self, text: str, speaker: Any) -> bytes:
+        """发送一次合成请求（同步，在线程中运行）
+
+        Return:
+            声音文件的内容
+        Raise:
+            TransientTTSError: 可以重试的错误；其他异常不重试
+        """
+        raise NotImplementedError
+
+    async def synthesize(self, text: str, output: str, speaker: Any,
+                         semaphore: Optional[asyncio.Semaphore] = None) -> str:
+        """合成一句话，临时错误时重试，成功后原子写入输出文件
+
+        Return:
+            输出文件路径
+        """
+        semaphore = semaphore or asyncio.Semaphore(1)
+        async with semaphore:
+            for attempt in range(self.retries + 1):
+                await self.limiter.wait()
+                try:
+                    data = await asyncio.to_thread(self.request, text, speaker)
+                    break
+                except TransientTTSError as e:
+                    if attempt == self.retries:
+                        raise
+                    delay = self.backoff * 2 ** attempt * (1 + random.random() * 0.1)
+                    logger.warning(f"{self.name} 请求失败，{delay:.1f}秒后重试 ({attempt + 1}/{self.retries}): {e}")
+                    await asyncio.sleep(delay)
+        write_atomic(output, data)
+        logger.debug(f"{self.name} 生成语音: {text} -> {output}")
+        return output
+
+    async def synthesize_many(self, items: Sequence[Tuple[str, str, Any]]) -> List[Any]:
+        """同时合成多句话
+
+        Params:
+            items: [(文本, 输出文件, 发音人)]
+        Return:
+            与items顺序相同的列表，成功时是输出文件路径，失败时是异常
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        return await asyncio.gather(*(self.synthesize(text, output, speaker, semaphore)
+                                      for text, output, speaker in items), return_exceptions=True)
+
+    def run(self, items: Sequence[Tuple[str, str, Any]]) -> List[str]:
+        """在新的事件循环中合成多句话（供同步代码调用）
+
+        Params:
+            items: [(文本, 输出文件, 发音人)]
+        Return:
+            输出文件路径列表
+        Raise:
+            第一个失败的异常（其他句子仍然会合成完）
+        """
+        results = asyncio.run(self.synthesize_many(items))
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return results
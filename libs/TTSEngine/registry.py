@@ -0,0 +1,57 @@
+"""
+语音引擎注册表
+
+AudioHelper 通过引擎名字（script.yaml中的`发音人引擎`，global_config.yaml中的tts_engine）找到引擎模块。
+引擎需要提供 covert_text_to_sound(text, output, speaker)，可以提供 covert_batch_to_sound(items) 批量合成。
+内置引擎在第一次使用时才导入（chat需要加载torch和ChatTTS）。
+
+增加引擎:
+    1. 在 global_config.yaml 的 tts_engines 中设置 `名字: 模块名`
+    2. 或者在代码中调用 register("名字", 模块或模块名)
+"""
+import importlib
+import threading
+from typing import Any, Dict, List, Optional, Union
+
+import config_reader
+
+_engines: Dict[str, Union[str, Any]] = {
+    "xunfei": "TTSEngine.xunfei_tts",
+    "chat": "TTSEngine.chat",
+    "ttspro": "TTSEngine.ttspro",
+    "tone": "TTSEngine.tone",   # 离线引擎，根据文字长度生成确定的提示音，用于测试和性能测试
+}
+_engines.update(config_reader.tts_engines)
+_lock = threading.Lock()
+
+
+def register(name: str, engine: Union[str, Any]) -> None:
+    """注册语音引擎
+
+    Params:
+        name: 引擎名字
+        engine: 模块名（第一次使用时导入），或者提供covert_text_to_sound的模块/对象
+    """
+    with _lock:
+        _engines[name] = engine
+
+
+def names() -> List[str]:
+    """全部引擎的名字"""
+    return sorted(_engines)
+
+
+def get(name: str) -> Optional[Any]:
+    """获取引擎
+
+    Params:
+        name: 引擎名字
+    Return:
+        引擎模块/对象，没有注册的引擎返回None
+    """
+    with _lock:
+        engine = _engines.get(name)
+        if isinstance(engine, str):
+            engine = importlib.import_module(engine)
+            _engines[name] = engine
+        return engine
@@ -0,0 +1,94 @@
+"""
+离线语音引擎：不需要网络和模型，根据文字生成确定的"语音"
+
+每个字生成一个短音（音高由发音人和字决定），标点处停顿，时长与真实语音接近（每秒约4.5个字），
+相同的 (文字, 发音人) 总是生成完全相同的文件。
+用于在没有网络的机器上跑完整的时间线、混音和编码流程（CI、性能测试），
+设置 config.yaml 的 tts_engine_override: tone 或环境变量 MOVIEMAKER_TTS_ENGINE=tone 时所有字幕都使用本引擎。
+
+wav文件直接写入，其他格式（如mp3）使用ffmpeg编码。
+"""
+import hashlib
+import io
+import subprocess
+import unicodedata
+import wave
+
+import imageio_ffmpeg
+import numpy as np
+
+from TTSEngine.client import write_atomic
+
+SAMPLE_RATE = 24000
+CHAR_SECONDS = 0.22     # 每个字的时长
+PAUSE_SECONDS = 0.15    # 标点的停顿
+PADDING_SECONDS = 0.1   # 开头和结尾的静音
+
+
+def _pitch(speaker, char: str) -> float:
+    """由发音人和字决定的音高(Hz)，发音人决定基准音高，字在基准音高上下变化"""
+    base = int(hashlib.md5(str(speaker).encode("utf-8")).hexdigest()[:4], 16) % 200 + 150
+    offset = int(hashlib.md5(char.encode("utf-8")).hexdigest()[:2], 16) % 7 - 3
+    return base * 2 ** (offset / 12)
+
+
+def synthesize(text: str, speaker=None) -> np.ndarray:
+    """生成声音数据
+
+    Params:
+        text: 文字
+        speaker: 发音人
+    Return:
+        int16单声道采样点，采样率 SAMPLE_RATE
+    """
+    padding = np.zeros(int(PADDING_SECONDS * SAMPLE_RATE), dtype=np.float32)
+    parts = [padding]
+    t = np.arange(int(CHAR_SECONDS * SAMPLE_RATE)) / SAMPLE_RATE
+    envelope = np.sin(np.pi * t / CHAR_SECONDS) ** 0.5      # 每个字渐强渐弱，避免咔哒声
+    for char in unicodedata.normalize("NFKC", str(text)):
+        if char.isspace():
+            continue
+        if unicodedata.category(char).startswith("P"):
+            parts.append(np.zeros(int(PAUSE_SECONDS * SAMPLE_RATE), dtype=np.float32))
+        else:
+            parts.append((0.3 * envelope * np.sin(2 * np.pi * _pitch(speaker, char) * t)).astype(np.float32))
+    parts.append(padding)
+    return (np.concatenate(parts) * 32767).astype(np.int16)
+
+
+def _wav_bytes(samples: np.ndarray) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes(samples.tobytes())
+    return buffer.getvalue()
+
+
+def covert_text_to_sound(text, output, speaker=None):
+    """生成语音
+
+    Params:
+        text: 文字
+        output: 语音文件保存路径，根据后缀决定格式
+        speaker: 发音人，决定音高
+    """
+    data = _wav_bytes(synthesize(text, speaker))
+    if not output.lower().endswith(".wav"):
+        cmd = [imageio_ffmpeg.get_ffmpeg_exe(), "-v", "error", "-f", "wav", "-i", "-",
+               "-fflags", "+bitexact", "-flags:a", "+bitexact", "-map_metadata", "-1",
+               "-f", output.rsplit(".", 1)[-1].lower(), "-"]
+        data = subprocess.run(cmd, input=data, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True).stdout
+    write_atomic(output, data)
+    return output
+
+
+def covert_batch_to_sound(items):
+    """批量生成语音
+
+    Params:
+        items: [(文本, 输出文件, 发音人)]
+    """
+    for text, output, speaker in items:
+        covert_text_to_sound(text, output, speaker)
@@ -4,10 +4,10 @@
 使用本引擎之前需要注册ttspro账号并充值
 然后更新body中的user_email和user_pass
 """
-import os
 import requests
 
 from logging_config import get_logger
+from TTSEngine.client import TTSClient, TransientTTSError
 logger = get_logger(__name__)
 
 HEADERS = {
@@ -79,6 +79,43 @@ def get_ssml(speaker, text, role="YoungAdultMale", style="calm"):
 url = "https://ttspro.cn/getSpeek.php"
 
 
+class TtsproClient(TTSClient):
+    """ttspro客户端，所有请求共用一个requests.Session（保持连接）"""
+
+    name = "ttspro"
+
+    def __init__(self, url=url, **kwargs):
+        """
+        Params:
+            url: 接口地址，测试时可以使用本地的服务器
+            kwargs: 参考TTSClient
+        """
+        super().__init__(**kwargs)
+        self.url = url
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS)
+
+    def request(self, text, speaker):
+        ssml = get_ssml(speaker, text, role="YoungAdultMale", style="calm")
+        # 不修改模块级的body，多个线程可以同时合成
+        data = dict(body, ssml=ssml)
+        try:
+            response = self.session.post(self.url, data=data, timeout=self.timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise TransientTTSError(f"TTSpro请求失败: {e}")
+        if response.status_code == 429 or response.status_code >= 500:
+            raise TransientTTSError(f"TTSpro请求失败，状态码: {response.status_code}")
+        if response.status_code != 200:
+            logger.debug(f"SSML内容: {ssml}")
+            logger.debug(f"响应内容: {response.content}")
+            raise RuntimeError(f"TTSpro请求失败，状态码: {response.status_code}")
+        return response.content
+
+
+# 进程内共享的ttspro客户端
+client = TtsproClient()
+
+
 def covert_text_to_sound(text, output, speaker):
     """生成语音
     
@@ -89,21 +126,17 @@ def covert_text_to_sound(text, output, speaker):
     Returns:
         none
     """
-    ssml = get_ssml(speaker, text, role="YoungAdultMale", style="calm")
-    body["ssml"] = ssml
-    
-    response = requests.post(url, data=body, headers=HEADERS)
-    
-    if response.status_code == 200:
-        logger.info(f"TTSpro生成语音成功: {response.text}")
-        output_folder = os.path.dirname(output)
-        os.makedirs(output_folder, exist_ok=True)
-        with open(output, 'wb') as file:
-            file.write(response.content)
-    else:
-        logger.error(f"TTSpro请求失败，状态码: {response.status_code}")
-        logger.debug(f"SSML内容: {ssml}")
-        logger.debug(f"响应内容: {response.content}")
+    client.run([(text, output, speaker)])
+    logger.info(f"TTSpro生成语音成功: {output}")
+
+
+def covert_batch_to_sound(items):
+    """同时合成多句话，并发数、速率限制和重试参考 config.yaml 中的 tts_concurrency, tts_rate_limit, tts_retries
+
+    Params:
+        items: [(文本, 输出文件, 发音人)]
+    """
+    client.run(items)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,179 @@
+#!/usr/bin/python3
+"""
+TTSPrefetch - 生成视频之前预先合成字幕语音
+
+以前字幕的语音在创建 Scenario 的时候（Action.__get_subtitle 和 Activity.__get_timespan）一句一句同步合成，
+一个脚本有几百句字幕时，大部分时间都在等待语音接口。
+这里在创建任何 Scenario 之前遍历整个脚本，找到声音文件还不存在的字幕，
+按照引擎分组同时合成（每个引擎同时运行的任务数在 config.yaml 的 tts_concurrency 中设置），
+全部完成后把失败的字幕放在一个列表中报告（TTSPrefetchError）。
+"""
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional
+
+sys.path.append('../')
+import config_reader
+import utils  # 把libs目录加入sys.path (AudioHelper 使用 `import TTSEngine`)
+from exceptions import TTSPrefetchError
+from libs import AudioHelper
+from libs.TTSCache import TTSCache
+
+from logging_config import get_logger
+logger = get_logger(__name__)
+
+STYLE = "calm"  # AudioHelper.covert_text_to_sound 的默认语气
+BATCH_ENGINES = ("chat",)   # 支持批量合成的引擎（模型只加载一次，同一个发音人的句子一次推理）
+
+
+class SpeechTask(NamedTuple):
+    """一条需要合成的字幕语音"""
+    text: str
+    output: str
+    speaker: Optional[str]
+    engine: str
+    source: str     # 字幕所在的位置，用于报告错误，如: 场景/活动/动作
+
+
+def _characters(scenario_obj: dict) -> Dict[str, dict]:
+    """场景中的角色，与 Scenario 相同：`位置`是多个坐标时，角色名字后面加上序号
+
+    Return:
+        {角色名字: 角色片段}
+    """
+    chars = {}
+    for char_obj in scenario_obj.get("角色") or []:
+        name = char_obj.get("名字")
+        chars[name] = char_obj
+        _pos = char_obj.get("位置", None)
+        if isinstance(_pos, list) and _pos and isinstance(_pos[0], list):
+            for i in range(len(_pos)):
+                chars[f"{name}{i}"] = char_obj
+    return chars
+
+
+def _subtitle_tasks(subtitles, speaker, engine, source) -> List[SpeechTask]:
+    """字幕列表中声音文件不存在的字幕，格式不对的字幕留给创建Scenario时报错"""
+    tasks = []
+    if not isinstance(subtitles, list):
+        return tasks
+    for subtitle in subtitles:
+        if not isinstance(subtitle, list) or len(subtitle) < 4 or not isinstance(subtitle[3], str):
+            continue
+        if not os.path.exists(subtitle[3]):
+            tasks.append(SpeechTask(str(subtitle[2]), subtitle[3], speaker,
+                                    AudioHelper.resolve_tts_engine(engine), source))
+    return tasks
+
+
+def collect_speech_tasks(scenarios: List[dict]) -> List[SpeechTask]:
+    """遍历脚本，找到全部需要合成语音的字幕，发音人和引擎的选择与 Action/Activity 相同
+
+    Params:
+        scenarios: script里面的场景片段列表
+    Return:
+        [SpeechTask]，同一个输出文件只出现一次
+    """
+    tasks = []
+    for scenario_obj in scenarios:
+        chars = _characters(scenario_obj)
+        for activity_obj in scenario_obj.get("活动") or []:
+            source = f"{scenario_obj.get('名字')}/{activity_obj.get('名字')}"
+            # 字幕文件（字符串）由 AudioHelper.get_sub_title_list 处理
+            tasks += _subtitle_tasks(activity_obj.get("字幕"), activity_obj.get("发音人", ""),
+                                     activity_obj.get("发音人引擎", ""), source)
+            for action_obj in activity_obj.get("动作") or []:
+                name = action_obj.get("名称")
+                if name in ("gif", "BGM"):
+                    speaker, engine = action_obj.get("发音人"), action_obj.get("发音人引擎")
+                else:
+                    char_obj = chars.get(action_obj.get("角色"))
+                    if char_obj is None:
+                        # 找不到角色（比如多个角色的组合动作），留给创建Scenario时报错
+                        continue
+                    speaker, engine = char_obj.get("发音人", None), char_obj.get("发音人引擎")
+                tasks += _subtitle_tasks(action_obj.get("字幕"), speaker, engine,
+                                         f"{source}/{name}(渲染顺序: {action_obj.get('渲染顺序')})")
+    unique: Dict[str, SpeechTask] = {}
+    for task in tasks:
+        unique.setdefault(task.output, task)
+    return list(unique.values())
+
+
+def _synthesize(tasks: List[SpeechTask]) -> List[str]:
+    """依次合成一组文字相同的语音（第一句合成之后，其他的从TTSCache中读取）
+
+    Return:
+        失败信息列表
+    """
+    failures = []
+    for task in tasks:
+        try:
+            result = AudioHelper.covert_text_to_sound(task.text, task.output, task.speaker, ttsengine=task.engine)
+            if result is None or not os.path.exists(task.output):
+                raise RuntimeError("没有生成语音文件")
+        except Exception as e:
+            logger.error(f"TTS转换失败: {task.text} -> {task.output}: {e}")
+            failures.append(f"{task.source}: '{task.text}' -> {task.output} (引擎: {task.engine}): {e}")
+    return failures
+
+
+def _synthesize_batch(engine: str, groups: List[List[SpeechTask]]) -> List[str]:
+    """先批量合成每组的第一句，再逐句处理全部字幕（已经生成的直接跳过，批量合成失败的逐句重试）
+
+    Return:
+        失败信息列表
+    """
+    try:
+        AudioHelper.covert_batch_to_sound([(g[0].text, g[0].output, g[0].speaker) for g in groups],
+                                          ttsengine=engine)
+    except Exception as e:
+        logger.warning(f"引擎 '{engine}' 批量合成失败，改为逐句合成: {e}")
+    return [failure for group in groups for failure in _synthesize(group)]
+
+
+def prefetch_speech(scenarios: List[dict], concurrency: Optional[Dict[str, int]] = None) -> int:
+    """合成脚本中全部缺少声音文件的字幕
+
+    Params:
+        scenarios: script里面的场景片段列表
+        concurrency: 每个引擎同时运行的任务数，默认使用 config.yaml 的 tts_concurrency，没有设置的引擎为1
+    Return:
+        需要合成的字幕数
+    Raise:
+        TTSPrefetchError: 有字幕合成失败（其他字幕仍然会合成）
+    """
+    tasks = collect_speech_tasks(scenarios)
+    if not tasks:
+        return 0
+    concurrency = config_reader.tts_concurrency if concurrency is None else concurrency
+
+    # 同一个引擎的任务按照 (发音人, 文字) 分组，相同的语音不会同时调用两次接口
+    groups: Dict[str, Dict[str, List[SpeechTask]]] = {}
+    for task in tasks:
+        key = TTSCache.key(task.engine, task.speaker, STYLE, task.text)
+        groups.setdefault(task.engine, {}).setdefault(key, []).append(task)
+
+    logger.info(f"预先合成 {len(tasks)} 条字幕语音: "
+                + ", ".join(f"{engine} {sum(len(g) for g in engine_groups.values())}条"
+                            for engine, engine_groups in groups.items()))
+    executors = []
+    futures = []
+    try:
+        for engine, engine_groups in groups.items():
+            workers = max(1, int(concurrency.get(engine, 1)))
+            executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"tts-{engine}")
+            executors.append(executor)
+            if engine in BATCH_ENGINES:
+                futures.append(executor.submit(_synthesize_batch, engine, list(engine_groups.values())))
+            else:
+                futures += [executor.submit(_synthesize, group) for group in engine_groups.values()]
+        failures = [failure for future in futures for failure in future.result()]
+    finally:
+        for executor in executors:
+            executor.shutdown(wait=True)
+
+    if failures:
+        raise TTSPrefetchError(failures)
+    return len(tasks)
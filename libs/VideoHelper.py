@@ -2,7 +2,16 @@
 import sys
 
 sys.path.append('../')
+import math
 import os
+import re
+import subprocess
+import tempfile
+import wave
+
+import imageio_ffmpeg
+import numpy as np
+from PIL import Image
 
 # from moviepy.editor import *
 from moviepy import *
@@ -23,6 +32,8 @@ try:
 except ImportError:
     import ImageHelper
     import SuCaiHelper
+from libs.FrameStore import FrameStore
+from libs.PCMCache import CHANNELS, SAMPLE_RATE
 
 from logging_config import get_logger
 logger = get_logger(__name__)
@@ -54,21 +65,20 @@ def __get_images_when_zoom_in_out_camera(origin_image_path, center, from_ratio,
         to_ratio: 结束的缩放比例， like: 0.1, 0.9
         duration: in seconds to zoom in or zoom out camera.
     Return:
-        Instance of video.
+        FrameStore，全部帧都在内存中
     """
-
-    total = duration * config_reader.fps
-    images = []
-    for i in range(0, total):
-        if from_ratio > to_ratio:
-            # 缩小
-            tmp_ratio = from_ratio - (from_ratio - to_ratio) * i / total
-        else:
-            # 放大
-            tmp_ratio = from_ratio + (to_ratio - from_ratio) * i / total
-        tmp_img = ImageHelper.zoom_in_out_image(origin_image_path, center=center, ratio=tmp_ratio)
-        images.append(tmp_img)
-    return images
+    total = int(duration * config_reader.fps)
+    ratios = from_ratio + (to_ratio - from_ratio) * np.arange(total) / total
+    boxes = ImageHelper.camera_boxes([utils.covert_pos(center)] * total, ratios)
+
+    # 原图只读取一次；显示区域按照画面坐标计算，原图多大都在原图上直接重采样
+    with Image.open(origin_image_path) as im:
+        mode = "RGBA" if origin_image_path.lower().endswith(".png") else "RGB"
+        source = im.convert(mode)
+    size = (config_reader.g_width, config_reader.g_height)
+    boxes = boxes * np.tile([source.width / size[0], source.height / size[1]], 2)
+    frames = [source.resize(size, Image.Resampling.BICUBIC, box=tuple(box)) for box in boxes]
+    return FrameStore(frames, mode=mode)
 
 def add_watermark(video, gif_path, pos, size):
     """
@@ -168,11 +178,18 @@ def create_video_clip_from_images(images, fps=config_reader.fps):
     Create a video clip from images
 
     Params:
-        images: a list of image file path.
+        images: a list of image file path, or a FrameStore.
         fps: frame per second.
     Return:
         Instance of VideoClip.
     """
+    if isinstance(images, FrameStore):
+        # 直接按下标读取内存中的帧，不需要为每一帧创建ImageClip
+        last = len(images) - 1
+        def frame_function(t):
+            return images.to_array(min(int(t * fps + 1e-6), last))
+        return VideoClip(frame_function=frame_function, duration=len(images) / fps).with_fps(fps)
+
     clips = []
     for img in images:
         tmp_clip = ImageClip(img).with_duration(1/fps)
@@ -181,6 +198,199 @@ def create_video_clip_from_images(images, fps=config_reader.fps):
     concat_clip = concatenate_videoclips(clips, method="compose")
     return concat_clip
 
+def __frame_to_array(images, index):
+    """以RGB数组的形式读取一帧"""
+    if isinstance(images, FrameStore):
+        return images.to_array(index)
+    with Image.open(images[index]) as im:
+        return np.asarray(im.convert("RGB"))
+
+def new_segment_path(name="segment", suffix=".mov"):
+    """在 output_dir/segments 中创建一个新的视频片段文件名
+
+    Params:
+        name: 片段文件名的前缀（通常是活动名字）
+        suffix: 文件后缀
+    Return:
+        片段文件路径（文件已经创建，内容为空）
+    """
+    directory = os.path.join(config_reader.output_dir, "segments")
+    os.makedirs(directory, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix=f"{name}_", suffix=suffix, dir=directory)
+    os.close(fd)
+    return path
+
+def __write_wav(path, samples, fps):
+    """把float32的声音数据 (采样点数, 声道数) 保存为16位PCM的wav文件"""
+    pcm = (np.clip(samples, -1, 1) * 32767).astype("<i2")
+    with wave.open(path, "wb") as f:
+        f.setnchannels(pcm.shape[1])
+        f.setsampwidth(2)
+        f.setframerate(fps)
+        f.writeframes(pcm.tobytes())
+
+def write_video_segment(images, fps=config_reader.fps, name="segment", audio=None, audio_fps=SAMPLE_RATE):
+    """把一组帧和声音通过一个ffmpeg进程写入一个视频片段文件
+
+    每次只在内存中保留一帧，也不需要为每一帧创建moviepy的ImageClip。
+    视频直接使用最终视频的编码(libx264, yuv420p)和帧率(config_reader.fps)，场景和整个视频都通过 -c copy 拼接，每一帧只编码一次；
+    声音以PCM保存在片段中，与场景的背景音乐混合之后才编码（参考write_scenario_video）。
+
+    Params:
+        images: 一组图片路径，或者FrameStore
+        fps: 这组帧的帧率（活动可以使用与config_reader.fps不同的帧率）
+        name: 片段文件名的前缀（通常是活动名字）
+        audio: 声音数据 (采样点数, 声道数)，参考AudioMixer.to_array；None表示静音
+        audio_fps: 声音的采样率
+    Return:
+        (片段文件路径(.mov), 片段时长)，时长是输出帧率下的整数帧，声音按照这个时长补齐或截断
+    """
+    path = new_segment_path(name)
+    out_fps = config_reader.fps
+    frames = max(1, math.ceil(len(images) / fps * out_fps - 1e-6))
+    duration = frames / out_fps
+    samples = int(round(duration * audio_fps))
+    if audio is None:
+        audio = np.zeros((0, CHANNELS), dtype=np.float32)
+    if len(audio) < samples:
+        audio = np.concatenate([audio, np.zeros((samples - len(audio), audio.shape[1]), dtype=audio.dtype)])
+    wav_path = os.path.splitext(path)[0] + ".wav"
+    __write_wav(wav_path, audio[:samples], audio_fps)
+
+    # 按照时间取帧（与moviepy改变帧率的方式相同）
+    indexes = [min(int(i / out_fps * fps + 1e-6), len(images) - 1) for i in range(frames)]
+    first = __frame_to_array(images, 0)
+    height, width = first.shape[:2]
+    writer = imageio_ffmpeg.write_frames(path,
+                                         (width, height),
+                                         fps=out_fps,
+                                         codec="libx264",
+                                         pix_fmt_out="yuv420p",
+                                         quality=None,
+                                         macro_block_size=1,
+                                         ffmpeg_log_level="error",
+                                         audio_path=wav_path,
+                                         audio_codec="pcm_s16le",
+                                         output_params=["-preset", "medium"])
+    try:
+        writer.send(None)   # 启动ffmpeg进程
+        for i in indexes:
+            writer.send(first if i == 0 else __frame_to_array(images, i))
+    finally:
+        writer.close()
+        os.remove(wav_path)
+    logger.debug(f"写入视频片段: {path} ({len(images)} 帧 -> {frames} 帧)")
+    return path, duration
+
+def write_scenario_video(segments, output, bgm=None, bgm_factor=1):
+    """把活动的视频片段拼接成场景的视频文件
+
+    视频直接复制(-c copy)，不重新编码；片段中的PCM声音与背景音乐混合之后只编码一次。
+
+    Params:
+        segments: write_video_segment生成的片段文件列表
+        output: 输出的视频文件路径
+        bgm: 场景的背景音乐，从场景开始播放，超出场景时长的部分被截掉
+        bgm_factor: 背景音乐的音量倍数
+    Raise:
+        subprocess.CalledProcessError: ffmpeg执行失败
+    """
+    list_file = __write_concat_list(segments, output)
+    cmd = [imageio_ffmpeg.get_ffmpeg_exe(), "-y", "-hide_banner", "-loglevel", "error",
+           "-f", "concat", "-safe", "0", "-i", list_file]
+    if bgm:
+        cmd += ["-i", bgm,
+                "-filter_complex", f"[1:a]volume={bgm_factor}[bgm];[0:a][bgm]amix=inputs=2:duration=first:normalize=0[a]",
+                "-map", "0:v", "-map", "[a]"]
+    else:
+        cmd += ["-map", "0:v", "-map", "0:a"]
+    cmd += ["-c:v", "copy", "-c:a", "libmp3lame", "-ar", str(SAMPLE_RATE), output]
+    try:
+        subprocess.run(cmd, check=True, capture_output=True)
+    finally:
+        os.remove(list_file)
+    logger.debug(f"写入场景视频: {output} ({len(segments)} 个片段)")
+    return output
+
+def __write_concat_list(videos, output):
+    """生成ffmpeg concat demuxer使用的文件列表，保存在输出文件旁边"""
+    fd, list_file = tempfile.mkstemp(suffix=".txt", dir=os.path.dirname(os.path.abspath(output)))
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        for v in videos:
+            path = os.path.abspath(v).replace("'", "'\\''")
+            f.write(f"file '{path}'\n")
+    return list_file
+
+def probe_video_streams(file_path):
+    """读取视频文件中各个流的编码参数
+
+    Params:
+        file_path: 视频文件路径
+    Return:
+        每个流一个元组，例如 ("video", "h264", "yuv420p", "1080x800", "4"), ("audio", "mp3", "44100", "stereo")
+    """
+    result = subprocess.run([imageio_ffmpeg.get_ffmpeg_exe(), "-hide_banner", "-i", file_path],
+                            capture_output=True, text=True, errors="replace")
+    streams = []
+    for line in result.stderr.splitlines():
+        line = line.strip()
+        match = re.match(r"Stream #\S+: (\w+): (\w+)(.*)", line)
+        if not match:
+            continue
+        kind, codec, rest = match.group(1).lower(), match.group(2), match.group(3)
+        if kind == "video":
+            pix_fmt = re.search(r"^[^,]*, (\w+)", rest)
+            size = re.search(r", (\d+x\d+)", rest)
+            fps = re.search(r"([\d.]+k?) fps", rest)
+            streams.append((kind, codec,
+                            pix_fmt.group(1) if pix_fmt else None,
+                            size.group(1) if size else None,
+                            fps.group(1) if fps else None))
+        elif kind == "audio":
+            rate = re.search(r"(\d+) Hz", rest)
+            layout = re.search(r"Hz, ([^,]+)", rest)
+            streams.append((kind, codec,
+                            rate.group(1) if rate else None,
+                            layout.group(1).strip() if layout else None))
+        else:
+            streams.append((kind, codec))
+    return tuple(streams)
+
+def can_concat_without_reencode(videos):
+    """检查一组视频文件能否直接拼接（编码、分辨率、帧率、音频参数都相同）
+
+    Params:
+        videos: 视频文件路径列表
+    Return:
+        True/False
+    """
+    signatures = [probe_video_streams(v) for v in videos]
+    if not signatures or not any(stream[0] == "video" for stream in signatures[0]):
+        return False
+    for v, signature in zip(videos[1:], signatures[1:]):
+        if signature != signatures[0]:
+            logger.info(f"视频参数不同，需要重新编码: {v} {signature} != {signatures[0]}")
+            return False
+    return True
+
+def concat_video_files(videos, output):
+    """使用ffmpeg的concat demuxer直接拼接视频文件（-c copy，不重新编码）
+
+    Params:
+        videos: 视频文件路径列表，参数需要相同（参考 can_concat_without_reencode）
+        output: 输出的视频文件路径
+    Raise:
+        subprocess.CalledProcessError: ffmpeg拼接失败
+    """
+    list_file = __write_concat_list(videos, output)
+    try:
+        subprocess.run([imageio_ffmpeg.get_ffmpeg_exe(), "-y", "-hide_banner", "-loglevel", "error",
+                        "-f", "concat", "-safe", "0", "-i", list_file,
+                        "-map", "0", "-c", "copy", output],
+                       check=True, capture_output=True)
+    finally:
+        os.remove(list_file)
+
 def composite_videos(main_video, sub_video, sub_video_start_time = 0, sub_video_position = None, sub_video_size = None):
     """
     Composite two videos
@@ -282,7 +492,7 @@ def zoom_in_out_camera(origin_image_path, center, from_ratio, to_ratio, duration
         to_ratio: 结束的缩放比例， like: 0.1, 0.9
         duration: in seconds to zoom in or zoom out camera.
     Return:
-        A list of images.
+        FrameStore (可以传给create_video_clip_from_images / write_video_segment)
     """
     images = __get_images_when_zoom_in_out_camera(origin_image_path, center, from_ratio=from_ratio, to_ratio=to_ratio, duration=duration)
     # return create_video_clip_from_images(images=images, duration=duration)
@@ -6,13 +6,19 @@
     python run.py -o "水浒传.mp4" -s 'demo/水浒传.yaml'
     2. 执行 demo/水浒传.yaml 文件中的 毒杀武大 场景，生成单一场景视频
     python run.py -o "水浒传.mp4" -c '商议对策' -s 'demo/水浒传.yaml'
+    3. 使用8个进程生成视频（多个场景时每个场景一个进程，单个场景时并行绘制帧）
+    python run.py -o "水浒传.mp4" -s 'demo/水浒传.yaml' -j 8
 
     生成的视频文件将会被保存在config_reader.output_dir下面
 '''
 
 import getopt
+import multiprocessing
 import os
+import shutil
+import subprocess
 import sys
+from concurrent.futures import ProcessPoolExecutor
 
 import yaml
 from moviepy import VideoFileClip, video
@@ -20,10 +26,12 @@ from moviepy.video.VideoClip import VideoClip
 from typing import List, Optional, Union
 
 import config_reader
-from libs import VideoHelper
+from libs import AudioProbe, SoftSubtitle, TTSPrefetch, VideoHelper
+from libs.SpriteCache import sprite_cache
+from libs.TTSCache import tts_cache
 from scenario import Scenario
 from logging_config import setup_default_logging, get_logger
-from exceptions import ScriptNotFoundException, ScriptValidationError, VideoNotFoundException
+from exceptions import InvalidConfigurationError, ScriptNotFoundException, ScriptValidationError, VideoNotFoundException
 from validation import validate_script_resources, validate_config
 
 # 初始化日志系统
@@ -62,27 +70,9 @@ def connect_videos(
             videos = [os.path.join(config_reader.output_dir, script_name, x.get("名字") + config_reader.video_format) for x in scenarios]
             logger.info(f"发现 {len(videos)} 个场景视频需要拼接")
 
-    final_videos = []
-    for i, f in enumerate(videos, 1):
-        logger.debug(f"加载视频 {i}/{len(videos)}: {f}")
-        if isinstance(f, video.VideoClip.VideoClip):
-            final_videos.append(f)
-        else:
-            if not os.path.exists(f):
-                raise VideoNotFoundException(f)
-            final_videos.append(VideoFileClip(f))
-
-    logger.info(f"拼接 {len(final_videos)} 个视频片段")
-    final = VideoHelper.concatenate_videos(*final_videos)
-
-    if delete_old:
-        logger.info("删除旧视频文件")
-        for f in videos:
-            if os.path.exists(f):
-                os.remove(f)
-                logger.debug(f"已删除: {f}")
-            else:
-                logger.warning(f"文件不存在，无法删除: {f}")
+    for f in videos:
+        if not isinstance(f, video.VideoClip.VideoClip) and not os.path.exists(f):
+            raise VideoNotFoundException(f)
 
     # 避免出现同名文件导致"xxx bytes wanted but 0 bytes read"错误
     # 更新文件名
@@ -105,17 +95,126 @@ def connect_videos(
     if config_reader.output_dir not in final_video_name:
         final_video_name = os.path.join(config_reader.output_dir, final_video_name)
 
-    logger.info(f"写入最终视频文件: {final_video_name}")
-    final.write_videofile(
-        final_video_name,
-        codec='libx264',
-        # audio_codec='aac',
-        fps=config_reader.fps
-    )
+    copied = False
+    if all(isinstance(f, str) for f in videos) and VideoHelper.can_concat_without_reencode(videos):
+        # 所有视频的编码参数相同，直接拼接，不重新编码
+        logger.info(f"直接拼接 {len(videos)} 个视频文件 (不重新编码): {final_video_name}")
+        try:
+            VideoHelper.concat_video_files(videos, final_video_name)
+            copied = True
+        except subprocess.CalledProcessError as e:
+            logger.warning(f"直接拼接失败，改为重新编码: {e.stderr.decode(errors='replace').strip()}")
+
+    if not copied:
+        final_videos = []
+        for i, f in enumerate(videos, 1):
+            logger.debug(f"加载视频 {i}/{len(videos)}: {f}")
+            if isinstance(f, video.VideoClip.VideoClip):
+                final_videos.append(f)
+            else:
+                final_videos.append(VideoFileClip(f))
+
+        logger.info(f"拼接 {len(final_videos)} 个视频片段")
+        final = VideoHelper.concatenate_videos(*final_videos)
+
+        logger.info(f"写入最终视频文件: {final_video_name}")
+        final.write_videofile(
+            final_video_name,
+            codec='libx264',
+            # audio_codec='aac',
+            fps=config_reader.fps
+        )
+
+    if delete_old:
+        logger.info("删除旧视频文件")
+        for f in videos:
+            if not isinstance(f, str):
+                # 传入的clip不是文件，由调用者关闭
+                continue
+            if os.path.exists(f):
+                os.remove(f)
+                logger.debug(f"已删除: {f}")
+            else:
+                logger.warning(f"文件不存在，无法删除: {f}")
+
     logger.info(f"视频拼接完成: {final_video_name}")
 
     return final_video_name
 
+def render_scenario(scenario_obj: dict, path: str) -> tuple:
+    """生成一个场景的视频文件
+
+    活动的视频片段直接拼接（视频不重新编码，所有场景使用相同的编码参数，拼接整个视频时也不需要重新编码），
+    声音与场景的背景音乐混合之后编码一次，拼接之后立即删除活动的视频片段。
+
+    Params:
+        scenario_obj: script里面的场景片段
+        path: 场景视频文件路径
+
+    Returns:
+        (场景视频文件路径, 场景名字, (场景时长, 场景的字幕时间))
+    """
+    scenario_instance = Scenario(scenario_obj)
+    logger.debug(f"场景包含 {len(scenario_instance.activities)} 个活动")
+
+    segments = [act.to_video() for act in scenario_instance.activities]
+    cues = SoftSubtitle.concat([(duration, act.cues) for (_, duration), act in zip(segments, scenario_instance.activities)])
+
+    if scenario_instance.bgm:
+        logger.info(f"添加场景背景音乐: {scenario_instance.bgm} (音量: {config_reader.audio_volume_boost}x)")
+    try:
+        VideoHelper.write_scenario_video([segment for segment, _ in segments], path,
+                                         bgm=scenario_instance.bgm, bgm_factor=config_reader.audio_volume_boost)
+    finally:
+        for segment, _ in segments:
+            os.remove(segment)
+
+    return path, scenario_instance.name, (sum(duration for _, duration in segments), cues)
+
+def _render_scenario_file(scenario_obj: dict, index: int, config: dict) -> tuple:
+    """在子进程中生成一个场景的视频文件
+
+    每个场景使用独立的输出目录 output_dir/scenarios/<序号>，
+    视频使用与最终视频相同的编码参数，拼接时不需要重新编码（参考connect_videos）。
+
+    Params:
+        scenario_obj: script里面的场景片段
+        index: 场景的序号
+        config: 父进程的config_reader.get_runtime_config()
+
+    Returns:
+        (场景视频文件路径, 场景名字, (场景时长, 场景的字幕时间))
+    """
+    config_reader.apply_runtime_config(config)
+    config_reader.output_dir = os.path.join(config["output_dir"], "scenarios", f"{index:04d}")
+    config_reader.jobs = 1  # 场景已经并行，场景内的帧不再使用多进程
+    os.makedirs(config_reader.output_dir, exist_ok=True)
+
+    result = render_scenario(scenario_obj, os.path.join(config_reader.output_dir, f"scenario{config_reader.video_format}"))
+    logger.info(f"角色图片缓存统计 (场景 {result[1]}): {sprite_cache.stats()}")
+    return result
+
+def render_scenarios_in_parallel(scenarios: List[dict], jobs: int) -> tuple:
+    """使用多个进程同时生成多个场景，并按照脚本中的顺序返回结果
+
+    Params:
+        scenarios: script里面的场景片段列表
+        jobs: 进程数
+
+    Returns:
+        (场景视频文件路径列表, 场景名字列表, [(场景时长, 场景的字幕时间)])
+    """
+    logger.info(f"使用 {jobs} 个进程并行生成 {len(scenarios)} 个场景")
+    config = config_reader.get_runtime_config()
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context("spawn")) as executor:
+        futures = [executor.submit(_render_scenario_file, scenario_obj, idx, config)
+                   for idx, scenario_obj in enumerate(scenarios, 1)]
+        results = []
+        for idx, future in enumerate(futures, 1):
+            results.append(future.result())
+            logger.info(f"场景 {idx}/{len(scenarios)} 处理完成: {results[-1][1]}")
+    return [r[0] for r in results], [r[1] for r in results], [r[2] for r in results]
+
 def run(script: str, output: Optional[str] = None, scenario: Optional[str] = None) -> int:
     """创建视频
 
@@ -155,6 +254,11 @@ def run(script: str, output: Optional[str] = None, scenario: Optional[str] = Non
 
         scenarios = script_data["场景"]
         total_scenarios = len(scenarios)
+        if script_data.get("字幕输出"):
+            # 脚本中设置的字幕输出方式优先于config.yaml (需要在启动子进程之前设置)
+            if script_data["字幕输出"] not in SoftSubtitle.MODES:
+                raise InvalidConfigurationError("字幕输出", script_data["字幕输出"], f"有效值: {', '.join(SoftSubtitle.MODES)}")
+            config_reader.subtitle_output = script_data["字幕输出"]
 
         if scenario:
             scenarios = list(filter(lambda x: x.get("名字", None) == scenario, scenarios))
@@ -162,34 +266,46 @@ def run(script: str, output: Optional[str] = None, scenario: Optional[str] = Non
 
         logger.info(f"共有 {len(scenarios)} 个场景需要处理（总共 {total_scenarios} 个场景）")
 
-        final_videos_files = []
-        for idx, scenario_obj in enumerate(scenarios, 1):
-            scenario_name = scenario_obj.get("名字", f"场景{idx}")
-            logger.info(f"处理场景 {idx}/{len(scenarios)}: {scenario_name}")
+        # 在创建任何Scenario之前同时合成全部缺少的字幕语音，失败的字幕一起报告
+        TTSPrefetch.prefetch_speech(scenarios)
 
-            scenario_instance = Scenario(scenario_obj)
-            logger.debug(f"场景包含 {len(scenario_instance.activities)} 个活动")
+        # 批量读取脚本中全部声音文件的时长，之后生成时间线时不需要再为每个文件启动ffmpeg
+        AudioProbe.probe_durations(AudioProbe.collect_audio_files(scenarios))
 
-            videos = [act.to_video() for act in scenario_instance.activities]
-            new_video = VideoHelper.concatenate_videos(*videos)
-
-            if scenario_instance.bgm:
-                logger.info(f"添加场景背景音乐: {scenario_instance.bgm} (音量: {config_reader.audio_volume_boost}x)")
-                new_video = VideoHelper.add_audio_to_video(new_video, scenario_instance.bgm, factor=config_reader.audio_volume_boost)
-
-            new_video.with_fps(config_reader.fps)
-            final_videos_files.append(new_video)
-            logger.info(f"场景 {scenario_name} 处理完成")
+        if config_reader.jobs > 1 and len(scenarios) > 1:
+            final_videos_files, scenario_names, tracks = render_scenarios_in_parallel(scenarios, config_reader.jobs)
+        else:
+            final_videos_files, scenario_names, tracks = [], [], []
+            for idx, scenario_obj in enumerate(scenarios, 1):
+                scenario_name = scenario_obj.get("名字", f"场景{idx}")
+                logger.info(f"处理场景 {idx}/{len(scenarios)}: {scenario_name}")
+                # 与并行生成相同，每个场景先写入文件，最后直接拼接（不重新编码整个视频）
+                os.makedirs(os.path.join(config_reader.output_dir, "scenarios"), exist_ok=True)
+                path, name, track = render_scenario(
+                    scenario_obj, os.path.join(config_reader.output_dir, "scenarios", f"{idx:04d}{config_reader.video_format}"))
+                final_videos_files.append(path)
+                scenario_names.append(name)
+                tracks.append(track)
+                logger.info(f"场景 {scenario_name} 处理完成")
 
         if not output:
             if scenario:
-                output = f"{scenario_instance.name}{config_reader.video_format}"
+                output = f"{scenario_names[-1]}{config_reader.video_format}"
             else:
                 output = f"{script_name}{config_reader.video_format}"
         output = os.path.join(config_reader.output_dir, output)
 
+        logger.info(f"角色图片缓存统计: {sprite_cache.stats()}")
+        logger.info(f"语音缓存统计: {tts_cache.stats()}")
         logger.info(f"视频文件将会被输出到: {output}")
-        connect_videos(output, videos=final_videos_files, delete_old=False)
+        output = connect_videos(output, videos=final_videos_files, delete_old=True)
+        if SoftSubtitle.is_soft():
+            SoftSubtitle.export(output, SoftSubtitle.concat(tracks))
+        # 生成视频时新读取的声音时长写入索引
+        AudioProbe.flush_index()
+        # 删除场景和活动片段的临时目录（里面的视频文件在使用之后已经删除）
+        shutil.rmtree(os.path.join(config_reader.output_dir, "scenarios"), ignore_errors=True)
+        shutil.rmtree(os.path.join(config_reader.output_dir, "segments"), ignore_errors=True)
         logger.info("视频生成完成！")
 
     return 0
@@ -206,8 +322,8 @@ def main(argv: List[str]) -> int:
     """
     logger.info("MovieMaker 视频生成系统启动")
 
-    options = "o:s:c:"
-    opts , args = getopt.getopt(argv, options)
+    options = "o:s:c:j:"
+    opts , args = getopt.getopt(argv, options, ["output=", "scenario=", "script=", "jobs="])
     logger.debug(f"命令行参数: {opts}")
 
     output, scenario, script = '', '', ''
@@ -221,6 +337,9 @@ def main(argv: List[str]) -> int:
         if currentArgument in ("-s", "--script"):
             script = currentValue.strip()
             logger.debug(f"脚本文件: {script}")
+        if currentArgument in ("-j", "--jobs"):
+            config_reader.jobs = int(currentValue)
+            logger.debug(f"渲染进程数: {config_reader.jobs}")
 
     if not script:
         logger.error("缺少必需参数: 脚本文件路径")
@@ -241,6 +360,7 @@ def main(argv: List[str]) -> int:
         "output_dir": config_reader.output_dir,
         "sucai_dir": config_reader.sucai_dir,
         "tts_engine": config_reader.tts_engine,
+        "subtitle_output": config_reader.subtitle_output,
     }
     config_errors = validate_config(config_data)
     if config_errors:
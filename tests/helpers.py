@@ -0,0 +1,58 @@
+"""
+测试共用的工具：临时目录和配置的patch在测试结束后自动清理（使用 TestCase.addCleanup）
+"""
+import tempfile
+from unittest.mock import patch
+
+
+def temp_dir(test):
+    """创建测试使用的临时目录，测试结束后删除
+
+    Params:
+        test: unittest.TestCase
+    Return:
+        临时目录路径
+    """
+    tmp = tempfile.TemporaryDirectory()
+    test.addCleanup(tmp.cleanup)
+    return tmp.name
+
+
+def start_patches(test, *patchers):
+    """启动patch，测试结束后停止
+
+    Params:
+        test: unittest.TestCase
+        patchers: unittest.mock.patch(...) 的返回值
+    """
+    for patcher in patchers:
+        patcher.start()
+        test.addCleanup(patcher.stop)
+
+
+def patch_config(test, **values):
+    """测试期间修改config_reader中的配置，测试结束后恢复
+
+    Params:
+        test: unittest.TestCase
+        values: 配置名和值，如 cache_dir="/tmp/cache"
+    """
+    start_patches(test, *(patch(f"config_reader.{name}", value) for name, value in values.items()))
+
+
+def reset_duration_index(test):
+    """清空AudioProbe在内存中的时长索引，测试结束后再清空一次，
+    测试中读取的时长不会在程序退出时(flush_index)写入真正的cache_dir
+
+    Params:
+        test: unittest.TestCase
+    """
+    from libs import AudioProbe
+
+    def reset():
+        AudioProbe._durations.clear()
+        AudioProbe._index_loaded = False
+        AudioProbe._dirty = False
+
+    reset()
+    test.addCleanup(reset)
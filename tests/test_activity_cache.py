@@ -0,0 +1,119 @@
+import os
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+from libs import ActivityCache
+from tests.helpers import temp_dir
+
+class Char:
+    def __init__(self, name, image, pos):
+        self.name = name
+        self.obj = {"名字": name, "素材": image}
+        self.image = image
+        self.gif_frames = []
+        self.pos = pos
+        self.size = [30, 40]
+        self.rotate = 0
+        self.display = True
+        self.transparency = 1
+        self.index = 0
+
+class TestActivityCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = temp_dir(self)
+        self.image = os.path.join(self.tmp, "char.png")
+        with open(self.image, "wb") as f:
+            f.write(b"image-1")
+        self.background = os.path.join(self.tmp, "bg.png")
+        with open(self.background, "wb") as f:
+            f.write(b"background")
+
+    def make_activity(self, actions=None, obj=None):
+        chars = [Char("a", self.image, [10, 20]), Char("b", self.image, [50, 20])]
+        scenario = SimpleNamespace(chars=chars, background_image=self.background, focus="中心", ratio=1.0)
+        obj = obj or {"名字": "活动", "动作": [{"名称": "行进", "角色": "a"}]}
+        actions = actions or [SimpleNamespace(name="行进", obj=obj["动作"][0])]
+        return SimpleNamespace(name=obj["名字"], obj=obj, fps=4, scenario=scenario, actions=actions)
+
+    def test_key_changes_with_script_state_and_assets(self):
+        # Given
+        key = ActivityCache.activity_key(self.make_activity())
+        moved = self.make_activity()
+        moved.scenario.chars[0].pos = [11, 20]
+        changed_script = self.make_activity(obj={"名字": "活动", "动作": [{"名称": "行进", "角色": "b"}]})
+
+        # When
+        same_key = ActivityCache.activity_key(self.make_activity())
+        moved_key = ActivityCache.activity_key(moved)
+        script_key = ActivityCache.activity_key(changed_script)
+        with open(self.image, "wb") as f:
+            f.write(b"image-2 (changed)")
+        asset_key = ActivityCache.activity_key(self.make_activity())
+
+        # Then
+        self.assertEqual(key, same_key)
+        self.assertEqual(len({key, moved_key, script_key, asset_key}), 4)
+
+    def test_key_changes_with_render_code(self):
+        # Given
+        key = ActivityCache.activity_key(self.make_activity())
+
+        # When
+        with patch.object(ActivityCache, "code_version", return_value="changed"):
+            changed_key = ActivityCache.activity_key(self.make_activity())
+
+        # Then
+        self.assertNotEqual(key, changed_key)
+        self.assertEqual(len(ActivityCache.code_version()), 64)
+
+    def test_fight_without_seed_is_not_cached(self):
+        # Given
+        obj = {"名字": "打斗", "动作": [{"名称": "打斗", "角色": "a b"}]}
+        fight = SimpleNamespace(name="打斗", obj=obj["动作"][0])
+
+        # When
+        no_seed = ActivityCache.activity_key(self.make_activity([fight], obj))
+        obj["动作"][0]["随机种子"] = 3
+        with_seed = ActivityCache.activity_key(self.make_activity([fight], obj))
+
+        # Then
+        self.assertIsNone(no_seed)
+        self.assertIsNotNone(with_seed)
+
+    def test_save_and_load_restores_characters(self):
+        with patch("config_reader.cache_dir", self.tmp), patch("config_reader.output_dir", self.tmp):
+            # Given
+            activity = self.make_activity()
+            key = ActivityCache.activity_key(activity)
+            activity.scenario.chars[0].pos = [99, 20]
+            activity.scenario.chars[0].index = 2
+            activity.scenario.chars[0].size = (32, 48)
+            activity.scenario.chars.reverse()
+            activity.scenario.focus = (0.25, 0.5)
+            activity.scenario.ratio = 1.5
+            segment = os.path.join(self.tmp, "segment.mov")
+            with open(segment, "wb") as f:
+                f.write(b"encoded segment")
+            ActivityCache.save(key, segment, 1.25, activity.scenario)
+            os.remove(segment)  # 片段使用之后被删除，缓存中的文件不受影响
+            other = self.make_activity()
+
+            # When
+            cached, duration = ActivityCache.load(key, other.scenario)
+
+            # Then
+            self.assertEqual(duration, 1.25)
+            with open(cached, "rb") as f:
+                self.assertEqual(f.read(), b"encoded segment")
+            self.assertEqual(os.path.dirname(cached), os.path.join(self.tmp, "segments"))
+            self.assertEqual(os.stat(cached).st_ino, os.stat(ActivityCache._entry_paths(key)[0]).st_ino)  # 硬链接，不重新编码
+            self.assertEqual([c.name for c in other.scenario.chars], ["b", "a"])
+            self.assertEqual(other.scenario.chars[1].pos, [99, 20])
+            self.assertEqual(other.scenario.chars[1].index, 2)
+            self.assertEqual(other.scenario.chars[1].size, (32, 48))   # 元组不会变成列表
+            self.assertEqual(other.scenario.focus, (0.25, 0.5))
+            self.assertEqual(other.scenario.ratio, 1.5)
+            self.assertIsNone(ActivityCache.load("0" * 64, other.scenario))
+
+if __name__ == '__main__':
+    unittest.main()
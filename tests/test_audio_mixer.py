@@ -0,0 +1,81 @@
+import os
+import unittest
+import wave
+from unittest.mock import patch
+import numpy as np
+from libs import AudioMixer as AudioMixerModule
+from libs import PCMCache
+from libs.AudioMixer import AudioMixer
+from tests.helpers import patch_config, temp_dir
+
+class TestAudioMixer(unittest.TestCase):
+    def setUp(self):
+        self.tmp = temp_dir(self)
+        patch_config(self, cache_dir=self.tmp)
+
+    def write_wav(self, name, value, seconds, fps=1000):
+        path = os.path.join(self.tmp, name)
+        samples = np.full(int(seconds * fps) * 2, int(value * 32767), dtype=np.int16)
+        with wave.open(path, "wb") as f:
+            f.setnchannels(2)
+            f.setsampwidth(2)
+            f.setframerate(fps)
+            f.writeframes(samples.tobytes())
+        return path
+
+    def test_sources_are_placed_at_sample_offsets(self):
+        # Given
+        quiet = self.write_wav("quiet.wav", 0.25, 0.5)
+        mixer = AudioMixer(duration=1, fps=1000)
+
+        # When
+        mixer.add(quiet, start=0, gain=0.2)
+        mixer.add(quiet, start=0.25, gain=2)
+        audio = mixer.to_audio_clip()
+
+        # Then
+        self.assertAlmostEqual(audio.duration, 1)
+        self.assertEqual(mixer.timeline.dtype, np.float32)
+        self.assertAlmostEqual(float(mixer.timeline[100, 0]), 0.05, places=3)
+        self.assertAlmostEqual(float(mixer.timeline[300, 1]), 0.55, places=3)
+        self.assertAlmostEqual(float(mixer.timeline[600, 0]), 0.5, places=3)
+        self.assertEqual(float(mixer.timeline[800, 0]), 0)
+
+    def test_overflow_is_clipped_and_tail_is_cut(self):
+        # Given
+        loud = self.write_wav("loud.wav", 0.8, 1)
+        mixer = AudioMixer(duration=1.5, fps=1000)
+
+        # When
+        mixer.add(loud, start=0)
+        mixer.add(loud, start=0.8)  # 后半部分超出音轨长度
+        mixer.to_audio_clip()
+
+        # Then
+        self.assertEqual(len(mixer.timeline), 1500)
+        self.assertAlmostEqual(float(mixer.timeline[900, 0]), 1.0)
+        self.assertAlmostEqual(float(mixer.timeline[1400, 0]), 0.8, places=3)
+
+    def test_each_source_is_decoded_once(self):
+        # Given
+        bgm = self.write_wav("bgm.wav", 0.1, 0.2)
+        mixer = AudioMixer(duration=1, fps=1000)
+
+        # When
+        with patch.object(AudioMixerModule, "load_pcm", wraps=PCMCache.decode_audio) as decode:
+            for start in (0, 0.2, 0.4, 0.6):
+                mixer.add(bgm, start=start, gain=0.2)
+
+        # Then
+        decode.assert_called_once()
+        self.assertAlmostEqual(mixer.duration_of(bgm), 0.2)
+
+    def test_no_source(self):
+        # Given / When
+        mixer = AudioMixer(duration=1)
+
+        # Then
+        self.assertIsNone(mixer.to_audio_clip())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import json
+import os
+import subprocess
+import unittest
+import wave
+from unittest.mock import patch
+import imageio_ffmpeg
+from libs import AudioProbe
+from tests.helpers import reset_duration_index, temp_dir
+
+class TestAudioProbe(unittest.TestCase):
+    def setUp(self):
+        self.tmp = temp_dir(self)
+        reset_duration_index(self)
+
+    def write_mp3(self, name, seconds):
+        path = os.path.join(self.tmp, name)
+        subprocess.run([imageio_ffmpeg.get_ffmpeg_exe(), "-v", "error", "-f", "lavfi",
+                        "-i", f"sine=frequency=440:duration={seconds}", path], check=True)
+        return path
+
+    def write_wav(self, name, frames, rate=8000):
+        path = os.path.join(self.tmp, name)
+        with wave.open(path, "wb") as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(rate)
+            f.writeframes(b"\0\0" * frames)
+        return path
+
+    def test_batch_probe_uses_one_process(self):
+        with patch("config_reader.duration_index", False):
+            # Given
+            mp3s = [self.write_mp3(f"{i}.mp3", 1 + i * 0.5) for i in range(3)]
+            wav = self.write_wav("a.wav", 12000)
+
+            # When
+            with patch("subprocess.run", wraps=subprocess.run) as run:
+                durations = AudioProbe.probe_durations(mp3s + [wav])
+                again = AudioProbe.get_duration(mp3s[1])
+
+            # Then
+            self.assertEqual(run.call_count, 1)
+            self.assertAlmostEqual(durations[wav], 1.5)
+            for i, mp3 in enumerate(mp3s):
+                self.assertAlmostEqual(durations[mp3], 1 + i * 0.5, delta=0.06)
+            self.assertEqual(again, durations[mp3s[1]])
+
+    def test_changed_file_is_probed_again(self):
+        with patch("config_reader.duration_index", False):
+            # Given
+            wav = self.write_wav("a.wav", 8000)
+            first = AudioProbe.get_duration(wav)
+
+            # When
+            os.remove(wav)
+            self.write_wav("a.wav", 16000)
+            second = AudioProbe.get_duration(wav)
+
+            # Then
+            self.assertAlmostEqual(first, 1)
+            self.assertAlmostEqual(second, 2)
+
+    def test_index_is_saved_and_reused(self):
+        with patch("config_reader.duration_index", True), patch("config_reader.cache_dir", self.tmp):
+            # Given
+            mp3 = self.write_mp3("a.mp3", 1)
+            duration = AudioProbe.get_duration(mp3)
+            AudioProbe.flush_index()
+            AudioProbe._durations.clear()
+            AudioProbe._index_loaded = False
+
+            # When
+            with patch("subprocess.run") as run:
+                cached = AudioProbe.get_duration(mp3)
+
+            # Then
+            run.assert_not_called()
+            self.assertEqual(cached, duration)
+            with open(os.path.join(self.tmp, "durations.json"), encoding="utf-8") as f:
+                self.assertEqual(list(json.load(f).values()), [duration])
+
+    def test_index_is_written_once_for_many_misses(self):
+        with patch("config_reader.duration_index", True), patch("config_reader.cache_dir", self.tmp):
+            # Given
+            wavs = [self.write_wav(f"{i}.wav", 8000 * (i + 1)) for i in range(5)]
+
+            # When
+            with patch.object(AudioProbe, "_save_index", wraps=AudioProbe._save_index) as save:
+                durations = [AudioProbe.get_duration(wav) for wav in wavs]
+                saved_before_flush = save.call_count
+                AudioProbe.flush_index()
+                AudioProbe.flush_index()
+
+            # Then
+            self.assertEqual(saved_before_flush, 0)
+            self.assertEqual(save.call_count, 1)
+            self.assertEqual(durations, [1, 2, 3, 4, 5])
+            with open(os.path.join(self.tmp, "durations.json"), encoding="utf-8") as f:
+                self.assertEqual(len(json.load(f)), 5)
+
+    def test_removed_files_are_dropped_from_index(self):
+        with patch("config_reader.duration_index", True), patch("config_reader.cache_dir", self.tmp):
+            # Given
+            kept, removed = self.write_wav("a.wav", 8000), self.write_wav("b.wav", 8000)
+            AudioProbe.probe_durations([kept, removed])
+            os.remove(removed)
+
+            # When
+            AudioProbe.probe_durations([self.write_wav("c.wav", 8000)])
+
+            # Then
+            with open(os.path.join(self.tmp, "durations.json"), encoding="utf-8") as f:
+                paths = sorted(os.path.basename(k.split("|")[0]) for k in json.load(f))
+            self.assertEqual(paths, ["a.wav", "c.wav"])
+
+    def test_collect_audio_files(self):
+        # Given
+        wav = self.write_wav("a.wav", 10)
+        script = [{"字幕": [["", "", "你好", wav], ["", "", "不存在", "missing.mp3"]], "素材": "a.png"}]
+
+        # When
+        files = AudioProbe.collect_audio_files(script)
+
+        # Then
+        self.assertEqual(files, [wav])
+
+if __name__ == '__main__':
+    unittest.main()
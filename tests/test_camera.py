@@ -1,14 +1,31 @@
+import os
 import unittest
 from unittest.mock import patch, MagicMock, ANY
+import numpy as np
+from PIL import Image
 from actions import camera
-from libs import ImageHelper, RenderHelper
+from libs import ImageHelper, RenderHelper, VideoHelper
+from libs.FrameStore import FrameStore
 import utils
+from tests.helpers import temp_dir
+
+class Char:
+    def __init__(self, image, pos, size):
+        self.name = "char"
+        self.obj = {}
+        self.image = image
+        self.gif_frames = []
+        self.pos = pos
+        self.size = size
+        self.rotate = 0
+        self.transparency = 1
+        self.display = True
+        self.index = 0
 
 class TestCameraAction(unittest.TestCase):
     @patch('utils.covert_pos')
-    @patch('libs.ImageHelper.zoom_in_out_image')
-    @patch('libs.RenderHelper.RenderHelper.render_characters_on_frames')
-    def test_camera_action_calls_helpers(self, mock_render_chars, mock_zoom, mock_covert_pos):
+    @patch('libs.RenderHelper.RenderHelper.render_camera_frames')
+    def test_camera_action_calls_helpers(self, mock_render_camera, mock_covert_pos):
         # Given
         images = ["frame1.png", "frame2.png"]
         
@@ -27,17 +44,91 @@ class TestCameraAction(unittest.TestCase):
         camera.Do(images=images, action=mock_action, add_chars=True)
 
         # Then
-        mock_render_chars.assert_called_once_with(images, mock_action.activity.scenario.chars)
-        self.assertEqual(mock_zoom.call_count, len(images))
-        
-        # Check the calls to zoom_in_out_image
+        mock_render_camera.assert_called_once_with(images, mock_action.activity.scenario.chars, ANY)
+
+        # 全部帧的显示区域一次计算好
         # step_x = (800 - 500) / 2 = 150
         # step_y = (800 - 500) / 2 = 150
         # ratio_step = (2.0 - 1.0) / 2 = 0.5
         # i = 0: center=(500.0, 500.0), ratio=1.0
         # i = 1: center=(650.0, 650.0), ratio=1.5
-        mock_zoom.assert_any_call("frame1.png", center=(500.0, 500.0), ratio=1.0)
-        mock_zoom.assert_any_call("frame2.png", center=(650.0, 650.0), ratio=1.5)
+        boxes = mock_render_camera.call_args[0][2]
+        expected = ImageHelper.camera_boxes([(500.0, 500.0), (650.0, 650.0)], [1.0, 1.5])
+        np.testing.assert_allclose(boxes, expected)
+
+@patch("config_reader.g_width", 80)
+@patch("config_reader.g_height", 60)
+@patch("config_reader.jobs", 1)
+class TestCameraRender(unittest.TestCase):
+    def setUp(self):
+        self.tmp = temp_dir(self)
+
+    def image(self, name, size, pattern=False):
+        path = os.path.join(self.tmp, name)
+        data = np.zeros((size[1], size[0], 3), dtype=np.uint8)
+        data[..., 2] = 120
+        if pattern:
+            data[::2, :, 0] = 255   # 一像素宽的条纹，只有高分辨率图片中才有
+        Image.fromarray(data).save(path)
+        return path
+
+    def test_characters_and_zoom_in_one_pass(self):
+        # Given
+        sprite = os.path.join(self.tmp, "sprite.png")
+        Image.new("RGBA", (10, 10), (255, 255, 0, 255)).save(sprite)
+        chars = [Char(sprite, [30, 20], [20, 20])]
+        background = Image.open(self.image("bg.jpg", (80, 60)))
+        old, new = FrameStore([background] * 3, mode="RGB"), FrameStore([background] * 3, mode="RGB")
+        centers, ratios = [(40, 30), (45, 32), (50, 34)], [1.0, 0.75, 0.5]
+
+        # When
+        RenderHelper.RenderHelper.render_characters_on_frames(old, chars)
+        for i in range(3):
+            ImageHelper.zoom_in_out_image(old[i], center=centers[i], ratio=ratios[i])
+        with patch.object(FrameStore, "save", wraps=new.save) as save:
+            RenderHelper.RenderHelper.render_camera_frames(new, chars, ImageHelper.camera_boxes(centers, ratios))
+
+        # Then
+        self.assertEqual(save.call_count, 3)    # 每一帧只保存一次
+        for i in range(3):
+            diff = np.abs(new.to_array(i).astype(int) - old.to_array(i).astype(int))
+            self.assertLessEqual(diff.mean(), 2)
+        yellow = [((new.to_array(i)[..., :3] == (255, 255, 0)).all(axis=-1)).sum() for i in (0, 2)]
+        self.assertGreater(yellow[1], 3 * yellow[0])   # 拉近之后角色变大
+
+    def test_ratio_one_keeps_frame_with_off_centre_focus(self):
+        # Given
+        sprite = os.path.join(self.tmp, "sprite.png")
+        Image.new("RGBA", (10, 10), (255, 255, 0, 255)).save(sprite)
+        chars = [Char(sprite, [30, 20], [20, 20])]
+        source = self.image("bg.png", (320, 240), pattern=True)
+        background = Image.open(source).convert("RGB").resize((80, 60))
+        old, new = FrameStore([background] * 2, mode="RGB"), FrameStore([background] * 2, mode="RGB")
+        boxes = ImageHelper.camera_boxes([(24, 30), (24, 30)], [1.0, 1.0])   # 焦点在左侧，平移不缩放
+
+        # When
+        RenderHelper.RenderHelper.render_characters_on_frames(old, chars)
+        RenderHelper.RenderHelper.render_camera_frames(new, chars, boxes)
+
+        # Then
+        np.testing.assert_array_equal(boxes, [[0, 0, 80, 60]] * 2)
+        self.assertIs(ImageHelper.camera_transform(background, boxes[0]), background)
+        for i in range(2):
+            np.testing.assert_array_equal(new.to_array(i), old.to_array(i))
+
+    def test_zoom_in_out_camera_reads_source_once(self):
+        # Given
+        source = self.image("bg.jpg", (160, 120))
+
+        # When
+        with patch("config_reader.fps", 4):
+            images = VideoHelper.zoom_in_out_camera(source, (0.5, 0.5), 1, 0.5, 2)
+
+        # Then
+        self.assertEqual(len(images), 8)
+        self.assertEqual(images.load(0).size, (80, 60))
+        with Image.open(source) as im:
+            self.assertEqual(im.size, (160, 120))   # 原图没有被修改
 
 if __name__ == '__main__':
     unittest.main()
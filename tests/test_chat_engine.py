@@ -0,0 +1,123 @@
+import os
+import unittest
+from unittest.mock import patch
+from types import SimpleNamespace
+import numpy as np
+import torch
+import utils
+import TTSEngine.chat
+from TTSEngine.chat import ChatEngine
+from tests.helpers import patch_config, start_patches, temp_dir
+
+class FakeChat:
+    """代替ChatTTS.Chat，记录加载和推理的次数"""
+    InferCodeParams = staticmethod(lambda **kwargs: kwargs)
+    loads = 0
+    infers = []
+
+    def load(self, compile=False):
+        FakeChat.loads += 1
+        torch.manual_seed(0)
+        self.gpt = SimpleNamespace(gpt=torch.nn.Sequential(torch.nn.Linear(8, 8), torch.nn.ReLU(), torch.nn.Linear(8, 4)))
+        return True
+
+    def infer(self, texts, params_infer_code=None, **kwargs):
+        FakeChat.infers.append((texts, params_infer_code["spk_emb"]))
+        return [np.zeros(240 * (i + 1), dtype=np.float32) for i in range(len(texts))]
+
+class TestChatEngine(unittest.TestCase):
+    def setUp(self):
+        self.tmp = temp_dir(self)
+        FakeChat.loads = 0
+        FakeChat.infers = []
+        self.saved = {}
+        patch_config(self, cache_dir=self.tmp)
+        start_patches(self, patch("ChatTTS.Chat", FakeChat),
+                      patch.object(TTSEngine.chat, "save_wav", side_effect=self.saved.__setitem__))
+
+    def test_model_and_speaker_are_loaded_once(self):
+        # Given
+        engine = ChatEngine(compile=False)
+
+        # When
+        with patch.object(TTSEngine.chat, "get_speaker", wraps=TTSEngine.chat.get_speaker) as get_speaker:
+            for i in range(3):
+                engine.covert_text_to_sound(f"第{i}句", os.path.join(self.tmp, f"{i}.wav"), "男")
+
+        # Then
+        self.assertEqual(FakeChat.loads, 1)
+        get_speaker.assert_called_once_with("男")
+        self.assertEqual(len(FakeChat.infers), 3)
+        self.assertEqual(len(self.saved), 3)
+
+    def test_batch_groups_lines_by_speaker(self):
+        # Given
+        engine = ChatEngine(compile=False, max_batch=2)
+        items = [(f"第{i}句", os.path.join(self.tmp, f"{i}.wav"), "男" if i < 3 else "女") for i in range(5)]
+
+        # When
+        engine.covert_batch(items)
+
+        # Then
+        self.assertEqual([len(texts) for texts, _ in FakeChat.infers], [2, 1, 2])    # 男: 3句(每次最多2句), 女: 2句
+        self.assertEqual(FakeChat.infers[0][0][0], "第0句。[uv_break]。")
+        self.assertIs(FakeChat.infers[0][1], FakeChat.infers[1][1])     # 同一个发音人使用同一个音色
+        self.assertEqual(len(self.saved[items[4][1]]), 480)   # 每句话保存对应的声音数据
+
+    def test_cpu_settings_are_applied_once(self):
+        # Given
+        engine = ChatEngine(compile=False, threads=2)
+
+        # When
+        with patch("torch.set_num_threads") as set_num_threads:
+            for i in range(3):
+                engine.covert_text_to_sound(f"第{i}句", os.path.join(self.tmp, f"{i}.wav"), "女")
+
+        # Then
+        set_num_threads.assert_called_once_with(2)
+
+    def test_quantized_gpt_is_persisted(self):
+        # Given
+        first = ChatEngine(compile=False, quantize=True, persist=True).load()
+        engine = ChatEngine(compile=False, quantize=True, persist=True)
+
+        # When
+        with patch("torch.ao.quantization.quantize_dynamic") as quantize_dynamic, \
+                patch("torch.load", wraps=torch.load) as load:
+            chat = engine.load()
+
+        # Then
+        quantize_dynamic.assert_not_called()    # 第二次直接读取保存的量化模型
+        self.assertTrue(load.call_args.kwargs["weights_only"])
+        self.assertIsInstance(chat.gpt.gpt[0], torch.ao.nn.quantized.dynamic.Linear)
+        x = torch.randn(2, 8)
+        self.assertTrue(torch.equal(chat.gpt.gpt(x), first.gpt.gpt(x)))
+        self.assertEqual(len(os.listdir(os.path.join(self.tmp, "chattts"))), 1)
+
+    def test_module_engine_is_created_on_first_use(self):
+        # Given
+        start_patches(self, patch.object(TTSEngine.chat, "_engine", None))
+        patch_config(self, chat_tts={"compile": False, "max_batch": 3})
+
+        # When
+        TTSEngine.chat.covert_batch_to_sound([("第一句", os.path.join(self.tmp, "1.wav"), "男")])
+
+        # Then
+        self.assertEqual(TTSEngine.chat.get_engine().max_batch, 3)     # 使用第一次合成时的配置
+        self.assertIs(TTSEngine.chat.get_engine(), TTSEngine.chat.get_engine())
+        self.assertEqual(FakeChat.loads, 1)
+
+    def test_benchmark_reports_real_time_factor(self):
+        # Given
+        settings = [{"compile": False, "threads": 1}, {"compile": False, "threads": 1, "quantize": True}]
+
+        # When
+        results = TTSEngine.chat.benchmark(settings, ["第一句", "第二句"], speaker="男")
+
+        # Then
+        self.assertEqual([r["settings"] for r in results], settings)
+        self.assertAlmostEqual(results[0]["audio"], 0.03)   # (240 + 480) / 24000
+        self.assertAlmostEqual(results[1]["rtf"], results[1]["seconds"] / results[1]["audio"])
+
+if __name__ == '__main__':
+    unittest.main()
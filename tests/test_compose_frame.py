@@ -0,0 +1,49 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+from PIL import Image
+from libs.FrameStore import FrameStore
+from libs.RenderHelper import RenderHelper
+from libs import ImageHelper
+import config_reader
+
+class TestComposeFrame(unittest.TestCase):
+    def test_same_result_as_merging_one_by_one(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            # Given
+            size = (config_reader.g_width, config_reader.g_height)
+            store = FrameStore([Image.new("RGB", size, (10, 20, 30))] * 2, mode="RGB")
+            chars = []
+            for i, color in enumerate([(255, 0, 0, 255), (0, 255, 0, 128), (0, 0, 255, 255)]):
+                path = os.path.join(tmp, f"char{i}.png")
+                Image.new("RGBA", (30, 40), color).save(path)
+                char = MagicMock(image=path, pos=[10 + i * 15, 20], size=[30, 40],
+                                 rotate=None, transparency=None, display=True, signature=None)
+                chars.append(char)
+
+            # When
+            canvas = RenderHelper.compose_frame(store[0], chars, dark=lambda c: c is chars[1])
+            expected = None
+            for char in chars:
+                _, expected = ImageHelper.paint_char_on_image(
+                    char=char, image=store[1], image_obj=expected, dark=char is chars[1])
+
+            # Then
+            self.assertEqual(canvas.size, size)
+            self.assertEqual(list(canvas.getdata()), list(expected.getdata()))
+            self.assertEqual(store.load(0).getpixel((15, 25)), (10, 20, 30))  # 背景没有被修改
+
+    def test_nothing_to_paint(self):
+        # Given
+        store = FrameStore([Image.new("RGB", (4, 4))], mode="RGB")
+        hidden = MagicMock(display=False)
+
+        # When
+        canvas = RenderHelper.compose_frame(store[0], [hidden])
+
+        # Then
+        self.assertIsNone(canvas)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+from PIL import Image
+from libs.FrameStore import FrameStore
+from libs import ImageHelper
+
+class Char:
+    def __init__(self, pos, size):
+        self.pos = pos
+        self.size = size
+
+class TestDarkImage(unittest.TestCase):
+    def test_dark_image_rgba(self):
+        # Given
+        img = Image.new("RGBA", (4, 3), (150, 60, 20, 200))
+
+        # When
+        dark = ImageHelper.dark_image(img, reduce_light=100, alpha=0.6)
+
+        # Then
+        self.assertEqual(dark.mode, "RGBA")
+        self.assertEqual(dark.getpixel((0, 0)), (50, 0, 0, 120))
+
+    def test_dark_image_palette_keeps_colors(self):
+        # Given
+        img = Image.new("P", (4, 3), 0)
+        img.putpalette([150, 160, 170])
+
+        # When
+        dark = ImageHelper.dark_image(img, reduce_light=100)
+
+        # Then
+        self.assertEqual(dark.mode, "RGB")
+        self.assertEqual(dark.getpixel((0, 0)), (50, 60, 70))
+
+    def test_hightlight_char_keeps_char_area(self):
+        # Given
+        img = Image.new("RGBA", (10, 10), (200, 200, 200, 100))
+        char = Char(pos=[2, 2], size=[4, 4])
+
+        # When
+        ImageHelper.hightlight_char(img, char)
+
+        # Then (边框也会变暗)
+        self.assertEqual(img.getpixel((2, 3)), (100, 100, 100, 255))
+        self.assertEqual(img.getpixel((3, 3)), (200, 200, 200, 100))
+        self.assertEqual(img.getpixel((5, 5)), (200, 200, 200, 100))
+        self.assertEqual(img.getpixel((6, 5)), (100, 100, 100, 255))
+
+    def test_dark_background_computed_once_per_content(self):
+        # Given
+        store = FrameStore([Image.new("RGB", (4, 4), (120, 120, 120))] * 3, mode="RGB")
+        store.save(2, Image.new("RGB", (4, 4), (200, 0, 0)))
+        cache = {}
+
+        # When
+        results = [ImageHelper.dark_background(frame, cache) for frame in store]
+
+        # Then
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(results[0].getpixel((0, 0)), (20, 20, 20))
+        self.assertEqual(results[2].getpixel((0, 0)), (100, 0, 0))
+        self.assertIs(results[0], results[1])
+
+if __name__ == '__main__':
+    unittest.main()
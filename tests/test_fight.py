@@ -20,6 +20,7 @@ class TestFightAction(unittest.TestCase):
             "幅度": "小"
         }.get(key, default)
         mock_action.chars = [mock_char1, mock_char2]
+        mock_action.activity.obj = {}
 
         mock_get_char.side_effect = [mock_char1, mock_char2]
         mock_walk_do.return_value = "some_positions"
@@ -34,5 +35,28 @@ class TestFightAction(unittest.TestCase):
         self.assertEqual(mock_walk_do.call_count, 2)
         mock_render.assert_called_once()
 
+    @patch('actions.walk.Do')
+    @patch('libs.RenderHelper.RenderHelper.render_with_position_tracking')
+    def test_fight_with_seed_is_deterministic(self, mock_render, mock_walk_do):
+        # Given
+        end_positions = []
+        mock_walk_do.side_effect = lambda action, **kwargs: end_positions.append(action.obj["结束位置"])
+
+        def fight_once():
+            char1, char2 = MagicMock(pos=[100, 100]), MagicMock(pos=[200, 100])
+            char1.name, char2.name = "char1", "char2"
+            action = MagicMock(chars=[char1, char2])
+            action.obj = {"角色": "char1 char2", "幅度": "大"}
+            action.activity.obj = {"随机种子": 7}
+            fight.Do(action=action, images=[], sorted_char_list=[char1, char2])
+
+        # When
+        fight_once()
+        fight_once()
+
+        # Then
+        self.assertEqual(len(end_positions), 4)
+        self.assertEqual(end_positions[:2], end_positions[2:])
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,65 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from PIL import Image
+from libs.FrameStore import Frame, FrameStore
+from libs import ImageHelper
+
+class TestFrameStore(unittest.TestCase):
+    def setUp(self):
+        self.bg = Image.new("RGB", (20, 10), (10, 20, 30))
+        self.store = FrameStore([self.bg] * 4, mode="RGB")
+
+    def test_frames_share_background_until_saved(self):
+        # When
+        ImageHelper.save_image(Image.new("RGB", (20, 10), (255, 0, 0)), self.store[1])
+
+        # Then
+        self.assertEqual(self.store.load(0).getpixel((0, 0)), (10, 20, 30))
+        self.assertEqual(self.store.load(1).getpixel((0, 0)), (255, 0, 0))
+        self.assertEqual(self.store.to_array(1).shape, (10, 20, 3))
+
+    def test_slice_is_a_view(self):
+        # Given
+        view = self.store[2:]
+
+        # When
+        view[0] = Image.new("RGB", (20, 10), (0, 255, 0))
+
+        # Then
+        self.assertEqual(len(view), 2)
+        self.assertEqual(self.store.load(2).getpixel((0, 0)), (0, 255, 0))
+        self.assertEqual(view[0], self.store[2])
+        self.assertIsInstance(view[-1], Frame)
+
+    def test_load_returns_copy(self):
+        # When
+        im = self.store[0].load()
+        im.putpixel((0, 0), (1, 1, 1))
+
+        # Then
+        self.assertEqual(self.store.load(0).getpixel((0, 0)), (10, 20, 30))
+
+    @patch('config_reader.g_height', 10)
+    @patch('config_reader.g_width', 20)
+    @patch('config_reader.frame_memory_budget', 0)
+    def test_spill_to_memmap_over_budget(self):
+        with tempfile.TemporaryDirectory() as tmp, patch('config_reader.output_dir', tmp):
+            # Given
+            bg_path = os.path.join(tmp, "bg.jpg")
+            Image.new("RGB", (40, 20), (10, 20, 30)).save(bg_path)
+
+            # When
+            store = FrameStore.from_background(bg_path, 3)
+            store[2:][0] = Image.new("RGB", (20, 10), (0, 0, 255))
+
+            # Then
+            self.assertEqual(type(store._storage).__name__, "_MemmapStorage")
+            self.assertEqual(store.load(0).size, (20, 10))
+            self.assertEqual(tuple(store.to_array(2)[0, 0]), (0, 0, 255))
+            self.assertTrue(os.listdir(os.path.join(tmp, "frames")))
+            del store
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import unittest
+from types import SimpleNamespace
+import numpy as np
+from PIL import Image
+from libs import ImageHelper
+from tests.helpers import patch_config, temp_dir
+
+FONT = "fonts/QingNiaoHuaGuangJianMeiHei/QingNiaoHuaGuangJianMeiHei-2.ttf"
+
+class TestNamePlate(unittest.TestCase):
+    def setUp(self):
+        self.tmp = temp_dir(self)
+        patch_config(self, font=FONT, cache_dir=os.path.join(self.tmp, "cache"))
+        ImageHelper.name_plate.cache_clear()
+
+    def test_plate_is_pasted_on_sprite_without_writing_files(self):
+        # Given
+        assets = os.path.join(self.tmp, "assets")
+        os.makedirs(assets)
+        image = os.path.join(assets, "武松.png")
+        Image.new("RGBA", (200, 300), (200, 0, 0, 255)).save(image)
+        char = SimpleNamespace(name="武松", obj={}, image=image, gif_frames=[], pos=[10, 10], size=[200, 300],
+                               rotate=0, transparency=1, signature="武松")
+        canvases = [Image.new("RGBA", (320, 320), (0, 0, 0, 255)) for _ in range(3)]
+
+        # When
+        for canvas in canvases:
+            ImageHelper.paint_char_on_canvas(char, canvas)
+
+        # Then
+        self.assertEqual(os.listdir(assets), ["武松.png"])
+        self.assertFalse(os.path.exists(os.path.join(self.tmp, "cache")))
+        self.assertEqual(ImageHelper.name_plate.cache_info().misses, 1)
+        plated = np.asarray(canvases[0])
+        self.assertEqual(tuple(plated[15, 15]), (255, 255, 255, 255))    # 角色图片的左上角是名牌
+        self.assertEqual(tuple(plated[305, 205]), (200, 0, 0, 255))
+        self.assertTrue((plated[10:110, 10:60, 0] < 50).any())             # 名字是黑色的
+        self.assertTrue(all(c.tobytes() == canvases[0].tobytes() for c in canvases))
+
+    def test_sprite_without_signature_has_no_plate(self):
+        # Given
+        image = os.path.join(self.tmp, "鲁智深.png")
+        Image.new("RGB", (200, 300), (0, 200, 0)).save(image)
+
+        # When
+        sprite, _ = ImageHelper.get_sprite(image, (100, 150))
+        plated, _ = ImageHelper.get_sprite(image, (100, 150), signature="鲁智深")
+
+        # Then
+        self.assertEqual(sprite.getpixel((2, 2))[:3], (0, 200, 0))
+        self.assertEqual(plated.getpixel((2, 2))[:3], (255, 255, 255))
+
+    def test_plate_is_drawn_once_for_all_frames(self):
+        # Given
+        char = SimpleNamespace(name="武松", pos=[40, 20])
+        frames = [Image.new("RGB", (160, 160), (30, 90, 150)) for _ in range(4)]
+
+        # When
+        frames = [ImageHelper.display_char_name(char, frame, name="是") for frame in frames]
+
+        # Then
+        info = ImageHelper.name_plate.cache_info()
+        self.assertEqual((info.misses, info.hits), (1, 3))
+        self.assertTrue(all(frame.tobytes() == frames[0].tobytes() for frame in frames))
+        plate, (dx, dy) = ImageHelper.name_plate("武松", FONT, 30)
+        self.assertEqual(frames[0].crop((40 + dx, 20 + dy, 40 + dx + plate.width, 20 + dy + plate.height)).tobytes(),
+                         plate.tobytes())
+        self.assertGreater(plate.height, plate.width)    # 竖排
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+from PIL import Image
+from libs.FrameStore import FrameStore
+from libs.RenderHelper import FrameJob, RenderHelper
+import config_reader
+
+class TestParallelRender(unittest.TestCase):
+    def test_parallel_output_is_identical_to_sequential(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            # Given
+            size = (config_reader.g_width, config_reader.g_height)
+            path = os.path.join(tmp, "char.png")
+            Image.new("RGBA", (30, 40), (255, 0, 0, 200)).save(path)
+            char = MagicMock(image=path, gif_frames=[], pos=[0, 20], size=[30, 40],
+                             rotate=0, transparency=None, display=True, signature=None)
+            other = MagicMock(image=path, gif_frames=[], pos=[100, 100], size=[60, 80],
+                              rotate="左右", transparency=0.5, display=True, signature=None)
+            for c, name in ((char, "char"), (other, "other")):
+                c.name, c.obj = name, {"名字": name}
+            frame_jobs = []
+            for i in range(6):
+                char.pos[0] = i * 10
+                char.rotate = i * 15
+                chars = RenderHelper.snapshot_characters([char, other], dark=lambda c: c is other)
+                frame_jobs.append(FrameJob(i, chars, gif_index=i, dark_background=i % 2 == 0))
+            sequential = FrameStore([Image.new("RGB", size, (10, 20, 30))] * 6, mode="RGB")
+            parallel = FrameStore([Image.new("RGB", size, (10, 20, 30))] * 6, mode="RGB")
+
+            # When
+            RenderHelper.render_frame_jobs(sequential, frame_jobs, jobs=1)
+            RenderHelper.render_frame_jobs(parallel, frame_jobs, jobs=2)
+
+            # Then
+            self.assertEqual(frame_jobs[1].chars[0].pos, [10, 20])  # 快照不会随角色变化
+            for i in range(6):
+                self.assertTrue((sequential.to_array(i) == parallel.to_array(i)).all())
+            self.assertFalse((sequential.to_array(0) == sequential.to_array(1)).all())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import os
+import shutil
+import subprocess
+import unittest
+import wave
+from unittest.mock import patch
+import imageio_ffmpeg
+import numpy as np
+import utils
+from libs import AudioHelper, PCMCache
+from tests.helpers import patch_config, temp_dir
+
+class TestPCMCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = temp_dir(self)
+        patch_config(self, cache_dir=os.path.join(self.tmp, "cache"))
+        self.wav = os.path.join(self.tmp, "sound.wav")
+        samples = (np.sin(np.arange(44100) / 10) * 16000).astype(np.int16)
+        with wave.open(self.wav, "wb") as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(44100)
+            f.writeframes(samples.tobytes())
+
+    def test_decoded_once_and_memory_mapped(self):
+        with patch("config_reader.pcm_cache", True):
+            # Given
+            copy = os.path.join(self.tmp, "copy.wav")
+            shutil.copy(self.wav, copy)
+            first = PCMCache.load_pcm(self.wav)
+
+            # When
+            with patch.object(PCMCache, "decode_audio") as decode:
+                second = PCMCache.load_pcm(self.wav)
+                same_content = PCMCache.load_pcm(copy)
+
+            # Then
+            decode.assert_not_called()
+            self.assertIsInstance(second, np.memmap)
+            self.assertEqual(second.shape, (44100, 2))
+            self.assertTrue(np.array_equal(first, second))
+            self.assertEqual(same_content.filename, second.filename)
+            self.assertTrue(np.array_equal(np.asarray(second), PCMCache.decode_audio(self.wav)))
+
+    def test_split_audio_reads_cached_pcm(self):
+        with patch("config_reader.pcm_cache", True):
+            # Given
+            AudioHelper.split_audio(self.wav, start=0, length=100)
+
+            # When
+            with patch.object(PCMCache, "decode_audio") as decode:
+                AudioHelper.split_audio(self.wav, start=250, length=500)
+
+            # Then
+            decode.assert_not_called()
+            with wave.open(os.path.join(self.tmp, "sound_bak.wav"), "rb") as f:
+                self.assertEqual(f.getnframes(), 22050)
+                self.assertEqual(f.getnchannels(), 1)    # 与原始音频相同
+
+    def test_split_audio_keeps_source_format(self):
+        with patch("config_reader.pcm_cache", True):
+            # Given
+            wav = os.path.join(self.tmp, "voice.wav")
+            with wave.open(wav, "wb") as f:
+                f.setnchannels(2)
+                f.setsampwidth(2)
+                f.setframerate(22050)
+                f.writeframes(np.zeros((22050, 2), dtype=np.int16).tobytes())
+            mp3 = os.path.join(self.tmp, "voice.mp3")
+            subprocess.run([imageio_ffmpeg.get_ffmpeg_exe(), "-v", "error", "-f", "lavfi",
+                            "-i", "sine=frequency=440:sample_rate=24000:duration=1", "-ac", "1", mp3], check=True)
+
+            # When
+            AudioHelper.split_audio(wav, start=200, length=500)
+
+            # Then
+            with wave.open(os.path.join(self.tmp, "voice_bak.wav"), "rb") as f:
+                self.assertEqual((f.getframerate(), f.getnchannels(), f.getnframes()), (22050, 2, 11025))
+            self.assertEqual(PCMCache.probe_format(mp3), (24000, 1))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import os
+import subprocess
+import unittest
+from unittest.mock import patch
+import imageio_ffmpeg
+from libs import SoftSubtitle
+from libs.SoftSubtitle import Cue
+from tests.helpers import temp_dir
+
+class TestSoftSubtitle(unittest.TestCase):
+    def setUp(self):
+        self.tmp = temp_dir(self)
+
+    def test_concat_offsets_scenarios_and_drops_duplicates(self):
+        # Given
+        first = [(0, 1.5, "洒家来也"), (0, 1.5, "洒家来也"), (1.5, 2, "")]    # 活动字幕和动作字幕相同
+        second = [(0.25, 1, "客官稍等")]
+
+        # When
+        cues = SoftSubtitle.concat([(2.0, first), (3.0, []), (1.0, second)])
+
+        # Then
+        self.assertEqual(cues, [Cue(0, 1.5, "洒家来也"), Cue(5.25, 6, "客官稍等")])
+
+    def test_srt_and_ass(self):
+        # Given
+        cues = [Cue(0, 1.5, "洒家来也"), Cue(3725.25, 3726, "客官稍等")]
+
+        # When
+        srt = SoftSubtitle.to_srt(cues)
+        with patch("config_reader.font", "fonts/QingNiaoHuaGuangJianMeiHei/QingNiaoHuaGuangJianMeiHei-2.ttf"):
+            ass = SoftSubtitle.to_ass(cues)
+
+        # Then
+        self.assertEqual(srt, "1\n00:00:00,000 --> 00:00:01,500\n洒家来也\n\n"
+                              "2\n01:02:05,250 --> 01:02:06,000\n客官稍等\n\n")
+        self.assertIn("Dialogue: 0,1:02:05.25,1:02:06.00,Default,客官稍等", ass)
+
+    def test_track_is_muxed_without_reencoding(self):
+        # Given
+        video = os.path.join(self.tmp, "a.mp4")
+        ffmpeg = imageio_ffmpeg.get_ffmpeg_exe()
+        subprocess.run([ffmpeg, "-v", "error", "-f", "lavfi", "-i", "color=c=blue:s=64x48:d=1:r=4",
+                        "-c:v", "libx264", "-pix_fmt", "yuv420p", video], check=True)
+
+        # When
+        with patch("config_reader.subtitle_output", "track"):
+            SoftSubtitle.export(video, [Cue(0, 0.5, "洒家来也")])
+
+        # Then
+        info = subprocess.run([ffmpeg, "-i", video], stderr=subprocess.PIPE).stderr.decode()
+        self.assertIn("Subtitle: mov_text", info)
+        self.assertIn("Video: h264", info)
+        self.assertEqual(os.listdir(self.tmp), ["a.mp4"])
+
+if __name__ == '__main__':
+    unittest.main()
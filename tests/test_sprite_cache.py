@@ -0,0 +1,51 @@
+import os
+import tempfile
+import unittest
+from PIL import Image
+from libs.SpriteCache import SpriteCache, sprite_cache
+from libs import ImageHelper
+
+class TestSpriteCache(unittest.TestCase):
+    def test_lru_eviction_by_bytes(self):
+        # Given
+        cache = SpriteCache(max_bytes=2 * 10 * 10 * 4)
+        factory = lambda: (Image.new("RGBA", (10, 10)), "RGBA")
+
+        # When
+        cache.get("a", factory)
+        cache.get("b", factory)
+        cache.get("a", factory)     # a 变为最近使用
+        cache.get("c", factory)     # 淘汰 b
+
+        # Then
+        stats = cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 3)
+        self.assertEqual(stats["evictions"], 1)
+        self.assertEqual(stats["items"], 2)
+        cache.get("b", factory)
+        self.assertEqual(cache.stats()["misses"], 4)
+
+    def test_get_sprite_is_cached_per_size_and_rotation(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            # Given
+            path = os.path.join(tmp, "char.png")
+            Image.new("RGBA", (40, 60), (255, 0, 0, 255)).save(path)
+            before = sprite_cache.stats()
+
+            # When
+            img1, mode1 = ImageHelper.get_sprite(path, [20, 30])
+            img2, _ = ImageHelper.get_sprite(path, [20, 30])
+            img3, _ = ImageHelper.get_sprite(path, [20, 30], rotate="左右")
+
+            # Then
+            after = sprite_cache.stats()
+            self.assertIs(img1, img2)
+            self.assertIsNot(img1, img3)
+            self.assertEqual(mode1, "RGBA")
+            self.assertEqual(img1.size, (20, 30))
+            self.assertEqual(after["hits"] - before["hits"], 1)
+            self.assertEqual(after["misses"] - before["misses"], 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import os
+import unittest
+from types import SimpleNamespace
+import utils
+from libs import AudioHelper
+from TTSEngine import registry
+from tests.helpers import patch_config, temp_dir
+
+class TestSubtitleList(unittest.TestCase):
+    def setUp(self):
+        self.tmp = temp_dir(self)
+        patch_config(self, cache_dir=os.path.join(self.tmp, "cache"), tts_cache=False, tts_engine_override="")
+        self.batches = []
+        registry.register("fake", SimpleNamespace(covert_text_to_sound=self.fail,
+                                                  covert_batch_to_sound=self.covert_batch))
+        self.addCleanup(registry._engines.pop, "fake", None)
+
+    def covert_batch(self, items):
+        self.batches.append([text for text, _, _ in items])
+        for text, output, speaker in items:
+            os.makedirs(os.path.dirname(output), exist_ok=True)
+            with open(output, "w", encoding="utf-8") as f:
+                f.write(f"{speaker}:{text}")
+
+    def subtitle_file(self, name, text):
+        path = os.path.join(self.tmp, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return path
+
+    def test_lines_are_synthesized_in_one_batch(self):
+        # Given
+        first = self.subtitle_file("a.txt", "洒家来也。客官稍等。洒家来也")
+        second = self.subtitle_file("b.txt", "客官稍等")
+
+        # When
+        subtitles = AudioHelper.get_sub_title_list(first, "aisjiuxu", "fake")
+        others = AudioHelper.get_sub_title_list(second, "xiaoyan", "fake")
+
+        # Then
+        self.assertEqual(self.batches, [["洒家来也", "客官稍等"], ["客官稍等"]])
+        self.assertEqual([sb[2] for sb in subtitles], ["洒家来也", "客官稍等", "洒家来也"])
+        self.assertEqual(subtitles[0][3], subtitles[2][3])
+        self.assertNotEqual(subtitles[1][3], others[0][3])      # 不同字幕文件的声音文件不会互相覆盖
+        with open(subtitles[1][3], encoding="utf-8") as f:
+            self.assertEqual(f.read(), "aisjiuxu:客官稍等")
+        self.assertTrue(os.path.exists(os.path.join(self.tmp, "a_sound.txt")))
+
+    def test_unchanged_file_uses_cached_list(self):
+        # Given
+        path = self.subtitle_file("a.txt", "洒家来也。客官稍等")
+        subtitles = AudioHelper.get_sub_title_list(path, "aisjiuxu", "fake")
+
+        # When
+        cached = AudioHelper.get_sub_title_list(path, "aisjiuxu", "fake")
+        self.subtitle_file("a.txt", "洒家来也。有多强")
+        changed = AudioHelper.get_sub_title_list(path, "aisjiuxu", "fake")
+
+        # Then
+        self.assertEqual(cached, subtitles)
+        self.assertEqual(self.batches, [["洒家来也", "客官稍等"], ["有多强"]])
+        self.assertEqual([sb[2] for sb in changed], ["洒家来也", "有多强"])
+
+if __name__ == '__main__':
+    unittest.main()
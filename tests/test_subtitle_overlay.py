@@ -0,0 +1,59 @@
+import os
+import unittest
+from unittest.mock import patch
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+from libs import ImageHelper
+from tests.helpers import temp_dir
+
+FONT = "fonts/QingNiaoHuaGuangJianMeiHei/QingNiaoHuaGuangJianMeiHei-2.ttf"
+
+@patch("config_reader.font", FONT)
+@patch("config_reader.font_size", 40)
+class TestSubtitleOverlay(unittest.TestCase):
+    def setUp(self):
+        self.tmp = temp_dir(self)
+        ImageHelper.subtitle_overlay.cache_clear()
+
+    def frame(self, name, mode="RGB"):
+        path = os.path.join(self.tmp, name)
+        Image.new(mode, (640, 360), (30, 90, 150) if mode == "RGB" else (30, 90, 150, 255)).save(path)
+        return path
+
+    def test_overlay_matches_drawing_text(self):
+        # Given
+        path = self.frame("a.png")
+        expected = Image.open(path)
+        ImageDraw.Draw(expected).text((320 - 4 * 40 / 2, 360 - 40 - 20), "洒家来也", fill="white",
+                                      font=ImageFont.truetype(FONT, 40))
+
+        # When
+        ImageHelper.add_text_to_image(path, "洒家来也", overwrite_image=True)
+
+        # Then
+        diff = np.abs(np.asarray(Image.open(path), dtype=np.int16) - np.asarray(expected, dtype=np.int16))
+        self.assertLessEqual(diff.max(), 1)
+        self.assertGreater(np.asarray(expected).std(), 0)
+
+    def test_subtitle_is_rasterized_once_for_all_frames(self):
+        # Given
+        frames = [self.frame(f"{i}.png", "RGBA") for i in range(5)]
+        text_list = ["洒家来也", "客官稍等", "有多强"]
+
+        # When
+        with patch("libs.ImageHelper.ImageFont.truetype", wraps=ImageFont.truetype) as truetype:
+            ImageHelper.get_font.cache_clear()
+            for frame in frames:
+                ImageHelper.add_text_to_image(frame, "客官稍等", overwrite_image=True, mode="list", text_list=text_list)
+
+        # Then
+        info = ImageHelper.subtitle_overlay.cache_info()
+        self.assertEqual((info.misses, info.hits), (1, 4))
+        self.assertEqual(truetype.call_count, 2)    # 当前字幕和其他字幕两种字号
+        images = [np.asarray(Image.open(frame)) for frame in frames]
+        self.assertTrue(all((image == images[0]).all() for image in images))
+        self.assertTrue(((images[0][..., 0] > 200) & (images[0][..., 1] < 50)).any())  # 当前字幕是红色
+        self.assertTrue((images[0][..., 3] == 255).all())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import threading
+import unittest
+from unittest.mock import patch
+from PIL import Image
+from libs.FrameStore import FrameStore
+from libs import ImageHelper, SubtitleStage
+
+FONT = "fonts/QingNiaoHuaGuangJianMeiHei/QingNiaoHuaGuangJianMeiHei-2.ttf"
+
+@patch("config_reader.font", FONT)
+@patch("config_reader.font_size", 20)
+class TestSubtitleStage(unittest.TestCase):
+    def store(self):
+        return FrameStore([Image.new("RGB", (160, 90), (30, 90, 150))] * 12, mode="RGB")
+
+    def test_parallel_result_matches_sequential(self):
+        # Given
+        subtitles = [(0, 5, "洒家来也", None), (4, 9, "客官稍等", None), (9, 12, "", None)]
+        sequential, parallel = self.store(), self.store()
+
+        # When
+        SubtitleStage.burn_subtitles(sequential, subtitles, workers=1)
+        count = SubtitleStage.burn_subtitles(parallel, subtitles, workers=4)
+
+        # Then
+        self.assertEqual(count, 9)
+        for i in range(12):
+            self.assertEqual(sequential.load(i).tobytes(), parallel.load(i).tobytes())
+        self.assertNotEqual(parallel.load(4).tobytes(), parallel.load(3).tobytes())    # 第4帧有两条字幕
+        self.assertEqual(parallel.load(10).tobytes(), self.store().load(10).tobytes())
+
+    def test_error_is_raised_and_threads_exit(self):
+        # Given
+        calls = []
+        def add_text(image, text, **kwargs):
+            calls.append(text)
+            raise OSError("cannot open resource")
+        threads = threading.active_count()
+
+        # When
+        with patch.object(ImageHelper, "add_text_to_image", add_text):
+            with self.assertRaises(OSError):
+                SubtitleStage.burn_subtitles(self.store(), [(0, 12, "洒家来也", None)], workers=3)
+
+        # Then
+        self.assertLessEqual(len(calls), 3)     # 出错后其他线程不再继续绘制
+        self.assertEqual(threading.active_count(), threads)
+
+    def test_partition_is_contiguous(self):
+        # When
+        chunks = SubtitleStage.partition(list(range(10)), 4)
+
+        # Then
+        self.assertEqual(chunks, [[0, 1, 2], [3, 4, 5], [6, 7, 8], [9]])
+        self.assertEqual(SubtitleStage.partition([3], 8), [[3]])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,9 +4,10 @@ from actions import switch
 from libs import ImageHelper
 
 class TestSwitchAction(unittest.TestCase):
-    @patch('libs.ImageHelper.merge_two_image')
+    @patch('libs.ImageHelper.paste_sprite')
+    @patch('libs.ImageHelper.prepare_canvas')
     @patch('actions.switch.get_char')
-    def test_switch_action(self, mock_get_char, mock_merge_two_image):
+    def test_switch_action(self, mock_get_char, mock_prepare_canvas, mock_paste_sprite):
         # Given
         mock_action = MagicMock()
         mock_bg_char = MagicMock()
@@ -21,10 +22,10 @@ class TestSwitchAction(unittest.TestCase):
         mock_get_char.return_value = mock_bg_char
         mock_action.chars = [mock_bg_char, mock_char1]
         
-        # Mocking the return of merge_two_image to be a mock object that has a size attribute and a close method
+        # Mocking the canvas to be a mock object that has a size attribute and a close method
         mock_image = MagicMock()
         mock_image.size = (100, 100)
-        mock_merge_two_image.return_value = (None, mock_image)
+        mock_prepare_canvas.return_value = mock_image
 
         images = ["frame1.png", "frame2.png"]
         sorted_char_list = [mock_bg_char, mock_char1]
@@ -33,7 +34,8 @@ class TestSwitchAction(unittest.TestCase):
         switch.Do(action=mock_action, images=images, sorted_char_list=sorted_char_list)
 
         # Then
-        self.assertEqual(mock_merge_two_image.call_count, 3)
+        self.assertEqual(mock_prepare_canvas.call_count, 3)
+        self.assertEqual(mock_paste_sprite.call_count, 3)
 
 if __name__ == '__main__':
     unittest.main()
@@ -23,19 +23,19 @@ class TestTalkAction(unittest.TestCase):
         self.assertEqual(delay_pos[0], ((10, 20), (100, 200), 0))
         self.assertEqual(delay_pos[1], ((10, 20), (100, 200), 0))
 
-    @patch('libs.ImageHelper.paint_char_on_image')
-    def test_talk_action_no_change_or_focus(self, mock_paint):
+    @patch('libs.RenderHelper.ImageHelper.prepare_canvas')
+    @patch('libs.RenderHelper.ImageHelper.paint_char_on_canvas')
+    def test_talk_action_no_change_or_focus(self, mock_paint, mock_prepare_canvas):
         # Given
         call_count = 0
-        def side_effect(*args, **kwargs):
+        def side_effect(char, canvas, **kwargs):
             nonlocal call_count
-            char = kwargs['char']
             if call_count == 0:
                 self.assertEqual(char.pos[1], 15)
             elif call_count == 1:
                 self.assertEqual(char.pos[1], 20)
             call_count += 1
-            return (None, MagicMock())
+            return canvas
 
         mock_paint.side_effect = side_effect
         
@@ -54,6 +54,7 @@ class TestTalkAction(unittest.TestCase):
 
         # Then
         self.assertEqual(mock_paint.call_count, len(images))
+        self.assertEqual(mock_prepare_canvas.call_count, len(images))
         self.assertEqual(mock_char.pos, [10, 20]) # Restored at the end
 
 if __name__ == '__main__':
@@ -0,0 +1,62 @@
+import os
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+import utils
+from libs import AudioHelper, AudioProbe
+from TTSEngine import registry, tone
+from tests.helpers import patch_config, reset_duration_index, temp_dir
+
+class TestToneEngine(unittest.TestCase):
+    def setUp(self):
+        self.tmp = temp_dir(self)
+        patch_config(self, cache_dir=os.path.join(self.tmp, "cache"), tts_cache=True)
+        reset_duration_index(self)
+
+    def output(self, name):
+        return os.path.join(self.tmp, "sound", name)
+
+    def test_same_text_gives_same_audio(self):
+        # Given / When
+        tone.covert_text_to_sound("洒家来也！", self.output("a.mp3"), "aisjiuxu")
+        tone.covert_text_to_sound("洒家来也！", self.output("b.mp3"), "aisjiuxu")
+        tone.covert_text_to_sound("洒家来也！", self.output("c.mp3"), "xiaoyan")
+
+        # Then
+        with open(self.output("a.mp3"), "rb") as a, open(self.output("b.mp3"), "rb") as b, \
+                open(self.output("c.mp3"), "rb") as c:
+            first = a.read()
+            self.assertEqual(first, b.read())
+            self.assertNotEqual(first, c.read())   # 不同的发音人音高不同
+
+    def test_duration_scales_with_text_length(self):
+        # Given
+        short, long = self.output("short.wav"), self.output("long.wav")
+
+        # When
+        tone.covert_text_to_sound("有多强", short)
+        tone.covert_text_to_sound("强的连华阴县老爷都怕他们，", long)
+
+        # Then
+        self.assertAlmostEqual(AudioProbe.get_duration(short), 3 * 0.22 + 0.2, places=2)
+        self.assertAlmostEqual(AudioProbe.get_duration(long), 12 * 0.22 + 0.15 + 0.2, places=2)
+
+    def test_registry_and_override(self):
+        # Given
+        calls = []
+        registry.register("fake", SimpleNamespace(covert_text_to_sound=lambda text, output, speaker: calls.append(text)))
+        self.addCleanup(registry._engines.pop, "fake", None)
+
+        # When
+        AudioHelper.covert_text_to_sound("客官稍等", self.output("fake.mp3"), "xiaoyan", ttsengine="fake")
+        with patch("config_reader.tts_engine_override", "tone"):
+            AudioHelper.covert_text_to_sound("客官稍等", self.output("tone.mp3"), "xiaoyan", ttsengine="chat")
+
+        # Then
+        self.assertEqual(calls, ["客官稍等"])
+        self.assertTrue(os.path.exists(self.output("tone.mp3")))
+        self.assertIn("tone", registry.names())
+        self.assertIsNone(AudioHelper.covert_text_to_sound("客官稍等", self.output("x.mp3"), None, ttsengine="none"))
+
+if __name__ == '__main__':
+    unittest.main()
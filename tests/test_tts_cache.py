@@ -0,0 +1,90 @@
+import os
+import unittest
+from unittest.mock import patch
+import utils
+from libs import AudioHelper
+from libs.TTSCache import TTSCache, tts_cache
+from tests.helpers import patch_config, temp_dir
+
+def fake_engine(text, output, speaker):
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "wb") as f:
+        f.write(f"{speaker}:{text}".encode("utf-8"))
+    return output
+
+class TestTTSCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = temp_dir(self)
+        patch_config(self, cache_dir=os.path.join(self.tmp, "cache"), tts_cache=True)
+
+    def test_same_line_is_synthesized_once(self):
+        # Given
+        first = os.path.join(self.tmp, "scenario1", "a.mp3")
+        renamed = os.path.join(self.tmp, "scenario2", "b.mp3")
+        other_speaker = os.path.join(self.tmp, "scenario2", "c.mp3")
+
+        # When
+        with patch("TTSEngine.xunfei_tts.covert_text_to_sound", side_effect=fake_engine) as engine:
+            AudioHelper.covert_text_to_sound("洒家 来也！", first, "xiaoyan", ttsengine="xunfei")
+            AudioHelper.covert_text_to_sound(" 洒家  来也! ", renamed, "xiaoyan", ttsengine="xunfei")
+            AudioHelper.covert_text_to_sound("洒家 来也！", other_speaker, "aisjiuxu", ttsengine="xunfei")
+
+        # Then
+        self.assertEqual(engine.call_count, 2)
+        with open(renamed, "rb") as f:
+            self.assertEqual(f.read(), "xiaoyan:洒家 来也！".encode("utf-8"))
+        self.assertEqual(tts_cache.stats()["items"], 2)
+
+    def test_key_depends_on_engine_speaker_and_style(self):
+        # Given / When
+        keys = {TTSCache.key("xunfei", "xiaoyan", "calm", "你好"),
+                TTSCache.key("ttspro", "xiaoyan", "calm", "你好"),
+                TTSCache.key("xunfei", "aisjiuxu", "calm", "你好"),
+                TTSCache.key("xunfei", "xiaoyan", "angry", "你好")}
+
+        # Then
+        self.assertEqual(len(keys), 4)
+        self.assertEqual(TTSCache.key("chat", 800, "calm", "你好 "), TTSCache.key("chat", "800", "calm", "你好"))
+
+    def test_hit_keeps_output_mtime(self):
+        # Given
+        cache = TTSCache(directory=os.path.join(self.tmp, "tts"))
+        source = os.path.join(self.tmp, "a.mp3")
+        with open(source, "wb") as f:
+            f.write(b"x" * 10)
+        cache.store("xunfei", "xiaoyan", "calm", "一二三", source)
+        output = os.path.join(self.tmp, "b.mp3")
+        cache.fetch("xunfei", "xiaoyan", "calm", "一二三", output)
+        os.utime(output, (1000, 1000))
+
+        # When
+        cache.fetch("xunfei", "xiaoyan", "calm", "一二三", os.path.join(self.tmp, "c.mp3"))
+
+        # Then
+        self.assertEqual(os.stat(output).st_mtime, 1000)   # AudioProbe/FileDigest的缓存键不会变化
+
+    def test_least_recently_used_is_evicted(self):
+        # Given
+        cache = TTSCache(directory=os.path.join(self.tmp, "tts"), max_bytes=25)
+        outputs = []
+        for i, text in enumerate(["一二三", "四五六", "七八九"]):
+            output = os.path.join(self.tmp, f"{i}.mp3")
+            with open(output, "wb") as f:
+                f.write(b"x" * 10)
+            outputs.append(output)
+            cache.store("xunfei", "xiaoyan", "calm", text, output)
+            if i == 1:
+                os.utime(cache._info_path(cache._entry_path(cache.key("xunfei", "xiaoyan", "calm", "一二三"), ".mp3")), (0, 0))
+
+        # When
+        stats = cache.stats()
+
+        # Then
+        self.assertEqual(stats["items"], 2)
+        self.assertEqual(stats["evictions"], 1)
+        self.assertFalse(cache.fetch("xunfei", "xiaoyan", "calm", "一二三", os.path.join(self.tmp, "x.mp3")))
+        self.assertTrue(cache.fetch("xunfei", "xiaoyan", "calm", "七八九", os.path.join(self.tmp, "y.mp3")))
+        self.assertTrue(os.path.exists(outputs[0]))  # 淘汰缓存不会删除已经生成的输出文件
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,215 @@
+import base64
+import hashlib
+import json
+import os
+import re
+import socket
+import struct
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+import utils
+from TTSEngine import client as tts_client
+from TTSEngine.client import RateLimiter
+from TTSEngine.ttspro import TtsproClient
+from TTSEngine.xunfei_tts import XunfeiClient
+from tests.helpers import temp_dir
+
+class FakeTtsproHandler(BaseHTTPRequestHandler):
+    """本地的ttspro服务器，按照 server.statuses 的顺序返回状态码，之后都返回200"""
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        server = self.server
+        self.rfile.read(int(self.headers["Content-Length"]))
+        with server.lock:
+            server.ports.append(self.client_address[1])
+            server.running += 1
+            server.max_running = max(server.max_running, server.running)
+            status = server.statuses.pop(0) if server.statuses else 200
+        time.sleep(server.delay)
+        body = b"mp3-data" if status == 200 else b"error"
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        with server.lock:
+            server.running -= 1
+
+    def log_message(self, *args):
+        pass
+
+def recv_exact(conn, size):
+    data = b""
+    while len(data) < size:
+        chunk = conn.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("连接已关闭")
+        data += chunk
+    return data
+
+class FakeXunfeiServer:
+    """本地的讯飞websocket服务器，把收到的文字分成两帧作为"声音"返回；drop_first时第一个连接握手后直接断开"""
+
+    def __init__(self, drop_first=False):
+        self.drop = drop_first
+        self.connections = 0
+        self.sock = socket.socket()
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen()
+        self.url = f"ws://127.0.0.1:{self.sock.getsockname()[1]}/v2/tts"
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def serve(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+
+    def handle(self, conn):
+        with conn:
+            data = b""
+            while b"\r\n\r\n" not in data:
+                data += conn.recv(1024)
+            key = re.search(rb"Sec-WebSocket-Key: (\S+)", data, re.I).group(1)
+            accept = base64.b64encode(hashlib.sha1(key + b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11").digest())
+            conn.sendall(b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                         b"Sec-WebSocket-Accept: " + accept + b"\r\n\r\n")
+            self.connections += 1
+            if self.drop:
+                self.drop = False
+                return
+            request = json.loads(self.read_frame(conn))
+            text = base64.b64decode(request["data"]["text"])
+            for status, chunk in ((1, text[:3]), (2, text[3:])):
+                self.send_frame(conn, json.dumps({"code": 0, "sid": "local", "message": "success",
+                                                  "data": {"audio": base64.b64encode(chunk).decode(), "status": status}}))
+
+    @staticmethod
+    def read_frame(conn):
+        _, b2 = recv_exact(conn, 2)
+        length = b2 & 0x7f
+        if length == 126:
+            length = struct.unpack(">H", recv_exact(conn, 2))[0]
+        elif length == 127:
+            length = struct.unpack(">Q", recv_exact(conn, 8))[0]
+        mask = recv_exact(conn, 4)
+        payload = recv_exact(conn, length)
+        return bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+
+    @staticmethod
+    def send_frame(conn, text):
+        payload = text.encode("utf-8")
+        header = b"\x81" + (bytes([len(payload)]) if len(payload) < 126 else b"\x7e" + struct.pack(">H", len(payload)))
+        conn.sendall(header + payload)
+
+    def close(self):
+        self.sock.close()
+
+class TestTTSClient(unittest.TestCase):
+    def setUp(self):
+        self.tmp = temp_dir(self)
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeTtsproHandler)
+        self.server.lock = threading.Lock()
+        self.server.ports, self.server.statuses = [], []
+        self.server.running = self.server.max_running = 0
+        self.server.delay = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/getSpeek.php"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def output(self, name):
+        return os.path.join(self.tmp, "sound", name)
+
+    def test_transient_errors_are_retried_on_one_connection(self):
+        # Given
+        self.server.statuses = [503, 429]
+        client = TtsproClient(url=self.url, retries=3, backoff=0.01)
+
+        # When
+        client.run([("洒家来也", self.output("a.mp3"), "zh-CN-YunxiNeural")])
+        client.run([("客官稍等", self.output("b.mp3"), "zh-CN-YunxiNeural")])
+
+        # Then
+        self.assertEqual(len(self.server.ports), 4)
+        self.assertEqual(len(set(self.server.ports)), 1)   # 所有请求使用同一个连接
+        with open(self.output("b.mp3"), "rb") as f:
+            self.assertEqual(f.read(), b"mp3-data")
+
+    def test_permanent_error_leaves_no_file(self):
+        # Given
+        self.server.statuses = [403]
+        client = TtsproClient(url=self.url, retries=3, backoff=0.01)
+
+        # When
+        with self.assertRaises(RuntimeError):
+            client.run([("洒家来也", self.output("a.mp3"), "zh-CN-YunxiNeural")])
+
+        # Then
+        self.assertEqual(len(self.server.ports), 1)    # 不重试
+        self.assertFalse(os.path.exists(self.output("a.mp3")))
+
+    def test_written_file_follows_umask_without_changing_it(self):
+        # Given
+        umask = os.umask(0o027)
+        self.addCleanup(os.umask, umask)
+
+        # When
+        with patch("os.umask", wraps=os.umask) as mock_umask:
+            tts_client.write_atomic(self.output("a.mp3"), b"mp3-data")
+
+        # Then
+        mock_umask.assert_not_called()
+        self.assertEqual(os.stat(self.output("a.mp3")).st_mode & 0o777, 0o640)
+        self.assertEqual(os.listdir(os.path.dirname(self.output("a.mp3"))), ["a.mp3"])   # 没有留下临时文件
+
+    def test_batch_respects_concurrency(self):
+        # Given
+        self.server.delay = 0.05
+        client = TtsproClient(url=self.url, concurrency=2, rate=0)
+        items = [(f"第{i}句", self.output(f"{i}.mp3"), "zh-CN-YunxiNeural") for i in range(6)]
+
+        # When
+        client.run(items)
+
+        # Then
+        self.assertEqual(self.server.max_running, 2)
+        self.assertEqual(sorted(os.listdir(os.path.dirname(self.output("0.mp3")))), [f"{i}.mp3" for i in range(6)])
+
+    def test_rate_limiter_spaces_requests(self):
+        # Given
+        limiter = RateLimiter(rate=20)
+
+        # When
+        delays = [limiter.reserve() for _ in range(4)]
+
+        # Then
+        for i, delay in enumerate(delays):
+            self.assertAlmostEqual(delay, i * 0.05, delta=0.01)
+        self.assertEqual(RateLimiter().reserve(), 0)
+
+    def test_xunfei_frames_are_written_once_after_reconnect(self):
+        # Given
+        server = FakeXunfeiServer(drop_first=True)
+        client = XunfeiClient(url=server.url, retries=2, backoff=0.01, timeout=5)
+
+        # When
+        try:
+            client.run([("等洒家再去确认", self.output("a.mp3"), "aisjiuxu")])
+        finally:
+            server.close()
+
+        # Then
+        self.assertEqual(server.connections, 2)
+        with open(self.output("a.mp3"), "rb") as f:
+            self.assertEqual(f.read(), "等洒家再去确认".encode("utf-8"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import os
+import threading
+import time
+import unittest
+from unittest.mock import patch
+import utils
+from exceptions import TTSPrefetchError
+from libs import TTSPrefetch
+from tests.helpers import patch_config, temp_dir
+
+class FakeEngine:
+    """记录同时运行的任务数的语音引擎"""
+    def __init__(self, fail=()):
+        self.fail = fail
+        self.calls = []
+        self.running = 0
+        self.max_running = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, text, output, speaker):
+        with self.lock:
+            self.calls.append(text)
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(0.05)
+        with self.lock:
+            self.running -= 1
+        if text in self.fail:
+            raise ConnectionError("接口超时")
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        with open(output, "wb") as f:
+            f.write(f"{speaker}:{text}".encode("utf-8"))
+
+class TestTTSPrefetch(unittest.TestCase):
+    def setUp(self):
+        self.tmp = temp_dir(self)
+        patch_config(self, cache_dir=os.path.join(self.tmp, "cache"), tts_cache=True, tts_engine="xunfei")
+
+    def sound(self, name):
+        return os.path.join(self.tmp, "sound", name)
+
+    def script(self, lines):
+        return [{
+            "名字": "酒馆",
+            "角色": [{"名字": "武松", "发音人": "aisjiuxu"},
+                     {"名字": "小二", "发音人": "xiaoyan", "发音人引擎": "ttspro"},
+                     {"名字": "兵", "发音人": "x4_bing", "位置": [[0, 0], [1, 1]]}],
+            "活动": [{
+                "名字": "喝酒",
+                "字幕": [["", "", "话说", self.sound("narration.mp3")]],
+                "发音人": "xiaoyu",
+                "动作": [{"名称": "说话", "角色": "武松" if i % 2 == 0 else "小二", "渲染顺序": i,
+                          "字幕": [["", "", text, self.sound(f"{i}.mp3")]]}
+                         for i, text in enumerate(lines)] + [
+                        {"名称": "说话", "角色": "兵1", "字幕": [["", "", "得令", self.sound("bing.mp3")]]},
+                        {"名称": "gif", "发音人": "xiaofeng", "字幕": [["", "", "哈哈", self.sound("gif.mp3")]]},
+                        {"名称": "打斗", "角色": "武松 小二", "字幕": [["", "", "看拳", self.sound("fight.mp3")]]}],
+            }],
+        }]
+
+    def test_collect_uses_same_speaker_and_engine_as_actions(self):
+        # Given
+        scenarios = self.script(["店家，拿酒来", "客官稍等", "店家，拿酒来"])
+        os.makedirs(os.path.dirname(self.sound("1.mp3")))
+        open(self.sound("1.mp3"), "wb").close()   # 已经存在的声音文件不需要合成
+
+        # When
+        tasks = {os.path.basename(t.output): t for t in TTSPrefetch.collect_speech_tasks(scenarios)}
+
+        # Then
+        self.assertEqual(set(tasks), {"narration.mp3", "0.mp3", "2.mp3", "bing.mp3", "gif.mp3"})
+        self.assertEqual((tasks["narration.mp3"].speaker, tasks["narration.mp3"].engine), ("xiaoyu", "xunfei"))
+        self.assertEqual((tasks["0.mp3"].speaker, tasks["0.mp3"].engine), ("aisjiuxu", "xunfei"))
+        self.assertEqual((tasks["bing.mp3"].speaker, tasks["bing.mp3"].engine), ("x4_bing", "xunfei"))
+        self.assertEqual(tasks["gif.mp3"].speaker, "xiaofeng")
+
+    def test_lines_are_synthesized_concurrently_per_engine(self):
+        # Given
+        scenarios = self.script([f"第{i}句" for i in range(8)] + ["第0句"])
+        xunfei, ttspro = FakeEngine(), FakeEngine()
+
+        # When
+        with patch("TTSEngine.xunfei_tts.covert_text_to_sound", side_effect=xunfei), \
+             patch("TTSEngine.ttspro.covert_text_to_sound", side_effect=ttspro):
+            count = TTSPrefetch.prefetch_speech(scenarios, concurrency={"xunfei": 3})
+
+        # Then
+        self.assertEqual(count, 12)
+        self.assertEqual(xunfei.max_running, 3)
+        self.assertEqual(ttspro.max_running, 1)    # 没有设置的引擎只有一个任务
+        self.assertEqual(xunfei.calls.count("第0句"), 1)   # 相同的语音只合成一次，其他从缓存复制
+        for i in range(9):
+            self.assertTrue(os.path.exists(self.sound(f"{i}.mp3")))
+
+    def test_failures_are_reported_together(self):
+        # Given
+        scenarios = self.script(["店家，拿酒来", "客官稍等", "再来三碗"])
+        engine = FakeEngine(fail=("店家，拿酒来", "再来三碗"))
+
+        # When
+        with patch("TTSEngine.xunfei_tts.covert_text_to_sound", side_effect=engine), \
+             patch("TTSEngine.ttspro.covert_text_to_sound", side_effect=engine):
+            with self.assertRaises(TTSPrefetchError) as ctx:
+                TTSPrefetch.prefetch_speech(scenarios, concurrency={"xunfei": 2})
+
+        # Then
+        self.assertEqual(len(ctx.exception.failures), 2)
+        self.assertIn("店家，拿酒来", str(ctx.exception))
+        self.assertIn("再来三碗", str(ctx.exception))
+        self.assertTrue(os.path.exists(self.sound("1.mp3")))   # 其他字幕仍然合成
+
+if __name__ == '__main__':
+    unittest.main()
@@ -23,23 +23,9 @@ class TestTurnAction(unittest.TestCase):
         self.assertEqual(delay_pos[0], [(10, 20), (100, 200), 45.0])
         self.assertEqual(delay_pos[1], [(10, 20), (100, 200), 90.0])
 
-    @patch('libs.RenderHelper.RenderHelper.render_characters_on_frame')
+    @patch('libs.RenderHelper.RenderHelper.render_frame_jobs')
     def test_turn_action_no_delay_mode(self, mock_render):
         # Given
-        call_count = 0
-        def side_effect(*args, **kwargs):
-            nonlocal call_count
-            char_list = args[1]
-            char = char_list[0]
-            if call_count == 0:
-                self.assertEqual(char.rotate, 45.0)
-            elif call_count == 1:
-                self.assertEqual(char.rotate, 90.0)
-            call_count += 1
-            return (None, MagicMock())
-
-        mock_render.side_effect = side_effect
-
         mock_action = MagicMock()
         mock_char = MagicMock()
         mock_char.name = "test_char"
@@ -55,7 +41,11 @@ class TestTurnAction(unittest.TestCase):
         turn.Do(action=mock_action, images=images, sorted_char_list=sorted_char_list, delay_mode=False)
 
         # Then
-        self.assertEqual(mock_render.call_count, 2)
+        mock_render.assert_called_once()
+        frame_jobs = mock_render.call_args[0][1]
+        self.assertEqual(len(frame_jobs), 2)
+        self.assertEqual(frame_jobs[0].chars[0].rotate, 45.0)
+        self.assertEqual(frame_jobs[1].chars[0].rotate, 90.0)
 
 if __name__ == '__main__':
     unittest.main()
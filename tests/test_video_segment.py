@@ -0,0 +1,164 @@
+import os
+import tempfile
+import unittest
+import wave
+from unittest.mock import patch
+import imageio_ffmpeg
+import numpy as np
+from moviepy import ColorClip, VideoFileClip
+from PIL import Image
+from libs.FrameStore import FrameStore
+from libs.PCMCache import SAMPLE_RATE, decode_audio
+from libs import VideoHelper
+import run
+
+class TestVideoSegment(unittest.TestCase):
+    @patch("config_reader.fps", 4)
+    def test_segment_contains_frames_and_audio(self):
+        with tempfile.TemporaryDirectory() as tmp, patch("config_reader.output_dir", tmp):
+            # Given
+            colors = [(255, 0, 0), (0, 128, 255), (80, 90, 100)]
+            store = FrameStore([Image.new("RGB", (32, 22), c) for c in colors], mode="RGB")
+            audio = np.full((int(0.75 * SAMPLE_RATE), 2), 0.25, dtype=np.float32)
+
+            # When
+            path, duration = VideoHelper.write_video_segment(store, fps=4, name="test", audio=audio)
+
+            # Then
+            self.assertEqual(duration, 0.75)
+            streams = VideoHelper.probe_video_streams(path)
+            self.assertEqual([s[:2] for s in streams], [("video", "h264"), ("audio", "pcm_s16le")])
+            clip = VideoFileClip(path)
+            frames = list(clip.iter_frames())
+            clip.close()
+            self.assertEqual(len(frames), 3)
+            for frame, color in zip(frames, colors):
+                self.assertEqual(frame.shape, (22, 32, 3))
+                self.assertTrue(np.all(np.abs(frame.astype(int) - color) <= 8))
+            samples = decode_audio(path)
+            self.assertAlmostEqual(len(samples) / SAMPLE_RATE, 0.75, places=2)
+            self.assertAlmostEqual(float(samples[1000, 0]), 0.25, places=3)
+
+    @patch("config_reader.fps", 4)
+    def test_segment_uses_output_frame_rate(self):
+        with tempfile.TemporaryDirectory() as tmp, patch("config_reader.output_dir", tmp):
+            # Given 活动使用6帧每秒，共7帧
+            store = FrameStore([Image.new("RGB", (32, 16), (i * 30, 0, 0)) for i in range(7)], mode="RGB")
+            audio = np.full((SAMPLE_RATE, 2), 0.25, dtype=np.float32)
+
+            # When
+            path, duration = VideoHelper.write_video_segment(store, fps=6, name="test", audio=audio)
+
+            # Then 输出为4帧每秒的整数帧，声音补齐到相同的时长
+            self.assertEqual(duration, 1.25)
+            clip = VideoFileClip(path)
+            frames = list(clip.iter_frames())
+            clip.close()
+            self.assertEqual([int(round(f[0, 0, 0] / 30)) for f in frames], [0, 1, 3, 4, 6])
+            self.assertEqual(len(decode_audio(path)), int(1.25 * SAMPLE_RATE))
+
+    @patch("config_reader.fps", 4)
+    def test_scenario_copies_video_and_mixes_bgm(self):
+        with tempfile.TemporaryDirectory() as tmp, patch("config_reader.output_dir", tmp):
+            # Given
+            segments = [VideoHelper.write_video_segment(
+                FrameStore([Image.new("RGB", (32, 16), (i * 100, 0, 0))] * 4, mode="RGB"), fps=4, name=str(i))[0]
+                for i in range(2)]
+            bgm = os.path.join(tmp, "bgm.wav")
+            with wave.open(bgm, "wb") as f:
+                f.setnchannels(2)
+                f.setsampwidth(2)
+                f.setframerate(SAMPLE_RATE)
+                f.writeframes((np.ones((3 * SAMPLE_RATE, 2)) * 0.1 * 32767).astype("<i2").tobytes())
+            output = os.path.join(tmp, "scenario.mp4")
+
+            # When
+            VideoHelper.write_scenario_video(segments, output, bgm=bgm, bgm_factor=2)
+
+            # Then
+            self.assertEqual(VideoHelper.probe_video_streams(output)[0], VideoHelper.probe_video_streams(segments[0])[0])
+            clip = VideoFileClip(output)
+            self.assertEqual(len(list(clip.iter_frames())), 8)
+            clip.close()
+            samples = decode_audio(output)
+            self.assertAlmostEqual(len(samples) / SAMPLE_RATE, 2, delta=0.1)    # 背景音乐超出场景的部分被截掉
+            self.assertAlmostEqual(float(np.median(samples[SAMPLE_RATE // 2:SAMPLE_RATE, 0])), 0.2, delta=0.02)
+
+    @staticmethod
+    def write_video(path, size, frames):
+        writer = imageio_ffmpeg.write_frames(path, size, fps=4, codec="libx264", ffmpeg_log_level="error")
+        writer.send(None)
+        for i in range(frames):
+            writer.send(np.full((size[1], size[0], 3), i * 20, dtype=np.uint8))
+        writer.close()
+
+    def test_concat_without_reencode(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            # Given
+            videos = [os.path.join(tmp, f"{i}.mp4") for i in range(3)]
+            for v in videos:
+                self.write_video(v, (32, 16), 4)
+            output = os.path.join(tmp, "final.mp4")
+
+            # When
+            compatible = VideoHelper.can_concat_without_reencode(videos)
+            VideoHelper.concat_video_files(videos, output)
+
+            # Then
+            self.assertTrue(compatible)
+            self.assertEqual(VideoHelper.probe_video_streams(output), VideoHelper.probe_video_streams(videos[0]))
+            clip = VideoFileClip(output)
+            self.assertEqual(len(list(clip.iter_frames())), 12)
+            clip.close()
+
+    def test_different_size_needs_reencode(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            # Given
+            videos = [os.path.join(tmp, "a.mp4"), os.path.join(tmp, "b.mp4")]
+            self.write_video(videos[0], (32, 16), 2)
+            self.write_video(videos[1], (48, 16), 2)
+
+            # When / Then
+            self.assertFalse(VideoHelper.can_concat_without_reencode(videos))
+
+    @patch("config_reader.jobs", 1)
+    @patch("config_reader.fps", 4)
+    @patch("run.render_scenario")
+    def test_sequential_run_concats_without_reencode(self, mock_render):
+        with tempfile.TemporaryDirectory() as tmp, patch("config_reader.output_dir", tmp):
+            # Given
+            script = os.path.join(tmp, "script.yaml")
+            with open(script, "w", encoding="utf-8") as f:
+                f.write("场景:\n- 名字: 一\n- 名字: 二\n")
+            mock_render.side_effect = lambda obj, path: (self.write_video(path, (32, 16), 4), path)[1:] + (obj["名字"], (1, []))
+
+            # When
+            with patch("libs.VideoHelper.concat_video_files", wraps=VideoHelper.concat_video_files) as concat:
+                run.run(script, "final.mp4")
+
+            # Then
+            concat.assert_called_once()
+            output = os.path.join(tmp, "script", "final.mp4")
+            clip = VideoFileClip(output)
+            self.assertAlmostEqual(clip.duration, 2, delta=0.1)
+            clip.close()
+            self.assertEqual(os.listdir(os.path.join(tmp, "script")), ["final.mp4"])   # 场景的临时文件已经删除
+
+    @patch("config_reader.fps", 4)
+    def test_delete_old_only_removes_files(self):
+        with tempfile.TemporaryDirectory() as tmp, patch("config_reader.output_dir", tmp):
+            # Given
+            video = os.path.join(tmp, "a.mp4")
+            self.write_video(video, (32, 16), 4)
+            clip = ColorClip((32, 16), (0, 128, 255), duration=1).with_fps(4)
+
+            # When
+            with self.assertNoLogs("run", level="WARNING"):
+                run.connect_videos(os.path.join(tmp, "final.mp4"), videos=[video, clip], delete_old=True)
+
+            # Then
+            self.assertFalse(os.path.exists(video))
+            self.assertTrue(os.path.exists(os.path.join(tmp, "final.mp4")))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,10 +2,10 @@
 import os
 import sys
 
-from moviepy import AudioFileClip
 
 sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "libs"))
 import config_reader
+from libs import AudioProbe
 
 import random
 
@@ -124,7 +124,7 @@ def get_audio_length(audio):
     if not audio:
         return 0
     if isinstance(audio, str):
-        return AudioFileClip(audio).duration
+        return AudioProbe.get_duration(audio)
     else:
         return audio.duration
 
@@ -10,6 +10,9 @@ from pathlib import Path
 from typing import Dict, List, Optional, Set, Any, Tuple
 import yaml
 
+import utils  # 把libs目录加入sys.path (TTSEngine 在libs目录下)
+from TTSEngine import registry
+from libs import SoftSubtitle
 from logging_config import get_logger
 from exceptions import (
     MissingResourcesException,
@@ -337,10 +340,15 @@ def validate_config(config_data: Dict[str, Any]) -> List[str]:
 
     # 验证TTS引擎
     tts_engine = config_data.get("tts_engine")
-    valid_engines = {"xunfei", "chat", "ttspro"}
+    valid_engines = registry.names()
     if tts_engine and tts_engine not in valid_engines:
         errors.append(f"不支持的TTS引擎: {tts_engine}，有效值: {', '.join(valid_engines)}")
 
+    # 验证字幕输出方式
+    subtitle_output = config_data.get("subtitle_output")
+    if subtitle_output and subtitle_output not in SoftSubtitle.MODES:
+        errors.append(f"不支持的字幕输出方式: {subtitle_output}，有效值: {', '.join(SoftSubtitle.MODES)}")
+
     return errors
 
 